@@ -20,3 +20,27 @@ login_manager.login_message = 'Пожалуйста, войдите в сист
 
 from app.views import routes
 
+# Метрики запросов и SQL в формате Prometheus: /metrics (до db.init_app, чтобы учитывался коммит сессии)
+
+from app.utils import metrics
+
+metrics.init_app(application)
+
+# Одна сессия БД на запрос вместо сессии на каждый вызов Database
+
+from database.database import db
+
+db.init_app(application)
+
+# Статика из сборки (python -m app.utils.build_assets): /assets/... и asset_url() в шаблонах
+
+from app.utils import assets
+
+assets.init_app(application)
+
+# Загруженные аватары: /avatars/... с неизменяемыми адресами
+
+from app.utils import avatars
+
+avatars.init_app(application)
+
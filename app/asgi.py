@@ -0,0 +1,165 @@
+"""
+ASGI-режим: асинхронная главная страница поверх Flask-приложения.
+
+Запуск (из корня проекта, после pip install -r requirements-async.txt):
+
+    uvicorn asgi:app --workers 4
+
+Главная страница — самый частый запрос: каждая открытая вкладка
+перепроверяет её по ETag. Здесь она обслуживается в цикле событий на
+AsyncDatabase: ожидание БД не занимает поток, поэтому тысячи почти
+простаивающих клиентов не требуют тысяч потоков, а четыре независимых
+чтения дашборда идут параллельно. Ответ тот же, что у routes.index,
+хуки Flask (метрики, сессия) вокруг него тоже выполняются.
+
+Асинхронна только главная страница. Остальные маршруты (и главная без
+сессии — вход по remember-cookie, редирект на /login) уходят во Flask
+через asgiref в пул из WSGI_THREADS потоков — с прежней синхронной
+сессией БД на запрос и метриками. Запись намеренно остаётся там: все
+изменения запроса идут одной транзакцией сессии на запрос (коммит в
+after_request, откат при любой ошибке), вместе с поколением для ETag и
+событиями рейтинга. Запросов записи на порядки меньше, чем опросов
+главной, и каждый держит поток одну короткую транзакцию, поэтому
+дублировать всю эту логику в AsyncDatabase ради них незачем.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import make_response, render_template, session
+from flask_login import current_user
+
+from app import application
+from app.utils.conditional import make_etag, is_fresh, with_etag, not_modified
+from app.views.routes import DASHBOARD_VERSION
+from database.async_database import async_db
+from functions import is_habit_active, local_today
+
+# Потоки для синхронных маршрутов Flask: по одному на соединение пула Database (10 + 20)
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', 30))
+
+
+class ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref по умолчанию выполняет WSGI-приложение в одном общем потоке
+    # (thread_sensitive=True), то есть запросы Flask шли бы строго по очереди.
+    # Опирается на устройство WsgiToAsgiInstance, поэтому версия asgiref
+    # закреплена в requirements-async.txt
+    run_wsgi_app = sync_to_async(vars(WsgiToAsgiInstance)['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class DashboardApp:
+    def __init__(self, flask_app, database):
+        self.flask_app = flask_app
+        self.db = database
+        self.wsgi = ThreadedWsgiToAsgi(flask_app)
+        self.routes = {('GET', '/'): self.index}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        handler = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        response = await handler(scope) if handler is not None else None
+        if response is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+                )
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.db.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def request_context(self, scope):
+        """Контекст запроса Flask (сессия, url_for, шаблоны) без тела запроса."""
+        wsgi = WsgiToAsgiInstance(self.flask_app)
+        wsgi.scope = scope
+        return self.flask_app.request_context(wsgi.build_environ(scope, io.BytesIO()))
+
+    def load_user(self):
+        """
+        Текущий пользователь через Flask-Login (user_loader с кешем, защита сессии).
+
+        Returns:
+            CachedUser | None: None — отдать запрос Flask: нет входа, вход по
+            remember-cookie или Flask-Login изменил сессию (её сохраняет только Flask)
+        """
+        if '_user_id' not in session:
+            return None
+        user = current_user._get_current_object()
+        if not user.is_authenticated or session.modified:
+            return None
+        return user
+
+    async def index(self, scope):
+        """
+        Главная страница (см. routes.index).
+
+        Хуки Flask выполняются как у обычного запроса: before_request
+        начинает метрики запроса, after_request (process_response)
+        записывает их с endpoint index, коммитит сессию БД на запрос и
+        сохраняет cookie сессии.
+
+        Returns:
+            Response | None: None — отдать запрос Flask
+        """
+        with self.request_context(scope):
+            if self.flask_app.preprocess_request() is not None:
+                return None
+
+            # user_loader может сходить в синхронную БД — не в цикле событий
+            user = await asyncio.to_thread(self.load_user)
+            if user is None:
+                return None
+            user_id = user.id
+            today = local_today()
+
+            # Вкладка, которая ничего не меняла, получает 304 после одного лёгкого запроса поколения
+            etag = make_etag('dashboard', user_id, await self.db.get_user_generation(user_id),
+                             today.isoformat(), DASHBOARD_VERSION)
+            if is_fresh(etag):
+                response = not_modified(etag)
+            else:
+                dashboard = await self.db.get_dashboard(user_id, today)
+                if dashboard is None:
+                    return None
+                for habit in dashboard['habits']:
+                    habit['active'] = is_habit_active(habit, today)
+
+                user_data = {
+                    'nickname': user.nickname,
+                    'username': user.username,
+                    'path_to_avatar': user.path_to_avatar,
+                    **dashboard
+                }
+                response = with_etag(make_response(render_template('index.html', user=user_data)), etag)
+
+            # Коммит синхронной сессии запроса (если user_loader её открыл) — тоже не в цикле событий
+            return await asyncio.to_thread(self.flask_app.process_response, response)
+
+
+app = DashboardApp(application, async_db)
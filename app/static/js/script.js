@@ -1,126 +1,227 @@
 document.addEventListener('DOMContentLoaded', function () {
+    // Делегирование событий: обработчики висят на списке и работают
+    // и для элементов, добавленных после загрузки страницы
+    function delegate(list, eventName, selector, handler) {
+        if (!list) return;
+        list.addEventListener(eventName, function (e) {
+            const target = e.target.closest(selector);
+            if (target && list.contains(target)) handler.call(target, e);
+        });
+    }
+
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+
+    const DIFFICULTY_LABELS = {
+        'trivial': '⭐ Пустяк',
+        'easy': '⭐⭐ Легко',
+        'medium': '⭐⭐⭐ Нормально',
+        'hard': '⭐⭐⭐⭐ Сложно'
+    };
+
+    const MENU_ICON = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 4 16" width="16" height="16">' +
+        '<path fill="#686274" fill-rule="evenodd" d="M2 4a2 2 0 1 1 0-4 2 2 0 0 1 0 4zm0 6a2 2 0 1 1 0-4 2 2 0 0 1 0 4zm0 6a2 2 0 1 1 0-4 2 2 0 0 1 0 4z"></path>' +
+        '</svg>';
+
+    function htmlToElement(html) {
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        return template.content.firstElementChild;
+    }
+
+    // Разметка задачи — та же, что в index.html
+    function renderTaskItem(task) {
+        const id = escapeHtml(task.id);
+        const title = escapeHtml(task.title);
+        return htmlToElement(`
+            <li class="task-item" data-status="${escapeHtml(task.status)}" data-task-id="${id}">
+              <div class="task-wrapper">
+                <div class="task-left-control">
+                  <label class="checkbox-container">
+                    <input type="checkbox" class="task-checkbox" ${task.status === 'completed' ? 'checked' : ''} data-task-id="${id}" data-task-title="${title}">
+                    <span class="checkmark"></span>
+                  </label>
+                </div>
+                <div class="task-content" data-task-id="${id}">
+                  <h3 class="task-title">${title}</h3>
+                  ${task.notes ? `<div class="task-notes">${escapeHtml(task.notes)}</div>` : ''}
+                  <div class="task-meta">
+                    ${task.difficulty ? `<span class="task-difficulty task-difficulty-${escapeHtml(task.difficulty)}">${DIFFICULTY_LABELS[task.difficulty] || ''}</span>` : ''}
+                    ${task.deadline ? `<span class="task-deadline">📅 ${escapeHtml(task.deadline)}</span>` : ''}
+                  </div>
+                </div>
+                <div class="task-actions">
+                  <button class="task-menu-btn" data-task-id="${id}">${MENU_ICON}</button>
+                </div>
+              </div>
+            </li>`);
+    }
+
+    // Разметка привычки — та же, что в index.html
+    function renderHabitItem(habit) {
+        const id = escapeHtml(habit.id);
+        const title = escapeHtml(habit.title);
+        const streak = habit.streak || 0;
+        const status = !habit.active ? 'inactive' : (habit.completed_today ? 'completed' : 'in_progress');
+        return htmlToElement(`
+            <li class="habit-item${habit.active ? '' : ' habit-inactive'}" data-habit-id="${id}" data-status="${status}">
+              <div class="habit-wrapper">
+                <div class="habit-left-control">
+                  <label class="checkbox-container">
+                    <input type="checkbox" class="habit-checkbox" ${habit.completed_today ? 'checked' : ''} data-habit-id="${id}" data-habit-title="${title}">
+                    <span class="checkmark"></span>
+                  </label>
+                </div>
+                <div class="habit-content" data-habit-id="${id}">
+                  <h3 class="habit-title">${title}</h3>
+                  ${habit.notes ? `<div class="habit-notes">${escapeHtml(habit.notes)}</div>` : ''}
+                  <div class="habit-meta">
+                    <span class="habit-streak-badge">🔥 Серия: ${streak}</span>
+                    ${habit.difficulty ? `<span class="habit-difficulty habit-difficulty-${escapeHtml(habit.difficulty)}">${DIFFICULTY_LABELS[habit.difficulty] || ''}</span>` : ''}
+                  </div>
+                </div>
+                <div class="habit-actions">
+                  <button class="habit-menu-btn" data-habit-id="${id}">${MENU_ICON}</button>
+                </div>
+              </div>
+            </li>`);
+    }
+
+    // Рейтинг в профиле и полоска прогресса
+    function setRating(value) {
+        if (typeof value !== 'number') return;
+        const ratingEl = document.querySelector('.profile-rating-value');
+        if (ratingEl) ratingEl.textContent = value;
+        const barFill = document.querySelector('.rating-bar-fill');
+        if (barFill) barFill.style.width = `${value / 20}%`;
+    }
+
+    // Повторно применить выбранные фильтры после изменения списков
+    function refreshFilters() {
+        const taskFilter = document.querySelector('.tasks .filter.active');
+        if (taskFilter) applyTaskFilter(taskFilter.dataset.filter);
+        const habitFilter = document.querySelector('.habits .filter.active');
+        if (habitFilter) applyHabitFilter(habitFilter.dataset.filter);
+    }
+
+    function findTaskItem(taskId) {
+        return document.querySelector(`.tasks-list .task-item[data-task-id="${taskId}"]`);
+    }
+
+    function findHabitItem(habitId) {
+        return document.querySelector(`.habits-list .habit-item[data-habit-id="${habitId}"]`);
+    }
     // Обработка изменения статуса задачи
-    document.querySelectorAll('.task-checkbox').forEach(checkbox => {
-        checkbox.addEventListener('change', function () {
-            const taskId = this.dataset.taskId;
-            const status = this.checked ? 'completed' : 'in_progress';
-            const taskItem = this.closest('.task-item');
-            // Получаем сложность задачи из DOM
-            let difficulty = 'easy';
-            const diffEl = taskItem.querySelector('[class*="task-difficulty-"]');
-            if (diffEl) {
-                const match = diffEl.className.match(/task-difficulty-([a-z]+)/);
-                if (match) difficulty = match[1];
-            }
-            fetch('/update_task', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    task_id: taskId,
-                    status: status,
-                    difficulty: difficulty
-                })
+    delegate(document.querySelector('.tasks-list'), 'change', '.task-checkbox', function (e) {
+        const taskId = this.dataset.taskId;
+        const status = this.checked ? 'completed' : 'in_progress';
+        const taskItem = this.closest('.task-item');
+        // Получаем сложность задачи из DOM
+        let difficulty = 'easy';
+        const diffEl = taskItem.querySelector('[class*="task-difficulty-"]');
+        if (diffEl) {
+            const match = diffEl.className.match(/task-difficulty-([a-z]+)/);
+            if (match) difficulty = match[1];
+        }
+        fetch('/update_task', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                task_id: taskId,
+                status: status,
+                difficulty: difficulty
             })
-                .then(res => res.json())
-                .then(data => {
-                    if (data.success) {
-                        // Обновляем data-status элемента
-                        taskItem.dataset.status = status;
-                        // Обновляем рейтинг на странице
-                        const ratingEl = document.querySelector('.profile-rating-value');
-                        if (ratingEl && typeof data.rating_delta === 'number') {
-                            let current = parseInt(ratingEl.textContent) || 0;
-                            current += data.rating_delta;
-                            ratingEl.textContent = current;
-                        }
-                        // Применяем активный фильтр заново
-                        const activeFilter = document.querySelector('.tasks .filter.active');
-                        if (activeFilter) {
-                            applyTaskFilter(activeFilter.dataset.filter);
-                        }
-                    } else {
-                        this.checked = !this.checked; // возвращаем предыдущее состояние
-                        alert('Ошибка при обновлении статуса задачи');
+        })
+            .then(res => res.json())
+            .then(data => {
+                if (data.success) {
+                    // Обновляем data-status элемента
+                    taskItem.dataset.status = status;
+                    // Обновляем рейтинг на странице
+                    setRating(data.rating);
+                    // Применяем активный фильтр заново
+                    const activeFilter = document.querySelector('.tasks .filter.active');
+                    if (activeFilter) {
+                        applyTaskFilter(activeFilter.dataset.filter);
                     }
-                });
-        });
+                } else {
+                    this.checked = !this.checked; // возвращаем предыдущее состояние
+                    alert('Ошибка при обновлении статуса задачи');
+                }
+            });
     });
 
     // Обработка изменения статуса привычки
-    document.querySelectorAll('.habit-checkbox').forEach(checkbox => {
-        checkbox.addEventListener('change', function () {
-            const habitItem = this.closest('.habit-item');
-            if (!habitItem) {
-                console.error('Habit item not found for checkbox');
-                this.checked = !this.checked;
-                return;
-            }
+    delegate(document.querySelector('.habits-list'), 'change', '.habit-checkbox', function (e) {
+        const habitItem = this.closest('.habit-item');
+        if (!habitItem) {
+            console.error('Habit item not found for checkbox');
+            this.checked = !this.checked;
+            return;
+        }
 
-            const habitId = parseInt(habitItem.dataset.habitId, 10);
-            if (isNaN(habitId)) {
-                console.error('Invalid habit ID:', habitItem.dataset.habitId);
-                this.checked = !this.checked;
-                return;
-            }
+        const habitId = parseInt(habitItem.dataset.habitId, 10);
+        if (isNaN(habitId)) {
+            console.error('Invalid habit ID:', habitItem.dataset.habitId);
+            this.checked = !this.checked;
+            return;
+        }
 
-            const completed = this.checked;
+        const completed = this.checked;
 
-            // Получаем сложность привычки из DOM
-            let difficulty = 'easy';
-            const diffEl = habitItem.querySelector('[class*="habit-difficulty-"]');
-            if (diffEl) {
-                const match = diffEl.className.match(/habit-difficulty-([a-z]+)/);
-                if (match) difficulty = match[1];
-            }
+        // Получаем сложность привычки из DOM
+        let difficulty = 'easy';
+        const diffEl = habitItem.querySelector('[class*="habit-difficulty-"]');
+        if (diffEl) {
+            const match = diffEl.className.match(/habit-difficulty-([a-z]+)/);
+            if (match) difficulty = match[1];
+        }
 
-            fetch('/update_habit_streak', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    habit_id: habitId,
-                    completed: completed,
-                    difficulty: difficulty
-                })
+        fetch('/update_habit_streak', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                habit_id: habitId,
+                completed: completed,
+                difficulty: difficulty
             })
-                .then(res => {
-                    if (!res.ok) {
-                        console.error('Server error:', res.status);
-                        return res.json().then(err => { throw new Error(err.error || 'Server error'); });
+        })
+            .then(res => {
+                if (!res.ok) {
+                    console.error('Server error:', res.status);
+                    return res.json().then(err => { throw new Error(err.error || 'Server error'); });
+                }
+                return res.json();
+            })
+            .then(data => {
+                if (data.success) {
+                    // Обновляем серию (streak)
+                    const streakBadge = habitItem.querySelector('.habit-streak-badge');
+                    if (streakBadge) {
+                        // Серию пересчитывает сервер по истории выполнений
+                        streakBadge.textContent = `🔥 Серия: ${data.streak}`;
                     }
-                    return res.json();
-                })
-                .then(data => {
-                    if (data.success) {
-                        // Обновляем серию (streak)
-                        const streakBadge = habitItem.querySelector('.habit-streak-badge');
-                        if (streakBadge) {
-                            const currentStreak = parseInt(streakBadge.textContent.match(/\d+/)?.[0] || '0', 10);
-                            const newStreak = currentStreak + (completed ? 1 : -1);
-                            streakBadge.textContent = `🔥 Серия: ${Math.max(0, newStreak)}`;
-                        }
-                        habitItem.dataset.status = completed ? 'completed' : 'in_progress';
-                        // Обновляем рейтинг
-                        const ratingEl = document.querySelector('.profile-rating-value');
-                        if (ratingEl && typeof data.rating_delta === 'number') {
-                            let current = parseInt(ratingEl.textContent) || 0;
-                            ratingEl.textContent = current + data.rating_delta;
-                        }
-                        // Применяем фильтр
-                        const activeFilter = document.querySelector('.habits .filter.active');
-                        if (activeFilter) {
-                            applyHabitFilter(activeFilter.dataset.filter);
-                        }
-                    } else {
-                        this.checked = !this.checked;
-                        alert('Ошибка: ' + (data.error || 'неизвестная'));
+                    habitItem.dataset.status = completed ? 'completed' : 'in_progress';
+                    // Обновляем рейтинг
+                    setRating(data.rating);
+                    // Применяем фильтр
+                    const activeFilter = document.querySelector('.habits .filter.active');
+                    if (activeFilter) {
+                        applyHabitFilter(activeFilter.dataset.filter);
                     }
-                })
-                .catch(err => {
-                    console.error('Fetch error:', err);
+                } else {
                     this.checked = !this.checked;
-                    alert('Ошибка сети или сервера');
-                });
-        });
+                    alert('Ошибка: ' + (data.error || 'неизвестная'));
+                }
+            })
+            .catch(err => {
+                console.error('Fetch error:', err);
+                this.checked = !this.checked;
+                alert('Ошибка сети или сервера');
+            });
     });
 
     // Overlay и модальные
@@ -183,106 +284,102 @@ document.addEventListener('DOMContentLoaded', function () {
     if (habitEditCancelBtn) habitEditCancelBtn.onclick = closeModals;
 
     // Открыть модальное окно редактирования привычки
-    document.querySelectorAll('.habit-content').forEach(habitContent => {
-        habitContent.addEventListener('click', function (e) {
-            const habitItem = this.closest('.habit-item');
-            const habitId = habitItem.dataset.habitId;
-
-            fetch(`/get_habit_details?habit_id=${habitId}`)
-                .then(res => res.json())
-                .then(data => {
-                    if (data.success && data.habit) {
-                        document.getElementById('habit-edit-id').value = data.habit.id;
-                        document.getElementById('habit-edit-title').value = data.habit.title || '';
-                        document.getElementById('habit-edit-notes').value = data.habit.notes || '';
-                        document.getElementById('habit-edit-difficulty').value = data.habit.difficulty || 'easy';
-                        document.getElementById('habit-edit-start-date').value = data.habit.start_date || '';
-
-                        const repeatTypeSelect = document.getElementById('habit-edit-repeat-type');
-                        repeatTypeSelect.value = data.habit.repeat_type || 'weekly';
-
-                        document.getElementById('habit-edit-repeat-every').value = data.habit.repeat_every || 1;
-
-                        // Сбросить все дни недели
-                        document.querySelectorAll('#modal-habit-edit .day-toggle').forEach(btn => btn.classList.remove('active'));
-                        if (data.habit.repeat_days) {
-                            const daysArr = data.habit.repeat_days.split(',').map(d => d.trim());
-                            document.querySelectorAll('#modal-habit-edit .day-toggle').forEach(btn => {
-                                if (daysArr.includes(btn.dataset.day)) btn.classList.add('active');
-                            });
-                        }
+    delegate(document.querySelector('.habits-list'), 'click', '.habit-content', function (e) {
+        const habitItem = this.closest('.habit-item');
+        const habitId = habitItem.dataset.habitId;
+
+        fetch(`/get_habit_details?habit_id=${habitId}`)
+            .then(res => res.json())
+            .then(data => {
+                if (data.success && data.habit) {
+                    document.getElementById('habit-edit-id').value = data.habit.id;
+                    document.getElementById('habit-edit-title').value = data.habit.title || '';
+                    document.getElementById('habit-edit-notes').value = data.habit.notes || '';
+                    document.getElementById('habit-edit-difficulty').value = data.habit.difficulty || 'easy';
+                    document.getElementById('habit-edit-start-date').value = data.habit.start_date || '';
+
+                    const repeatTypeSelect = document.getElementById('habit-edit-repeat-type');
+                    repeatTypeSelect.value = data.habit.repeat_type || 'weekly';
+
+                    document.getElementById('habit-edit-repeat-every').value = data.habit.repeat_every || 1;
+
+                    // Сбросить все дни недели
+                    document.querySelectorAll('#modal-habit-edit .day-toggle').forEach(btn => btn.classList.remove('active'));
+                    if (data.habit.repeat_days) {
+                        const daysArr = data.habit.repeat_days.split(',').map(d => d.trim());
+                        document.querySelectorAll('#modal-habit-edit .day-toggle').forEach(btn => {
+                            if (daysArr.includes(btn.dataset.day)) btn.classList.add('active');
+                        });
+                    }
 
-                        // --- Обновляем видимость блока "Повторять по" ---
-                        const repeatLabelEdit = document.getElementById('habit-edit-repeat-label');
-                        let repeatDaysEditBlock = null;
-                        const group = repeatTypeSelect.closest('.form-group');
-                        if (group) {
-                            let next = group.nextElementSibling;
-                            while (next) {
-                                if (next.querySelector('.days-selector')) {
-                                    repeatDaysEditBlock = next;
-                                    break;
-                                }
-                                next = next.nextElementSibling;
+                    // --- Обновляем видимость блока "Повторять по" ---
+                    const repeatLabelEdit = document.getElementById('habit-edit-repeat-label');
+                    let repeatDaysEditBlock = null;
+                    const group = repeatTypeSelect.closest('.form-group');
+                    if (group) {
+                        let next = group.nextElementSibling;
+                        while (next) {
+                            if (next.querySelector('.days-selector')) {
+                                repeatDaysEditBlock = next;
+                                break;
                             }
+                            next = next.nextElementSibling;
                         }
+                    }
 
-                        function updateRepeatDaysEditBlock() {
-                            const labels = {
-                                'daily': 'день',
-                                'weekly': 'неделю',
-                                'monthly': 'месяц',
-                                'yearly': 'год'
-                            };
-                            if (repeatLabelEdit) {
-                                repeatLabelEdit.textContent = labels[repeatTypeSelect.value] || 'неделю';
-                            }
-                            if (repeatDaysEditBlock) {
-                                repeatDaysEditBlock.style.display = repeatTypeSelect.value === 'weekly' ? '' : 'none';
-                            }
+                    function updateRepeatDaysEditBlock() {
+                        const labels = {
+                            'daily': 'день',
+                            'weekly': 'неделю',
+                            'monthly': 'месяц',
+                            'yearly': 'год'
+                        };
+                        if (repeatLabelEdit) {
+                            repeatLabelEdit.textContent = labels[repeatTypeSelect.value] || 'неделю';
                         }
+                        if (repeatDaysEditBlock) {
+                            repeatDaysEditBlock.style.display = repeatTypeSelect.value === 'weekly' ? '' : 'none';
+                        }
+                    }
 
-                        // Вызываем немедленно после загрузки данных
-                        updateRepeatDaysEditBlock();
+                    // Вызываем немедленно после загрузки данных
+                    updateRepeatDaysEditBlock();
 
-                        // И при изменении селекта
-                        repeatTypeSelect.removeEventListener('change', updateRepeatDaysEditBlock); // на случай дубля
-                        repeatTypeSelect.addEventListener('change', updateRepeatDaysEditBlock);
+                    // И при изменении селекта
+                    repeatTypeSelect.removeEventListener('change', updateRepeatDaysEditBlock); // на случай дубля
+                    repeatTypeSelect.addEventListener('change', updateRepeatDaysEditBlock);
 
-                        overlay.style.display = 'block';
-                        modalHabitEdit.style.display = 'flex';
-                    } else {
-                        alert('Ошибка загрузки данных привычки');
-                    }
-                });
-        });
+                    overlay.style.display = 'block';
+                    modalHabitEdit.style.display = 'flex';
+                } else {
+                    alert('Ошибка загрузки данных привычки');
+                }
+            });
     });
     // Открыть модальное окно редактирования задачи
-    document.querySelectorAll('.task-content').forEach(taskContent => {
-        taskContent.addEventListener('click', function (e) {
-            const taskItem = this.closest('.task-item');
-            const taskId = taskItem.dataset.taskId;
-
-            // Получаем данные задачи из DOM
-            const title = taskItem.querySelector('.task-title').textContent;
-            const notesEl = taskItem.querySelector('.task-notes');
-            const notes = notesEl ? notesEl.textContent : '';
-            const difficultyEl = taskItem.querySelector('[class*="task-difficulty-"]');
-            const difficulty = difficultyEl ? difficultyEl.className.split('task-difficulty-')[1].split(' ')[0] : 'easy';
-            const deadlineEl = taskItem.querySelector('.task-deadline');
-            const deadline = deadlineEl ? deadlineEl.textContent.replace('📅 ', '') : '';
-
-            // Заполняем форму редактирования
-            document.getElementById('task-edit-id').value = taskId;
-            document.getElementById('task-edit-title').value = title;
-            document.getElementById('task-edit-notes').value = notes;
-            document.getElementById('task-edit-difficulty').value = difficulty;
-            document.getElementById('task-edit-deadline').value = deadline;
-
-            // Показываем модальное окно
-            overlay.style.display = 'block';
-            modalTaskEdit.style.display = 'flex';
-        });
+    delegate(document.querySelector('.tasks-list'), 'click', '.task-content', function (e) {
+        const taskItem = this.closest('.task-item');
+        const taskId = taskItem.dataset.taskId;
+
+        // Получаем данные задачи из DOM
+        const title = taskItem.querySelector('.task-title').textContent;
+        const notesEl = taskItem.querySelector('.task-notes');
+        const notes = notesEl ? notesEl.textContent : '';
+        const difficultyEl = taskItem.querySelector('[class*="task-difficulty-"]');
+        const difficulty = difficultyEl ? difficultyEl.className.split('task-difficulty-')[1].split(' ')[0] : 'easy';
+        const deadlineEl = taskItem.querySelector('.task-deadline');
+        const deadline = deadlineEl ? deadlineEl.textContent.replace('📅 ', '') : '';
+
+        // Заполняем форму редактирования
+        document.getElementById('task-edit-id').value = taskId;
+        document.getElementById('task-edit-title').value = title;
+        document.getElementById('task-edit-notes').value = notes;
+        document.getElementById('task-edit-difficulty').value = difficulty;
+        document.getElementById('task-edit-deadline').value = deadline;
+
+        // Показываем модальное окно
+        overlay.style.display = 'block';
+        modalTaskEdit.style.display = 'flex';
     });
     overlay.addEventListener('click', closeModals);
     if (taskCancelBtn) taskCancelBtn.onclick = closeModals;
@@ -310,8 +407,10 @@ document.addEventListener('DOMContentLoaded', function () {
             })
                 .then(res => res.json())
                 .then(data => {
-                    if (data.success) location.reload();
-                    else alert('Ошибка при добавлении задачи');
+                    if (data.success) {
+                        document.querySelector('.tasks-list').prepend(renderTaskItem(data.task));
+                        refreshFilters();
+                    } else alert('Ошибка при добавлении задачи');
                 });
         }
         closeModals();
@@ -339,8 +438,11 @@ document.addEventListener('DOMContentLoaded', function () {
             })
                 .then(res => res.json())
                 .then(data => {
-                    if (data.success) location.reload();
-                    else alert('Ошибка при обновлении задачи');
+                    if (data.success) {
+                        const taskItem = findTaskItem(data.task.id);
+                        if (taskItem) taskItem.replaceWith(renderTaskItem(data.task));
+                        refreshFilters();
+                    } else alert('Ошибка при обновлении задачи');
                 });
         }
         closeModals();
@@ -358,59 +460,15 @@ document.addEventListener('DOMContentLoaded', function () {
             })
                 .then(res => res.json())
                 .then(data => {
-                    if (data.success) location.reload();
-                    else alert('Ошибка при удалении задачи');
+                    if (data.success) {
+                        const taskItem = findTaskItem(data.task_id);
+                        if (taskItem) taskItem.remove();
+                        closeModals();
+                    } else alert('Ошибка при удалении задачи');
                 });
         }
     };
 
-    // Открыть модальное окно редактирования привычки
-    document.querySelectorAll('.habit-content').forEach(habitContent => {
-        habitContent.addEventListener('click', function (e) {
-            const habitItem = this.closest('.habit-item');
-            const habitId = habitItem.dataset.habitId;
-
-            // Получаем данные привычки из БД через AJAX
-            fetch(`/get_habit_details?habit_id=${habitId}`)
-                .then(res => res.json())
-                .then(data => {
-                    if (data.success && data.habit) {
-                        document.getElementById('habit-edit-id').value = data.habit.id;
-                        document.getElementById('habit-edit-title').value = data.habit.title || '';
-                        document.getElementById('habit-edit-notes').value = data.habit.notes || '';
-                        document.getElementById('habit-edit-difficulty').value = data.habit.difficulty || 'easy';
-                        document.getElementById('habit-edit-start-date').value = data.habit.start_date || '';
-                        document.getElementById('habit-edit-repeat-type').value = data.habit.repeat_type || 'weekly';
-                        document.getElementById('habit-edit-repeat-every').value = data.habit.repeat_every || 1;
-                        // Сбросить все дни недели
-                        document.querySelectorAll('#modal-habit-edit .day-toggle').forEach(btn => btn.classList.remove('active'));
-                        if (data.habit.repeat_days) {
-                            const daysArr = data.habit.repeat_days.split(',').map(d => d.trim());
-                            document.querySelectorAll('#modal-habit-edit .day-toggle').forEach(btn => {
-                                if (daysArr.includes(btn.dataset.day)) btn.classList.add('active');
-                            });
-                        }
-                        // Обновить подпись периода
-                        const repeatTypeSelect = document.getElementById('habit-edit-repeat-type');
-                        const repeatLabel = document.getElementById('habit-edit-repeat-label');
-                        if (repeatTypeSelect && repeatLabel) {
-                            const labels = {
-                                'daily': 'день',
-                                'weekly': 'неделю',
-                                'monthly': 'месяц',
-                                'yearly': 'год'
-                            };
-                            repeatLabel.textContent = labels[repeatTypeSelect.value] || 'неделю';
-                        }
-                        overlay.style.display = 'block';
-                        modalHabitEdit.style.display = 'flex';
-                    } else {
-                        alert('Ошибка загрузки данных привычки');
-                    }
-                });
-        });
-    });
-
     // Сохранение изменений привычки
     if (habitEditSaveBtn) habitEditSaveBtn.onclick = function () {
         const habitId = document.getElementById('habit-edit-id').value;
@@ -450,8 +508,12 @@ document.addEventListener('DOMContentLoaded', function () {
             })
                 .then(res => res.json())
                 .then(data => {
-                    if (data.success) location.reload();
-                    else alert('Ошибка при сохранении привычки');
+                    if (data.success) {
+                        const habitItem = findHabitItem(data.habit.id);
+                        if (habitItem) habitItem.replaceWith(renderHabitItem(data.habit));
+                        refreshFilters();
+                        closeModals();
+                    } else alert('Ошибка при сохранении привычки');
                 });
         } else {
             alert('Название привычки обязательно');
@@ -469,8 +531,11 @@ document.addEventListener('DOMContentLoaded', function () {
             })
                 .then(res => res.json())
                 .then(data => {
-                    if (data.success) location.reload();
-                    else alert('Ошибка при удалении привычки');
+                    if (data.success) {
+                        const habitItem = findHabitItem(data.habit_id);
+                        if (habitItem) habitItem.remove();
+                        closeModals();
+                    } else alert('Ошибка при удалении привычки');
                 });
         }
     };
@@ -506,8 +571,11 @@ document.addEventListener('DOMContentLoaded', function () {
             })
                 .then(res => res.json())
                 .then(data => {
-                    if (data.success) location.reload();
-                    else alert('Ошибка при создании привычки');
+                    if (data.success) {
+                        document.querySelector('.habits-list').prepend(renderHabitItem(data.habit));
+                        refreshFilters();
+                        closeModals();
+                    } else alert('Ошибка при создании привычки');
                 });
         } else {
             alert('Название привычки обязательно');
@@ -628,4 +696,85 @@ document.addEventListener('DOMContentLoaded', function () {
     // По умолчанию применяем фильтр "Активные" для задач и привычек
     applyTaskFilter('active');
     applyHabitFilter('active');
+
+    // Аватар: клик открывает выбор файла, картинка уходит телом запроса
+    const avatarImg = document.querySelector('.avatar-img');
+    const avatarInput = document.getElementById('avatar-input');
+
+    // Миниатюра строится на сервере в фоне: пробуем загрузить, пока не появится
+    function showAvatar(url, attempts) {
+        const probe = new Image();
+        probe.onload = () => {
+            // <source> в <picture> перекрыли бы новый src: загруженный аватар — один WebP
+            const picture = avatarImg.closest('picture');
+            if (picture) picture.querySelectorAll('source').forEach(source => source.remove());
+            avatarImg.src = url;
+        };
+        probe.onerror = () => {
+            if (attempts > 1) setTimeout(() => showAvatar(url, attempts - 1), 500);
+        };
+        probe.src = url;
+    }
+
+    if (avatarImg && avatarInput) {
+        avatarImg.addEventListener('click', () => avatarInput.click());
+        avatarInput.addEventListener('change', function () {
+            const file = this.files[0];
+            this.value = '';
+            if (!file) return;
+            fetch('/upload_avatar', {
+                method: 'POST',
+                headers: { 'Content-Type': file.type || 'application/octet-stream' },
+                body: file
+            })
+                .then(res => res.json())
+                .then(data => {
+                    if (data.success) showAvatar(data.avatar, 20);
+                    else alert(data.error || 'Ошибка при загрузке аватара');
+                })
+                .catch(() => alert('Ошибка сети или сервера'));
+        });
+    }
+
+    // Таблица лидеров: подгрузка следующих страниц по последней строке
+    const leaderboardMoreBtn = document.getElementById('leaderboard-more-btn');
+    if (leaderboardMoreBtn) leaderboardMoreBtn.onclick = function () {
+        const list = document.querySelector('.leaderboard-list');
+        const last = list.lastElementChild;
+        if (!last) return;
+        const params = new URLSearchParams({
+            after_rating: last.dataset.rating,
+            after_id: last.dataset.userId,
+            position: last.dataset.position,
+            limit: 50
+        });
+        fetch(`/rating/page?${params}`)
+            .then(res => res.json())
+            .then(data => {
+                if (!data.success) return;
+                data.entries.forEach(entry => {
+                    const li = document.createElement('li');
+                    li.className = 'leaderboard-item';
+                    li.dataset.position = entry.position;
+                    li.dataset.userId = entry.user_id;
+                    li.dataset.rating = entry.rating;
+                    const position = document.createElement('span');
+                    position.className = 'leaderboard-position';
+                    position.textContent = entry.position;
+                    const avatar = document.createElement('img');
+                    avatar.className = 'leaderboard-avatar';
+                    avatar.src = entry.avatar;
+                    avatar.alt = '';
+                    const nickname = document.createElement('span');
+                    nickname.className = 'leaderboard-nickname';
+                    nickname.textContent = entry.nickname;
+                    const rating = document.createElement('span');
+                    rating.className = 'leaderboard-rating';
+                    rating.textContent = entry.rating;
+                    li.append(position, avatar, nickname, rating);
+                    list.appendChild(li);
+                });
+                if (data.entries.length < 50) leaderboardMoreBtn.remove();
+            });
+    };
 });
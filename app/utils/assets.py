@@ -0,0 +1,112 @@
+"""
+Статика из сборки (python -m app.utils.build_assets): адреса файлов с
+хешем содержимого в имени и их раздача по /assets/... с
+Cache-Control: immutable — при изменении файла меняется его имя.
+Без сборки asset_url отдаёт обычные адреса /static/...
+
+Картинки в шаблонах выводятся через picture(): браузер сам выбирает
+AVIF или WebP, а старый получает запасной PNG/JPEG.
+"""
+import json
+import os
+
+from flask import send_from_directory, url_for
+from markupsafe import Markup, escape
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+ASSETS_MAX_AGE = 365 * 24 * 3600
+# Современные форматы в порядке предпочтения для <source> в <picture>
+PICTURE_FORMATS = (('avif', 'image/avif'), ('webp', 'image/webp'))
+
+_manifest = None
+
+
+def load_manifest(dist_dir: str = DIST_DIR) -> dict:
+    """Прочитать manifest.json (один раз на процесс); без сборки — пустой словарь."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except FileNotFoundError:
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(filename: str, width: int = None, fmt: str = None) -> str:
+    """
+    URL файла статики с хешем в имени (аналог url_for('static', filename=...)).
+
+    Args:
+        filename: Путь внутри static, например 'images/logo.png'
+        width: Нужная ширина картинки: берётся наименьший вариант не уже неё
+        fmt: 'avif' или 'webp' для современного формата; по умолчанию — запасной
+
+    Returns:
+        str: /assets/... из сборки или /static/..., если файла нет в манифесте
+    """
+    entry = load_manifest().get(filename)
+    if entry is None:
+        return url_for('static', filename=filename)
+    if 'variants' in entry:
+        variant = pick_variant(entry['variants'], width)
+        path = variant.get(fmt) or variant['fallback']
+    else:
+        path = entry['file']
+    return url_for('assets', filename=path)
+
+
+def pick_variant(variants: list, width: int = None) -> dict:
+    """Наименьший вариант шириной не меньше width (или самый большой)."""
+    if width is not None:
+        for variant in variants:
+            if variant['width'] >= width:
+                return variant
+    return variants[-1]
+
+
+def img_tag(src: str, **attrs) -> Markup:
+    """<img src=...> с атрибутами attrs (None пропускается), значения экранируются."""
+    attributes = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items() if value is not None)
+    return Markup(f'<img src="{escape(src)}"{attributes} />')
+
+
+def picture(filename: str, width: int = None, **attrs) -> Markup:
+    """
+    Картинка из сборки: <picture> с <source> AVIF и WebP и <img> запасного формата.
+
+        {{ picture('images/btnplus.png', class='icon', alt='Кнопка') }}
+
+    Args:
+        filename: Путь внутри static, например 'images/logo.png'
+        width: Нужная ширина картинки (см. asset_url)
+        attrs: Атрибуты <img> (class, alt, title, ...)
+
+    Returns:
+        Markup: <picture>...</picture>; без вариантов в манифесте (нет сборки) — просто <img>
+    """
+    img = img_tag(asset_url(filename, width), **attrs)
+    entry = load_manifest().get(filename)
+    if entry is None or 'variants' not in entry:
+        return img
+    variant = pick_variant(entry['variants'], width)
+    sources = ''.join(
+        f'<source type="{mime}" srcset="{escape(url_for("assets", filename=variant[fmt]))}" />'
+        for fmt, mime in PICTURE_FORMATS if fmt in variant
+    )
+    return Markup(f'<picture>{sources}{img}</picture>')
+
+
+def send_asset(filename):
+    response = send_from_directory(DIST_DIR, filename, max_age=ASSETS_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={ASSETS_MAX_AGE}, immutable'
+    return response
+
+
+def init_app(app):
+    """Подключить раздачу /assets/... и функции asset_url и picture в шаблонах."""
+    app.add_url_rule('/assets/<path:filename>', endpoint='assets', view_func=send_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['picture'] = picture
@@ -0,0 +1,198 @@
+"""
+Загрузка аватаров: потоковый приём с лимитом размера, миниатюры в фоне,
+хранение по хешу содержимого.
+
+Файлы лежат в static/avatars/<2 символа хеша>/<sha256>.<размер>.webp, в
+User.path_to_avatar пишется ключ '<2 символа>/<sha256>'. Одинаковые
+картинки хранятся один раз, а по адресу файла содержимое никогда не
+меняется, поэтому он раздаётся с Cache-Control: immutable.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import abort, send_from_directory
+
+from app.utils.assets import STATIC_DIR
+from app.utils.paths import (
+    AVATAR_FOLDER, AVATAR_SIZES, avatar_picture, avatar_storage_path, avatar_thumbnail_name, is_avatar_key,
+)
+
+AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', 5 * 1024 * 1024))
+AVATAR_MAX_PIXELS = 40_000_000
+AVATAR_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+AVATAR_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+
+
+class AvatarTooLarge(Exception):
+    """Файл больше AVATAR_MAX_BYTES"""
+
+
+class InvalidAvatar(Exception):
+    """Файл не является поддерживаемой картинкой"""
+
+
+class AvatarBusy(Exception):
+    """Очередь на обработку аватаров переполнена"""
+
+
+def receive(stream, directory: str, limit: int = AVATAR_MAX_BYTES):
+    """
+    Переписать поток запроса во временный файл кусками, считая sha256.
+
+    В памяти держится не больше CHUNK_SIZE байт; при превышении limit
+    приём прерывается, а временный файл удаляется.
+
+    Returns:
+        tuple: (путь к временному файлу, sha256 содержимого в hex)
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise AvatarTooLarge(f'Аватар больше {limit // (1024 * 1024)} МБ')
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise InvalidAvatar('Пустой файл')
+        return path, digest.hexdigest()
+    except Exception:
+        os.unlink(path)
+        raise
+
+
+def probe(path: str):
+    """Быстрая проверка по заголовку файла: формат и размеры (без декодирования)."""
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(path) as image:
+            if image.format not in AVATAR_FORMATS:
+                raise InvalidAvatar('Поддерживаются JPEG, PNG, WebP и GIF')
+            if image.width * image.height > AVATAR_MAX_PIXELS:
+                raise InvalidAvatar('Слишком большое разрешение')
+    except (UnidentifiedImageError, OSError):
+        raise InvalidAvatar('Файл не является картинкой')
+
+
+def make_thumbnails(source: str, directory: str, key: str):
+    """Квадратные миниатюры AVATAR_SIZES в WebP; исходный файл удаляется."""
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+            for size in AVATAR_SIZES:
+                thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                path = os.path.join(directory, avatar_thumbnail_name(key, size))
+                # Своё имя на каждую запись: одинаковые аватары могут загружаться одновременно
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix='.thumb-')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        thumbnail.save(f, 'WEBP', quality=85, method=4)
+                    os.replace(tmp, path)
+                except Exception:
+                    os.unlink(tmp)
+                    raise
+    finally:
+        os.unlink(source)
+
+
+class AvatarUploads:
+    """
+    Приём аватаров: файл принимается в потоке запроса, миниатюры
+    строятся в ограниченном пуле потоков.
+
+    Если миниатюры с таким хешем уже есть, обработка не нужна и
+    on_ready вызывается сразу. Не больше max_pending файлов ждут
+    обработки одновременно, остальные получают AvatarBusy.
+    """
+
+    def __init__(self, directory: str, workers: int = None, max_pending: int = None):
+        self.directory = directory
+        self.workers = workers or int(os.getenv('AVATAR_WORKERS', 0)) or 2
+        self.max_pending = max_pending or int(os.getenv('AVATAR_MAX_PENDING', 0)) or self.workers * 8
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def exists(self, key: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(self.directory, avatar_thumbnail_name(key, size)))
+            for size in AVATAR_SIZES
+        )
+
+    def upload(self, stream, on_ready) -> tuple:
+        """
+        Принять картинку из потока и поставить её обработку в очередь.
+
+        Args:
+            stream: Поток с телом запроса (request.stream)
+            on_ready: Вызывается с ключом аватара, когда миниатюры готовы
+
+        Returns:
+            tuple: (ключ аватара, готовы ли миниатюры уже сейчас)
+        """
+        if not self._slots.acquire(blocking=False):
+            raise AvatarBusy('Слишком много одновременных загрузок аватаров')
+        submitted = False
+        try:
+            path, digest = receive(stream, self.directory)
+            key = f'{digest[:2]}/{digest}'
+            if self.exists(key):
+                os.unlink(path)
+                on_ready(key)
+                return key, True
+            try:
+                probe(path)
+            except InvalidAvatar:
+                os.unlink(path)
+                raise
+            os.makedirs(os.path.join(self.directory, digest[:2]), exist_ok=True)
+            if self._pool is None:
+                with self._lock:
+                    if self._pool is None:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='avatars')
+            self._pool.submit(self._process, path, key, on_ready)
+            submitted = True
+            return key, False
+        finally:
+            if not submitted:
+                self._slots.release()
+
+    def _process(self, path: str, key: str, on_ready):
+        try:
+            make_thumbnails(path, self.directory, key)
+            on_ready(key)
+        except Exception as e:
+            print(f'ERROR avatar {key}: {e}', file=sys.stderr)
+        finally:
+            self._slots.release()
+
+
+avatar_uploads = AvatarUploads(avatar_storage_path(STATIC_DIR, ''))
+
+
+def send_avatar(filename):
+    if not is_avatar_key(filename.rsplit('.', 2)[0]):
+        abort(404)
+    response = send_from_directory(avatar_uploads.directory, filename, max_age=AVATAR_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={AVATAR_MAX_AGE}, immutable'
+    return response
+
+
+def init_app(app):
+    """Подключить раздачу загруженных аватаров по /avatars/... (неизменяемые URL) и avatar_picture в шаблонах."""
+    app.add_url_rule(f'/{AVATAR_FOLDER}/<path:filename>', endpoint='avatar_file', view_func=send_avatar)
+    app.jinja_env.globals['avatar_picture'] = avatar_picture
@@ -0,0 +1,226 @@
+"""
+Сборка статики: сжатые и уменьшенные варианты картинок (AVIF / WebP и
+запасной PNG или JPEG), имена с хешем содержимого и manifest.json.
+
+Запуск (из корня проекта, при деплое до старта воркеров; нужен Pillow):
+
+    python -m app.utils.build_assets
+
+Результат кладётся в app/static/dist; адреса из манифеста отдаёт
+asset_url (app/utils/assets.py).
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from app.utils.assets import DIST_DIR, MANIFEST_NAME, STATIC_DIR, pick_variant
+
+# Картинка (путь внутри static) -> ширины вариантов; None — исходная ширина
+IMAGES = {
+    'images/back.png': (1280, 1920),
+    'images/back1.png': (1280, 1920),
+    'images/back2.png': (1280, 1920),
+    'images/logo.png': (64, 192),
+    'images/btnplus.png': (None,),
+    'avatars/default_avatar.png': (96, 192),
+}
+
+STYLESHEETS = ('css/style.css',)
+SCRIPTS = ('js/script.js',)
+
+# (расширение, формат Pillow, параметры сохранения)
+MODERN_FORMATS = (
+    ('avif', 'AVIF', {'quality': 55, 'speed': 6}),
+    ('webp', 'WEBP', {'quality': 80, 'method': 5, 'alpha_quality': 70}),
+)
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'png': 'image/png', 'jpg': 'image/jpeg'}
+
+
+def fingerprint(name: str, data: bytes, suffix: str = '') -> str:
+    """'images/back.png' -> 'images/back<suffix>.<хеш>.png'"""
+    root, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return f'{root}{suffix}.{digest}{ext}'
+
+
+def write_asset(dist_dir: str, name: str, data: bytes) -> str:
+    """Записать файл в dist (если такого ещё нет) и вернуть его путь внутри dist."""
+    path = os.path.join(dist_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return name
+
+
+def encode(image, fmt: str, **params) -> bytes:
+    from io import BytesIO
+    buffer = BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def build_image(static_dir: str, dist_dir: str, source: str, widths) -> dict:
+    """Собрать варианты одной картинки: для каждой ширины — AVIF, WebP и запасной PNG/JPEG."""
+    from PIL import Image
+
+    with Image.open(os.path.join(static_dir, source)) as original:
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+    # Прозрачность не используется — запасной вариант выгоднее в JPEG
+    opaque = original.mode == 'RGB' or original.getchannel('A').getextrema()[0] == 255
+    if opaque:
+        original = original.convert('RGB')
+
+    root = os.path.splitext(source)[0]
+    variants = []
+    for width in sorted({min(w or original.width, original.width) for w in widths}):
+        image = original
+        if width < original.width:
+            height = round(original.height * width / original.width)
+            image = original.resize((width, height), Image.LANCZOS)
+        suffix = f'.{width}'
+        variant = {'width': width, 'height': image.height}
+        for ext, fmt, params in MODERN_FORMATS:
+            data = encode(image, fmt, **params)
+            variant[ext] = write_asset(dist_dir, fingerprint(f'{root}.{ext}', data, suffix), data)
+        if opaque:
+            data = encode(image, 'JPEG', quality=82, optimize=True, progressive=True)
+            variant['fallback'] = write_asset(dist_dir, fingerprint(f'{root}.jpg', data, suffix), data)
+        else:
+            data = encode(image, 'PNG', optimize=True)
+            variant['fallback'] = write_asset(dist_dir, fingerprint(f'{root}.png', data, suffix), data)
+        variants.append(variant)
+    return {'variants': variants}
+
+
+CSS_DECLARATION = re.compile(r'([\w-]+\s*:\s*)([^;{}]*url\([^;{}]*?)(\s*(?:;|}|$))', re.MULTILINE)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def rewrite_css(css: str, css_name: str, manifest: dict, static_url_path: str = '/static') -> str:
+    """
+    Заменить ссылки на картинки в CSS адресами из сборки.
+
+    Каждое объявление с собранной картинкой дублируется: сначала с запасным
+    форматом, затем с image-set(AVIF, WebP, запасной) — браузеры без
+    image-set() оставят первое. Прочие относительные ссылки становятся
+    абсолютными адресами статики (static_url_path — как у приложения
+    Flask), так как CSS теперь лежит в dist.
+    """
+    css_dir = os.path.dirname(css_name)
+
+    def resolve(ref):
+        if re.match(r'^(?:[a-z]+:|/|#)', ref):
+            return None
+        return os.path.normpath(os.path.join(css_dir, ref)).replace(os.sep, '/')
+
+    def relative(path):
+        return os.path.relpath(path, css_dir).replace(os.sep, '/')
+
+    def declaration(match):
+        prop, value, end = match.groups()
+        has_variants = False
+
+        def fallback_url(url_match):
+            nonlocal has_variants
+            source = resolve(url_match.group(2))
+            if source is None:
+                return url_match.group(0)
+            entry = manifest.get(source)
+            if entry is None:
+                return f"url('{static_url_path.rstrip('/')}/{source}')"
+            if 'variants' not in entry:
+                return f"url('{relative(entry['file'])}')"
+            has_variants = True
+            return f"url('{relative(pick_variant(entry['variants'])['fallback'])}')"
+
+        def image_set(url_match):
+            source = resolve(url_match.group(2))
+            entry = manifest.get(source) if source else None
+            if not entry or 'variants' not in entry:
+                return fallback_url(url_match)
+            variant = pick_variant(entry['variants'])
+            candidates = [
+                f"url('{relative(variant[ext])}') type('{MIME_TYPES[ext]}')" for ext, _, _ in MODERN_FORMATS
+            ]
+            fallback = variant['fallback']
+            candidates.append(f"url('{relative(fallback)}') type('{MIME_TYPES[fallback.rsplit('.', 1)[1]]}')")
+            return f"image-set({', '.join(candidates)})"
+
+        result = prop + CSS_URL.sub(fallback_url, value)
+        if has_variants:
+            result += '; ' + prop + CSS_URL.sub(image_set, value)
+        return result + end
+
+    return CSS_DECLARATION.sub(declaration, css)
+
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR, static_url_path: str = None) -> dict:
+    """
+    Собрать статику в dist_dir и записать manifest.json.
+
+    Старые файлы не удаляются: страницы, отданные до деплоя, продолжают
+    ссылаться на прежние имена. static_url_path по умолчанию берётся у
+    приложения (application.static_url_path).
+
+    Returns:
+        dict: Манифест {исходный путь: {'file': ...} или {'variants': [...]}}
+    """
+    if static_url_path is None:
+        from app import application
+        static_url_path = application.static_url_path
+
+    manifest = {}
+    for source, widths in IMAGES.items():
+        started = time.perf_counter()
+        manifest[source] = build_image(static_dir, dist_dir, source, widths)
+        print(f'{source}: {len(manifest[source]["variants"])} sizes, {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+
+    for source in SCRIPTS:
+        with open(os.path.join(static_dir, source), 'rb') as f:
+            data = f.read()
+        manifest[source] = {'file': write_asset(dist_dir, fingerprint(source, data), data)}
+
+    for source in STYLESHEETS:
+        with open(os.path.join(static_dir, source), encoding='utf-8', newline='') as f:
+            data = rewrite_css(f.read(), source, manifest, static_url_path).encode('utf-8')
+        manifest[source] = {'file': write_asset(dist_dir, fingerprint(source, data), data)}
+
+    os.makedirs(dist_dir, exist_ok=True)
+    tmp = os.path.join(dist_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist_dir, MANIFEST_NAME))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сборка статики с хешами в именах')
+    parser.add_argument('--static-dir', default=STATIC_DIR, help='Папка с исходной статикой')
+    parser.add_argument('--dist-dir', default=DIST_DIR, help='Куда класть результат')
+    args = parser.parse_args(argv)
+
+    manifest = build(args.static_dir, args.dist_dir)
+
+    def size(path):
+        return os.path.getsize(os.path.join(args.static_dir, path))
+
+    before = sum(size(source) for source in IMAGES)
+    after = sum(
+        os.path.getsize(os.path.join(args.dist_dir, pick_variant(manifest[source]['variants'])['webp']))
+        for source in IMAGES
+    )
+    print(f'Assets built: {len(manifest)} files, images {before // 1024} KB -> {after // 1024} KB (largest WebP)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+
+from flask import make_response, request
+
+
+def files_version(*paths) -> str:
+    """Метка версии по времени изменения файлов (шаблонов, скриптов).
+
+    Входит в ETag страниц, чтобы после деплоя новой разметки браузер
+    не получил 304 на закешированную старую.
+    """
+    mtimes = [os.path.getmtime(path) for path in paths if os.path.exists(path)]
+    return format(int(max(mtimes, default=0)), 'x')
+
+
+def make_etag(*parts) -> str | None:
+    """ETag из частей; None, если какая-то часть неизвестна (тогда без кеширования)."""
+    if any(part is None for part in parts):
+        return None
+    return '-'.join(str(part) for part in parts)
+
+
+def is_fresh(etag: str | None) -> bool:
+    """Совпадает ли ETag с If-None-Match запроса."""
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def with_etag(response, etag: str | None):
+    """Проставить ETag и заставить браузер перепроверять ответ при каждом запросе."""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag: str):
+    return with_etag(make_response('', 304), etag)
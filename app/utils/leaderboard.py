@@ -0,0 +1,72 @@
+import bisect
+import threading
+import time
+
+
+class Leaderboard:
+    """Снимок таблицы лидеров в памяти процесса.
+
+    Топ-N и распределение рейтингов перечитываются из БД не чаще раза
+    в interval секунд (первым запросом после истечения интервала, пока
+    остальные получают предыдущий снимок), а не на каждый запрос.
+    Место пользователя вне топа считается по распределению бинарным
+    поиском и может отставать от БД не больше чем на interval.
+    """
+
+    def __init__(self, db, size: int = 100, interval: float = 60.0):
+        self.db = db
+        self.size = size
+        self.interval = interval
+        self._top = []
+        self._positions = {}
+        self._ratings_asc = []
+        self._at_least = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        top = self.db.get_leaderboard(limit=self.size)
+        histogram = self.db.get_rating_histogram()
+
+        # _at_least[i] — сколько пользователей с рейтингом не ниже _ratings_asc[i]
+        ratings_asc, at_least, total = [], [], 0
+        for rating, count in histogram:
+            total += count
+            ratings_asc.append(rating)
+            at_least.append(total)
+        ratings_asc.reverse()
+        at_least.reverse()
+
+        self._top = top
+        self._positions = {row['user_id']: i + 1 for i, row in enumerate(top)}
+        self._ratings_asc, self._at_least = ratings_asc, at_least
+        self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.interval:
+            return
+        # Обновляет один поток; если снимок уже есть, остальные его не ждут
+        if self._lock.acquire(blocking=self._loaded_at is None):
+            try:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.interval:
+                    self._refresh()
+            finally:
+                self._lock.release()
+
+    def top(self, limit: int = None):
+        """Топ пользователей из снимка (список словарей get_leaderboard)."""
+        self._ensure_fresh()
+        return self._top[:limit] if limit else list(self._top)
+
+    def rank(self, user_id: int, rating: int) -> int:
+        """Место пользователя: 1 + число пользователей с рейтингом выше."""
+        self._ensure_fresh()
+        if user_id in self._positions:
+            return self._positions[user_id]
+        i = bisect.bisect_right(self._ratings_asc, rating)
+        if i == len(self._ratings_asc):
+            return 1
+        return self._at_least[i] + 1
+
+    def invalidate(self):
+        self._loaded_at = None
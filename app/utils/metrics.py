@@ -0,0 +1,258 @@
+"""
+Метрики запросов в формате Prometheus.
+
+Для каждого endpoint считаются: число запросов по статусам, время ответа,
+число SQL-запросов, суммарное время SQL, коммиты, выдачи соединений из пула
+и время ожидания соединения. SQL-события берутся из событий SQLAlchemy
+(Engine / Pool), время ответа — из хуков Flask. Отдаются по /metrics;
+в режиме отладки у каждого ответа есть заголовки X-Query-Count и X-SQL-Time.
+
+Кроме того, отдаются попадания, промахи и размер кешей процесса
+(кеш пользователей Flask-Login и др.).
+
+Метрики живут в памяти процесса: при нескольких воркерах каждый
+отдаёт свои, Prometheus собирает их как отдельные цели.
+"""
+import hmac
+import os
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Счётчик с метками (только растёт)."""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    """Гистограмма с метками и фиксированными границами корзин."""
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [счётчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * len(self.buckets) + [0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((labels, list(row)) for labels, row in self._values.items())
+        names = self.labels + ('le',)
+        for labels, row in items:
+            for bound, count in zip(self.buckets, row):
+                yield f'{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {count}'
+            yield f'{self.name}_bucket{_format_labels(names, labels + ("+Inf",))} {row[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(row[-2])}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {row[-1]}'
+
+
+class CacheStats:
+    """Счётчики кешей TTLCache: читаются из их stats() при каждой отдаче /metrics."""
+
+    METRICS = (
+        ('hits', 'cache_hits_total', 'counter', 'Cache hits'),
+        ('misses', 'cache_misses_total', 'counter', 'Cache misses'),
+        ('size', 'cache_entries', 'gauge', 'Entries currently in the cache'),
+        ('maxsize', 'cache_max_entries', 'gauge', 'Cache capacity'),
+    )
+
+    def __init__(self):
+        self._caches = {}
+
+    def watch(self, name: str, cache):
+        self._caches[name] = cache
+
+    def render(self):
+        stats = [(name, cache.stats()) for name, cache in sorted(self._caches.items())]
+        for key, metric, kind, documentation in self.METRICS:
+            yield f'# HELP {metric} {documentation}'
+            yield f'# TYPE {metric} {kind}'
+            for name, values in stats:
+                yield f'{metric}{_format_labels(("cache",), (name,))} {_format_value(values[key])}'
+
+
+requests_total = Counter('http_requests_total', 'HTTP requests', ('endpoint', 'method', 'status'))
+request_duration = Histogram('http_request_duration_seconds', 'Response latency', ('endpoint',))
+request_queries = Histogram('db_queries_per_request', 'SQL statements per request', ('endpoint',),
+                            buckets=QUERY_COUNT_BUCKETS)
+request_sql_time = Histogram('db_sql_seconds_per_request', 'Total SQL execution time per request', ('endpoint',))
+request_pool_wait = Histogram('db_pool_wait_seconds_per_request', 'Time spent acquiring a pooled connection',
+                              ('endpoint',))
+commits_total = Counter('db_commits_total', 'Transaction commits', ('endpoint',))
+checkouts_total = Counter('db_pool_checkouts_total', 'Connection pool checkouts', ('endpoint',))
+caches = CacheStats()
+
+REGISTRY = (requests_total, request_duration, request_queries, request_sql_time, request_pool_wait,
+            commits_total, checkouts_total, caches)
+
+
+def render() -> str:
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+# ==================== СБОР ====================
+
+def _stats():
+    """Счётчики текущего запроса (None вне запроса: CLI, фоновые потоки)."""
+    if not has_request_context():
+        return None
+    return g.get('metrics')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    stats = _stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['sql_time'] += time.perf_counter() - started
+
+
+def _handle_error(context):
+    # Упавший запрос не дойдёт до after_cursor_execute
+    stack = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+def _on_commit(conn):
+    stats = _stats()
+    if stats is not None:
+        stats['commits'] += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = _stats()
+    if stats is not None:
+        stats['checkouts'] += 1
+
+
+def _on_pool_wait(seconds):
+    stats = _stats()
+    if stats is not None:
+        stats['pool_wait'] += seconds
+
+
+def _start_request():
+    g.metrics = {'started': time.perf_counter(), 'queries': 0, 'sql_time': 0.0, 'commits': 0,
+                 'checkouts': 0, 'pool_wait': 0.0}
+
+
+def _finish_request(response):
+    stats = g.pop('metrics', None)
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    labels = (endpoint,)
+    requests_total.inc((endpoint, request.method, str(response.status_code)))
+    request_duration.observe(labels, time.perf_counter() - stats['started'])
+    request_queries.observe(labels, stats['queries'])
+    request_sql_time.observe(labels, stats['sql_time'])
+    request_pool_wait.observe(labels, stats['pool_wait'])
+    if stats['commits']:
+        commits_total.inc(labels, stats['commits'])
+    if stats['checkouts']:
+        checkouts_total.inc(labels, stats['checkouts'])
+    if current_app.debug:
+        response.headers['X-Query-Count'] = str(stats['queries'])
+        response.headers['X-SQL-Time'] = f"{stats['sql_time'] * 1000:.1f}ms"
+    return response
+
+
+def metrics_view():
+    token = os.getenv('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+_listeners_lock = threading.Lock()
+_listeners_installed = False
+
+
+def _install_listeners():
+    """Подписаться на события SQLAlchemy один раз на процесс, сколько бы приложений ни создавалось."""
+    global _listeners_installed
+    with _listeners_lock:
+        if _listeners_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        event.listen(Engine, 'commit', _on_commit)
+        event.listen(Pool, 'checkout', _on_checkout)
+
+        from database.database import TimedQueuePool
+        TimedQueuePool.wait_listeners.add(_on_pool_wait)
+        _listeners_installed = True
+
+
+def init_app(app):
+    """
+    Подключить сбор метрик и /metrics (METRICS_TOKEN в окружении — требовать Bearer-токен).
+
+    Регистрировать до db.init_app: after_request выполняются в обратном
+    порядке, и тогда коммит сессии запроса попадает в метрики запроса.
+    """
+    _install_listeners()
+
+    from app.utils.users import user_cache
+    caches.watch('users', user_cache)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', endpoint='metrics', view_func=metrics_view)
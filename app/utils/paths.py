@@ -1,19 +1,49 @@
+import re
+
 from flask import url_for
 
+from app.utils.assets import asset_url, img_tag, picture
+
 DEFAULT_AVATAR_FILENAME = 'default_avatar.png'
 AVATAR_FOLDER = 'avatars'  # внутри static
+# Загруженные аватары: '<первые 2 символа хеша>/<sha256>', файлы '<ключ>.<размер>.webp'
+AVATAR_SIZES = (64, 192)
+AVATAR_KEY = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}$')
+
+
+def is_avatar_key(filename: str | None) -> bool:
+    return bool(filename) and AVATAR_KEY.match(filename) is not None
+
 
+def avatar_thumbnail_name(key: str, size: int) -> str:
+    """Имя файла миниатюры: наименьший размер из AVATAR_SIZES не меньше size."""
+    size = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    return f'{key}.{size}.webp'
 
-def avatar_url(filename: str | None) -> str:
+
+def avatar_url(filename: str | None, size: int = 192) -> str:
     """Построить полный URL для аватара по имени файла.
     Если filename пустой или None, используется дефолт.
+    Для загруженных аватаров (ключ по хешу) — неизменяемый URL миниатюры размера size.
     """
-    if not filename:
-        filename = DEFAULT_AVATAR_FILENAME
+    if not filename or filename == DEFAULT_AVATAR_FILENAME:
+        return asset_url(f'{AVATAR_FOLDER}/{DEFAULT_AVATAR_FILENAME}', width=size)
+    if is_avatar_key(filename):
+        return url_for('avatar_file', filename=avatar_thumbnail_name(filename, size))
     # filename хранится без подпапки; добавляем папку avatars
     return url_for('static', filename=f'{AVATAR_FOLDER}/{filename}')
 
 
+def avatar_picture(filename: str | None, size: int = 192, **attrs):
+    """
+    Разметка аватара для шаблона: аватар по умолчанию — <picture> с AVIF/WebP
+    из сборки, загруженные (уже WebP) и старые — <img> с avatar_url.
+    """
+    if not filename or filename == DEFAULT_AVATAR_FILENAME:
+        return picture(f'{AVATAR_FOLDER}/{DEFAULT_AVATAR_FILENAME}', width=size, **attrs)
+    return img_tag(avatar_url(filename, size), **attrs)
+
+
 def avatar_storage_path(base_static_path: str, filename: str) -> str:
     """Вернуть абсолютный путь на диске для сохранения файла аватара.
     base_static_path: путь до папки static (app.static_folder).
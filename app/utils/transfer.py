@@ -0,0 +1,213 @@
+"""
+Потоковый импорт и экспорт задач и привычек в CSV и NDJSON.
+
+Импорт читает тело запроса построчно и отдаёт проверенные строки
+итератором — Database.import_user_rows вставляет их пачками. Экспорт
+превращает пачки строк из Database.iter_user_rows в куски текста для
+потокового ответа. Ни там, ни там все строки пользователя в памяти не
+собираются.
+
+Колонки экспорта совпадают с колонками импорта (плюс служебные id,
+created_at и т.п., которые при импорте игнорируются), так что
+выгруженный файл можно загрузить обратно.
+"""
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+
+from functions import POINTS_TABLE, REPEAT_TYPES
+
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', 50000))
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+EXPORT_COLUMNS = {
+    'tasks': ('id', 'title', 'notes', 'status', 'difficulty', 'deadline', 'created_at', 'completed_at'),
+    'habits': ('id', 'title', 'notes', 'difficulty', 'start_date', 'repeat_type', 'repeat_every',
+               'repeat_days', 'streak'),
+}
+
+TASK_STATUSES = ('in_progress', 'completed')
+
+
+class InvalidImport(Exception):
+    """Файл импорта не разбирается или содержит некорректную строку"""
+
+
+def detect_format(requested: str = None, mimetype: str = None) -> str | None:
+    """Формат по явному параметру ?format= или по Content-Type; None — неизвестный."""
+    if requested:
+        return requested if requested in FORMATS else None
+    for fmt, fmt_mimetype in FORMATS.items():
+        if mimetype == fmt_mimetype:
+            return fmt
+    if mimetype in ('application/jsonl', 'application/json-lines'):
+        return 'ndjson'
+    return None
+
+
+# ==================== ИМПОРТ ====================
+
+def read_records(stream, fmt: str):
+    """
+    Записи файла по одной: (номер строки, словарь).
+
+    stream — бинарный поток (request.stream); читается по мере разбора.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise InvalidImport(f'Строка {line_no}: некорректный JSON')
+                if not isinstance(record, dict):
+                    raise InvalidImport(f'Строка {line_no}: ожидается JSON-объект')
+                yield line_no, record
+    except UnicodeDecodeError:
+        raise InvalidImport('Файл должен быть в кодировке UTF-8')
+    except csv.Error as e:
+        raise InvalidImport(f'Некорректный CSV: {e}')
+    finally:
+        text.detach()
+
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f'не заполнено поле {field}')
+        return None
+    return str(value).strip()
+
+
+def _choice(record, field, choices, default):
+    value = _text(record, field) or default
+    if value not in choices:
+        raise ValueError(f'{field} должно быть одним из: {", ".join(choices)}')
+    return value
+
+
+def _int(record, field, default, minimum):
+    value = _text(record, field)
+    if value is None:
+        return default
+    if not value.isdigit() or int(value) < minimum:
+        raise ValueError(f'{field} должно быть целым числом не меньше {minimum}')
+    return int(value)
+
+
+def _datetime(record, field):
+    value = _text(record, field)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{field}: ожидается дата YYYY-MM-DD или дата и время ISO 8601')
+
+
+def task_row(record) -> dict:
+    """Колонки Task из записи файла (ValueError, если запись некорректна)."""
+    status = _choice(record, 'status', TASK_STATUSES, 'in_progress')
+    return {
+        'title': _text(record, 'title', required=True),
+        'notes': _text(record, 'notes'),
+        'status': status,
+        'difficulty': _choice(record, 'difficulty', tuple(POINTS_TABLE), 'easy'),
+        'deadline': _datetime(record, 'deadline'),
+        'completed_at': _datetime(record, 'completed_at') if status == 'completed' else None,
+    }
+
+
+def habit_row(record) -> dict:
+    """Колонки Habit из записи файла (ValueError, если запись некорректна)."""
+    start_date = _text(record, 'start_date')
+    if start_date is not None:
+        try:
+            start_date = date.fromisoformat(start_date[:10]).isoformat()
+        except ValueError:
+            raise ValueError('start_date: ожидается дата YYYY-MM-DD')
+    repeat_days = _text(record, 'repeat_days') or '1,2,3,4,5'
+    days = [day.strip() for day in repeat_days.split(',')]
+    if not all(day.isdigit() and 0 <= int(day) <= 6 for day in days):
+        raise ValueError('repeat_days: ожидаются номера дней 0-6 через запятую')
+    return {
+        'title': _text(record, 'title', required=True),
+        'notes': _text(record, 'notes'),
+        'difficulty': _choice(record, 'difficulty', tuple(POINTS_TABLE), 'easy'),
+        'start_date': start_date,
+        'repeat_type': _choice(record, 'repeat_type', REPEAT_TYPES, 'weekly'),
+        'repeat_every': _int(record, 'repeat_every', 1, 1),
+        'repeat_days': ','.join(days),
+        'streak': _int(record, 'streak', 0, 0),
+    }
+
+
+ROW_PARSERS = {'tasks': task_row, 'habits': habit_row}
+
+
+def parse_import(stream, fmt: str, kind: str, limit: int = IMPORT_MAX_ROWS):
+    """
+    Проверенные строки для Database.import_user_rows.
+
+    Raises:
+        InvalidImport: При первой некорректной строке или превышении limit
+        (к этому моменту импорт ещё в транзакции и будет откачен)
+    """
+    parse_row = ROW_PARSERS[kind]
+    count = 0
+    for line_no, record in read_records(stream, fmt):
+        count += 1
+        if count > limit:
+            raise InvalidImport(f'Не больше {limit} строк за один импорт')
+        try:
+            yield parse_row(record)
+        except ValueError as e:
+            raise InvalidImport(f'Строка {line_no}: {e}')
+
+
+# ==================== ЭКСПОРТ ====================
+
+def _export_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_lines(chunks, fmt: str, columns):
+    """
+    Куски текста для потокового ответа: по одному на пачку строк.
+
+    chunks — итератор пачек словарей (Database.iter_user_rows).
+    """
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for chunk in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_export_value(row[column]) for column in columns] for row in chunk)
+            yield buffer.getvalue()
+    else:
+        for chunk in chunks:
+            yield ''.join(
+                json.dumps({column: _export_value(row[column]) for column in columns}, ensure_ascii=False) + '\n'
+                for row in chunk
+            )
@@ -0,0 +1,37 @@
+from flask_login import UserMixin
+
+from app.utils.cache import TTLCache
+
+
+class CachedUser(UserMixin):
+    """Облегчённая запись пользователя для Flask-Login (без хеша пароля)."""
+
+    __slots__ = ('id', 'nickname', 'username', 'email', 'path_to_avatar')
+
+    def __init__(self, id, nickname, username, email, path_to_avatar):
+        self.id = id
+        self.nickname = nickname
+        self.username = username
+        self.email = email
+        self.path_to_avatar = path_to_avatar
+
+
+# Записи живут недолго: в других воркерах изменения профиля видны не позже чем через ttl
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
+
+def load_cached_user(db, user_id: int) -> CachedUser | None:
+    """Получить пользователя из кеша или одним лёгким запросом из БД."""
+    user = user_cache.get(user_id)
+    if user is None:
+        record = db.get_user_record(user_id)
+        if record is None:
+            return None
+        user = CachedUser(**record)
+        user_cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id: int):
+    """Сбросить запись после изменения профиля или аватара."""
+    user_cache.pop(user_id)
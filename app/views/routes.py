@@ -1,4 +1,4 @@
-from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask import render_template, request, jsonify, redirect, url_for, flash, make_response, Response, current_app
 
 from flask_login import login_user, logout_user, login_required, current_user
 
@@ -10,46 +10,75 @@ from database.models import User
 
 from database.database import db
 
-from functions import is_habit_active
+from functions import is_habit_active, habits_calendar, local_today, POINTS_TABLE
 
-import sys
+from app.utils.cache import TTLCache
 
-import pytz
+from app.utils.leaderboard import Leaderboard
 
-from datetime import datetime, date, timedelta
+from app.utils.users import load_cached_user, invalidate_user
+
+from app.utils.conditional import files_version, make_etag, is_fresh, with_etag, not_modified
+
+from app.utils.avatars import avatar_uploads, AvatarTooLarge, InvalidAvatar, AvatarBusy, AVATAR_MAX_BYTES
 
-from dateutil.relativedelta import relativedelta
+from app.utils.transfer import detect_format, parse_import, export_lines, InvalidImport, FORMATS, EXPORT_COLUMNS, IMPORT_BATCH_SIZE, EXPORT_CHUNK_SIZE
+
+from auth import HasherBusy
+
+import os
+
+import sys
+
+from datetime import datetime, date, timedelta
 
 # ...existing code...
 
 
 # === Вставляем роут после импортов и до остальных маршрутов ===
 
+# Детали привычек для окна редактирования: {(user_id, habit_id): (поколение, данные)}
+
+habit_details_cache = TTLCache(maxsize=4096, ttl=600)
+
+
 @application.route('/get_habit_details')
 
 @login_required
 
 def get_habit_details():
 
-    habit_id = request.args.get('habit_id')
+    habit_id = request.args.get('habit_id', type=int)
 
     if not habit_id:
 
         return jsonify({'success': False, 'error': 'No habit_id'}), 400
 
-    user_habits = db.get_user_habits(current_user.id)
+    generation = db.get_user_generation(current_user.id)
 
-    habit = next((h for h in user_habits if str(h.id) == str(habit_id)), None)
+    etag = make_etag('habit', current_user.id, habit_id, generation)
 
-    if not habit:
+    if is_fresh(etag):
 
-        return jsonify({'success': False, 'error': 'Not found'}), 404
+        return not_modified(etag)
 
-    return jsonify({
+    # Кеш по (пользователь, привычка) действителен, пока не изменилось поколение данных пользователя
 
-        'success': True,
+    cached = habit_details_cache.get((current_user.id, habit_id))
+
+    if cached is not None and generation is not None and cached[0] == generation:
 
-        'habit': {
+        details = cached[1]
+
+    else:
+
+        habit = db.get_user_habit(current_user.id, habit_id)
+
+        if not habit:
+
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+
+        details = {
 
             'id': habit.id,
 
@@ -71,7 +100,64 @@ def get_habit_details():
 
         }
 
-    })
+        habit_details_cache.set((current_user.id, habit_id), (generation, details))
+
+    return with_etag(jsonify({'success': True, 'habit': details}), etag)
+
+# Календарь привычек: {(user_id, from, to): (поколение, результат)}
+
+calendar_cache = TTLCache(maxsize=8192, ttl=3600)
+
+CALENDAR_MAX_DAYS = 366
+
+
+@application.route('/habits/calendar')
+
+@login_required
+
+def habits_calendar_route():
+
+    """Даты выполнения привычек пользователя в окне ?from=YYYY-MM-DD&to=YYYY-MM-DD"""
+
+    today = local_today()
+
+    try:
+
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else today
+
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else date_from + timedelta(days=30)
+
+    except ValueError:
+
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    if date_to < date_from or (date_to - date_from).days >= CALENDAR_MAX_DAYS:
+
+        return jsonify({'success': False, 'error': f'Window must be 1..{CALENDAR_MAX_DAYS} days'}), 400
+
+
+    window = (date_from.isoformat(), date_to.isoformat())
+
+    # Как и детали привычек, запись действительна, пока не изменилось поколение данных
+    # пользователя: изменение привычки в любом воркере делает её устаревшей везде
+
+    generation = db.get_user_generation(current_user.id)
+
+    cached = calendar_cache.get((current_user.id, *window))
+
+    if cached is not None and generation is not None and cached[0] == generation:
+
+        habits = cached[1]
+
+    else:
+
+        habits = habits_calendar(db.get_user_habits(current_user.id), date_from, date_to)
+
+        calendar_cache.set((current_user.id, *window), (generation, habits))
+
+
+    return jsonify({'success': True, 'from': window[0], 'to': window[1], 'habits': habits})
+
 
 from flask import render_template, request, jsonify, redirect, url_for, flash
 
@@ -91,7 +177,7 @@ from database.database import db
 @login_manager.user_loader
 def load_user(user_id):
 
-    return db.get_user_by_id(int(user_id))
+    return load_cached_user(db, int(user_id))
 
 
 # Маршруты аутентификации
@@ -122,7 +208,16 @@ def login():
             user = db.get_user_by_email(username)
         
 
-        if user and db.verify_user_password(user, password):
+        try:
+
+            verified = bool(user) and db.verify_user_password(user, password)
+
+        except HasherBusy:
+
+            return render_template('login.html', error='Сервер перегружен, попробуйте войти через минуту'), 503
+
+
+        if verified:
 
             login_user(user)
 
@@ -208,6 +303,10 @@ def register():
 
             return redirect(url_for('index'))
 
+        except HasherBusy:
+
+            return render_template('register.html', error='Сервер перегружен, попробуйте через минуту'), 503
+
         except Exception as e:
 
             return render_template('register.html', error=f'Ошибка при регистрации: {str(e)}')
@@ -229,186 +328,149 @@ def logout():
     return redirect(url_for('login'))
 
 
-@application.route('/')
-
-@login_required
-
-def index():
-
-    tz = pytz.timezone('Asia/Yekaterinburg')
-
-    today = datetime.now(tz).date()
-
-    yesterday = today - timedelta(days=1)
-
-
-    user_stats = db.get_user_stats(current_user.id)
-
-    user_tasks = db.get_user_tasks(current_user.id)
+# Версия разметки дашборда для ETag: меняется при деплое шаблона или скриптов
 
-    user_habits = db.get_user_habits(current_user.id)
+DASHBOARD_VERSION = files_version(*(os.path.join(application.root_path, path) for path in (
 
-    user_achievements = db.get_user_achievements(current_user.id)
-
-
-    # === 1. Проверка пропусков ЗА ВЧЕРА (пока completed_today ещё за вчера) ===
-
-    for habit in user_habits:
-
-        # Пропускаем, если привычка ещё не началась
-
-        start_date = None
-
-        if habit.start_date:
-
-            try:
+    'templates/index.html', 'static/js/script.js', 'static/css/style.css', 'static/dist/manifest.json')))
 
-                start_date = datetime.strptime(habit.start_date, '%Y-%m-%d').date()
 
-                if today < start_date:
-                    continue
-
-            except:
-
-                start_date = today
-        else:
-
-            start_date = today
+@application.route('/')
 
+@login_required
 
-        # Не штрафуем за пропуск, если привычка только что создана (её start_date >= yesterday)
+def index():
 
-        if start_date > yesterday:
+    today = local_today()
 
-            db.update_habit_last_checked(habit.id, yesterday.strftime('%Y-%m-%d'))
-            continue
+    # Вкладка, которая ничего не меняла, получает 304 после одного лёгкого запроса поколения
 
+    etag = make_etag('dashboard', current_user.id, db.get_user_generation(current_user.id), today.isoformat(), DASHBOARD_VERSION)
 
-        # Проверяем ТОЛЬКО вчерашний день (упрощаем логику)
+    if is_fresh(etag):
 
-        if is_habit_active(habit, yesterday):
+        return not_modified(etag)
 
-            # Если не была выполнена к концу вчерашнего дня
 
-            if not habit.completed_today:  # ← это состояние на конец дня
+    # Перевод привычек на новый день (штрафы за вчера) выполняет ночная задача
+    # database/rollover.py; «выполнено сегодня» хранится по датам и сброса не требует
 
-                points_table = {
+    # === 1. Загружаем данные одним запросом ===
 
-                    'trivial': (10, -30),
+    dashboard = db.get_dashboard(current_user.id, today)
 
-                    'easy': (25, -25),
+    if dashboard is None:
 
-                    'medium': (40, -20),
+        # Пользователя уже нет в БД (запись ещё жила в кеше Flask-Login) — завершаем сессию
 
-                    'hard': (60, -15),
+        invalidate_user(current_user.id)
 
-                }
+        logout_user()
 
-                pts = points_table.get(habit.difficulty, (25, -25))
+        return redirect(url_for('login'))
 
-                db.add_user_rating(current_user.id, pts[1])
+    for habit in dashboard['habits']:
 
-                db.update_habit_streak(habit.id, 0)
+        habit['active'] = is_habit_active(habit, today)
 
 
-        # Обновляем last_checked_date до вчера
+    # === 2. Формируем данные для шаблона ===
 
-        db.update_habit_last_checked(habit.id, yesterday.strftime('%Y-%m-%d'))
+    user_data = {
 
+        'nickname': current_user.nickname,
 
-    # === 2. Сброс completed_today для СЕГОДНЯ ===
+        'username': current_user.username,
 
-    for habit in user_habits:
+        'path_to_avatar': current_user.path_to_avatar,
 
-        if is_habit_active(habit, today):
+        **dashboard
 
-            db.update_habit_completed_today(habit.id, False)
+    }
 
+    return with_etag(make_response(render_template('index.html', user=user_data)), etag)
 
-    # === 3. Обновляем данные после изменений ===
+@application.route('/aboutus')
 
-    user_stats = db.get_user_stats(current_user.id)
+def aboutus():
+    return render_template('aboutus.html')
 
-    user_habits = db.get_user_habits(current_user.id)
+# Топ-100 держим в памяти и перечитываем раз в минуту
 
+leaderboard = Leaderboard(db, size=100, interval=60)
 
-    # === 4. Формируем данные для шаблона ===
+LEADERBOARD_PAGE_LIMIT = 100
 
-    user_data = {
 
-        'nickname': current_user.nickname,
+def leaderboard_entry(row, position):
 
-        'username': current_user.username,
+    return {
 
-        'avatar': avatar_url(current_user.path_to_avatar),
+        'position': position,
 
-        'rating': user_stats.rating if user_stats else 0,
+        'user_id': row['user_id'],
 
-        'achievements': [
+        'nickname': row['nickname'],
 
-            {'title': ach.title, 'description': ach.description}
+        'username': row['username'],
 
-            for ach in user_achievements
+        'avatar': avatar_url(row['path_to_avatar'], size=64),
 
-        ],
+        'rating': row['rating']
 
-        'tasks': [
+    }
 
-            {
 
-                'id': task.id,
+@application.route('/rating')
 
-                'title': task.title,
+def rating():
 
-                'status': task.status,
+    top = [leaderboard_entry(row, i + 1) for i, row in enumerate(leaderboard.top())]
 
-                'notes': task.notes,
+    me = None
 
-                'difficulty': task.difficulty,
+    if current_user.is_authenticated:
 
-                'deadline': task.deadline.strftime('%Y-%m-%d') if task.deadline else None
+        stats = db.get_user_stats(current_user.id)
 
-            }
+        if stats:
 
-            for task in user_tasks
+            me = {'user_id': current_user.id, 'rating': stats.rating, 'position': leaderboard.rank(current_user.id, stats.rating)}
 
-        ],
+    return render_template('rating.html', top=top, me=me)
 
-        'habits': [
 
-            {
+@application.route('/rating/page')
 
-                'id': habit.id,
+def rating_page():
 
-                'title': habit.title,
+    """Следующая страница таблицы лидеров: ?after_rating=&after_id=&limit="""
 
-                'streak': habit.streak,
+    try:
 
-                'difficulty': habit.difficulty,
+        limit = min(int(request.args.get('limit', 50)), LEADERBOARD_PAGE_LIMIT)
 
-                'notes': habit.notes,
+        after = None
 
-                'active': is_habit_active(habit, today)
+        if request.args.get('after_rating') is not None:
 
-            }
+            after = (int(request.args['after_rating']), int(request.args.get('after_id', 0)))
 
-            for habit in user_habits
+    except ValueError:
 
-        ]
+        return jsonify({'success': False, 'error': 'Invalid paging parameters'}), 400
 
-    }
+    position = request.args.get('position', type=int) or 0
 
-    return render_template('index.html', user=user_data)
+    rows = db.get_leaderboard(after=after, limit=max(limit, 1))
 
-@application.route('/aboutus')
+    return jsonify({
 
-def aboutus():
-    return render_template('aboutus.html')
+        'success': True,
 
-@application.route('/rating')
+        'entries': [leaderboard_entry(row, position + i + 1) for i, row in enumerate(rows)]
 
-def rating():
-    return render_template('rating.html')
+    })
 
 
 @application.route('/update_rating', methods=['POST'])
@@ -466,6 +528,48 @@ def add_achievement():
     return jsonify({'success': False}), 400
 
 
+# Сериализация сущностей для JSON-ответов (те же поля, что в шаблоне index.html)
+
+def task_payload(task):
+
+    return {
+
+        'id': task.id,
+
+        'title': task.title,
+
+        'status': task.status,
+
+        'notes': task.notes,
+
+        'difficulty': task.difficulty,
+
+        'deadline': task.deadline.strftime('%Y-%m-%d') if task.deadline else None
+
+    }
+
+
+def habit_payload(habit, today=None, completed_today=False):
+
+    return {
+
+        'id': habit.id,
+
+        'title': habit.title,
+
+        'streak': habit.streak,
+
+        'difficulty': habit.difficulty,
+
+        'notes': habit.notes,
+
+        'active': is_habit_active(habit, today or local_today()),
+
+        'completed_today': completed_today
+
+    }
+
+
 @application.route('/add_task', methods=['POST'])
 
 @login_required
@@ -490,7 +594,7 @@ def add_task():
 
             try:
 
-                db.add_user_task(
+                task = db.add_user_task(
                     user_id=current_user.id,
                     title=title,
                     notes=notes,
@@ -499,7 +603,7 @@ def add_task():
                     deadline=deadline
                 )
 
-                return jsonify({'success': True})
+                return jsonify({'success': True, 'task': task_payload(task)})
 
             except Exception as e:
 
@@ -524,37 +628,27 @@ def update_task():
 
         difficulty = request.json.get('difficulty', 'easy')
 
-        # Таблица баллов: 1-trivial, 2-easy, 3-medium, 4-hard
-
-        # 1: +10/-30, 2: +25/-25, 3: +40/-20, 4: +60/-15
-
-        points_table = {
-
-            'trivial': (10, -30),
-
-            'easy': (25, -25),
-
-            'medium': (40, -20),
+        if task_id and status:
 
-            'hard': (60, -15),
+            try:
 
-        }
+                task = db.get_user_task(current_user.id, task_id)
 
-        if task_id and status:
+                if not task:
 
-            try:
+                    return jsonify({'success': False, 'error': 'Task not found'}), 404
 
-                db.update_task_status(task_id, status)
+                db.update_task_status(task_id, status, user_id=current_user.id)
 
-                # Изменение рейтинга
+                # Изменение рейтинга (по сложности из БД, а не из запроса)
 
-                pts = points_table.get(difficulty, (10, -30))
+                pts = POINTS_TABLE.get(task.difficulty or difficulty, POINTS_TABLE['trivial'])
 
                 delta = pts[0] if status == 'completed' else pts[1]
 
-                db.add_user_rating(current_user.id, delta)
+                new_rating = db.add_user_rating(current_user.id, delta, source='task')
 
-                return jsonify({'success': True, 'rating_delta': delta})
+                return jsonify({'success': True, 'rating_delta': delta, 'rating': new_rating})
 
             except Exception as e:
 
@@ -589,17 +683,23 @@ def update_task_details():
 
             try:
 
-                db.update_task_details(
+                task = db.update_task_details(
 
                     task_id=task_id,
                     title=title,
                     notes=notes,
 
                     difficulty=difficulty,
-                    deadline=deadline
+                    deadline=deadline,
+
+                    user_id=current_user.id
                 )
 
-                return jsonify({'success': True})
+                if not task:
+
+                    return jsonify({'success': False, 'error': 'Task not found'}), 404
+
+                return jsonify({'success': True, 'task': task_payload(task)})
 
             except Exception as e:
 
@@ -624,9 +724,11 @@ def delete_task_route():
 
             try:
 
-                db.delete_task(task_id)
+                if not db.delete_task(task_id, user_id=current_user.id):
 
-                return jsonify({'success': True})
+                    return jsonify({'success': False, 'error': 'Task not found'}), 404
+
+                return jsonify({'success': True, 'task_id': int(task_id)})
 
             except Exception as e:
 
@@ -663,7 +765,7 @@ def add_habit():
 
             try:
 
-                db.add_user_habit(
+                habit = db.add_user_habit(
                     user_id=current_user.id,
                     title=title,
                     notes=notes,
@@ -678,7 +780,7 @@ def add_habit():
                     repeat_days=repeat_days
                 )
 
-                return jsonify({'success': True})
+                return jsonify({'success': True, 'habit': habit_payload(habit)})
 
             except Exception as e:
 
@@ -700,8 +802,6 @@ def update_habit_details():
 
         data = request.json
 
-        print('DEBUG /update_habit_details data:', data, file=sys.stderr)
-
         habit_id = data.get('habit_id')
 
         title = data.get('title')
@@ -724,7 +824,7 @@ def update_habit_details():
 
             try:
 
-                db.update_habit_details(
+                habit = db.update_habit_details(
 
                     habit_id=habit_id,
                     title=title,
@@ -739,10 +839,18 @@ def update_habit_details():
 
                     repeat_days=repeat_days,
 
-                    streak=streak
+                    streak=streak,
+
+                    user_id=current_user.id
                 )
 
-                return jsonify({'success': True})
+                if not habit:
+
+                    return jsonify({'success': False, 'error': 'Habit not found'}), 404
+
+                completed_today = habit.id in db.get_completed_habit_ids(current_user.id, local_today())
+
+                return jsonify({'success': True, 'habit': habit_payload(habit, completed_today=completed_today)})
 
             except Exception as e:
 
@@ -772,9 +880,11 @@ def delete_habit_route():
 
             try:
 
-                db.delete_habit(habit_id)
+                if not db.delete_habit(habit_id, user_id=current_user.id):
 
-                return jsonify({'success': True})
+                    return jsonify({'success': False, 'error': 'Habit not found'}), 404
+
+                return jsonify({'success': True, 'habit_id': int(habit_id)})
 
             except Exception as e:
 
@@ -791,10 +901,6 @@ def update_habit_streak():
 
     data = request.json
 
-    print("🔍 RAW DATA:", request.get_data(as_text=True), file=sys.stderr
-)
-    print("🔍 PARSED JSON:", request.json, file=sys.stderr
-)
     habit_id = data.get('habit_id')
 
     completed = data.get('completed')
@@ -811,63 +917,106 @@ def update_habit_streak():
 
     try:
 
-        habit = db.get_habit_by_id(habit_id)
+        habit = db.get_user_habit(current_user.id, habit_id)
 
         if not habit:
 
             return jsonify({'success': False, 'error': 'Habit not found'}), 404
 
 
-        points_table = {
+        pts = POINTS_TABLE.get(habit.difficulty or difficulty, POINTS_TABLE['easy'])
 
-            'trivial': (10, -30),
 
-            'easy': (25, -25),
+        # Отметка за сегодня в habit_completions; серия пересчитывается по истории
 
-            'medium': (40, -20),
+        changed, streak = db.set_habit_completion(habit_id, local_today(), bool(completed), user_id=current_user.id)
 
-            'hard': (60, -15),
+        # Баллы только за смену состояния: повторный запрос (двойной клик) не начисляет их ещё раз
 
-        }
+        delta = (pts[0] if completed else -pts[0]) if changed else 0
 
-        pts = points_table.get(difficulty, (25, -25))
 
+        # Рейтинг не изменился — клиенту нечего обновлять, лишний SELECT не нужен
+        new_rating = db.add_user_rating(current_user.id, delta, source='habit') if delta else None
 
-        if completed:
 
-            # Выполнил: отмечаем как выполненную, +баллы, +стрик
+        return jsonify({'success': True, 'rating_delta': delta, 'rating': new_rating, 'streak': streak})
 
-            db.update_habit_completed_today(habit_id, True)
 
-            db.update_habit_streak(habit_id, habit.streak + 1)
+    except Exception as e:
 
-            db.add_user_rating(current_user.id, pts[0])
+        print('ERROR /update_habit_streak:', str(e), file=sys.stderr)
 
-            delta = pts[0]
-        else:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+
+BATCH_MAX_OPERATIONS = 100
+
+
+def batch_result(result):
 
-            # Отменил: сбрасываем выполнение, –баллы, –стрик
+    if 'error' in result:
 
-            db.update_habit_completed_today(habit_id, False) 
+        return {'success': False, 'error': result['error']}
 
-            new_streak = max(0, habit.streak - 1)
+    if 'task' in result:
+
+        return {'success': True, 'task': task_payload(result['task'])}
+
+    if 'habit' in result:
+
+        return {'success': True, 'habit': habit_payload(result['habit'], completed_today=result['completed_today'])}
+
+    return {'success': True, **result}
+
+
+@application.route('/batch', methods=['POST'])
+
+@login_required
 
-            db.update_habit_streak(habit_id, new_streak)
+def batch():
 
-            db.add_user_rating(current_user.id, -pts[0])
+    """
+    Несколько изменений одним запросом и одной транзакцией.
 
-            delta = -pts[0]
+    Тело: {"operations": [{"op": "task_status", "task_id": 1, "status": "completed"},
+    {"op": "habit_toggle", "habit_id": 2, "completed": true}, ...]}.
+    Операции: task_status, task_edit, task_delete, habit_toggle, habit_edit, habit_delete.
+    Пакет применяется целиком или никак; в ответе — результат каждой операции по порядку.
+    """
 
+    operations = (request.get_json(silent=True) or {}).get('operations')
 
-        return jsonify({'success': True, 'rating_delta': delta})
+    if not isinstance(operations, list) or not operations or not all(isinstance(op, dict) for op in operations):
 
+        return jsonify({'success': False, 'error': 'Missing operations'}), 400
+
+    if len(operations) > BATCH_MAX_OPERATIONS:
+
+        return jsonify({'success': False, 'error': f'Too many operations (max {BATCH_MAX_OPERATIONS})'}), 400
+
+    try:
+
+        results, rating = db.apply_batch(current_user.id, operations)
 
     except Exception as e:
 
-        print('ERROR /update_habit_streak:', str(e), file=sys.stderr)
+        current_app.logger.exception('/batch failed')
 
         return jsonify({'success': False, 'error': str(e)}), 400
 
+    if any(result is None or 'error' in result for result in results):
+
+        # Пакет отклонён: корректные операции тоже не применены
+
+        results = [batch_result(result) if result else {'success': False, 'error': 'Not applied'} for result in results]
+
+        return jsonify({'success': False, 'results': results}), 400
+
+    results = [batch_result(result) for result in results]
+
+    return jsonify({'success': True, 'results': results, 'rating': rating})
+
 
 @application.route('/update_profile', methods=['POST'])
 
@@ -882,9 +1031,127 @@ def update_profile():
 
         if nickname:
 
-            # TODO: Добавить метод update_user_profile в database.py
+            try:
+
+                db.update_user_profile(current_user.id, nickname=nickname)
 
-            return jsonify({'success': True})
+                invalidate_user(current_user.id)
+
+                return jsonify({'success': True})
+
+            except Exception as e:
+
+                return jsonify({'success': False, 'error': str(e)}), 400
 
     return jsonify({'success': False}), 400
 
+
+def set_user_avatar(user_id, key):
+
+    db.update_user_profile(user_id, path_to_avatar=key)
+
+    invalidate_user(user_id)
+
+
+@application.route('/upload_avatar', methods=['POST'])
+
+@login_required
+
+def upload_avatar():
+
+    """
+    Загрузка аватара: тело запроса — сама картинка (JPEG, PNG, WebP или GIF).
+
+    Файл читается потоком без буферизации целиком; миниатюры строятся в фоне.
+    202 — аватар появится по адресу avatar, когда миниатюры будут готовы.
+    """
+
+    if request.content_length is not None and request.content_length > AVATAR_MAX_BYTES:
+
+        return jsonify({'success': False, 'error': f'Аватар больше {AVATAR_MAX_BYTES // (1024 * 1024)} МБ'}), 413
+
+    user_id = current_user.id
+
+    try:
+
+        key, ready = avatar_uploads.upload(request.stream, lambda key: set_user_avatar(user_id, key))
+
+    except AvatarTooLarge as e:
+
+        return jsonify({'success': False, 'error': str(e)}), 413
+
+    except InvalidAvatar as e:
+
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    except AvatarBusy as e:
+
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    return jsonify({'success': True, 'ready': ready, 'avatar': avatar_url(key)}), 200 if ready else 202
+
+
+# Импорт и экспорт задач и привычек (CSV / NDJSON)
+
+@application.route('/import/<kind>', methods=['POST'])
+
+@login_required
+
+def import_rows(kind):
+
+    """
+    Импорт задач или привычек: тело запроса — файл CSV (text/csv) или NDJSON (application/x-ndjson).
+
+    Файл разбирается построчно и вставляется пачками в одной транзакции:
+    при ошибке в любой строке не добавляется ничего.
+    """
+
+    if kind not in EXPORT_COLUMNS:
+
+        return jsonify({'success': False, 'error': 'Неизвестный тип данных'}), 404
+
+    fmt = detect_format(request.args.get('format'), request.mimetype)
+
+    if fmt is None:
+
+        return jsonify({'success': False, 'error': 'Поддерживаются CSV и NDJSON'}), 415
+
+
+    try:
+
+        count = db.import_user_rows(current_user.id, kind, parse_import(request.stream, fmt, kind), batch_size=IMPORT_BATCH_SIZE)
+
+    except InvalidImport as e:
+
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({'success': True, 'imported': count})
+
+
+@application.route('/export/<kind>')
+
+@login_required
+
+def export_rows(kind):
+
+    """Выгрузка всех задач или привычек пользователя потоком (?format=csv|ndjson, по умолчанию CSV)"""
+
+    if kind not in EXPORT_COLUMNS:
+
+        return jsonify({'success': False, 'error': 'Неизвестный тип данных'}), 404
+
+    fmt = detect_format(request.args.get('format', 'csv'))
+
+    if fmt is None:
+
+        return jsonify({'success': False, 'error': 'Поддерживаются CSV и NDJSON'}), 400
+
+    columns = EXPORT_COLUMNS[kind]
+
+    chunks = db.iter_user_rows(current_user.id, kind, columns, chunk_size=EXPORT_CHUNK_SIZE)
+
+    response = Response(export_lines(chunks, fmt, columns), mimetype=FORMATS[fmt])
+
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+
+    return response
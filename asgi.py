@@ -0,0 +1,3 @@
+# ASGI-режим: uvicorn asgi:app (см. app/asgi.py)
+
+from app.asgi import app
@@ -1,16 +1,29 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Стоимость bcrypt (log2 числа раундов); при изменении старые хеши
+# пересчитываются при следующем успешном входе
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int = None) -> str:
     """
     Хеширует пароль с использованием bcrypt.
     
     Args:
         password (str): Исходный пароль
+        rounds (int): Стоимость bcrypt (по умолчанию BCRYPT_ROUNDS)
         
     Returns:
         str: Хеш пароля в виде строки (включая соль)
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
@@ -29,4 +42,76 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode('utf-8'),
         hashed_password.encode('utf-8')
-    )
\ No newline at end of file
+    )
+
+
+def hash_rounds(hashed_password: str) -> int | None:
+    """
+    Возвращает стоимость, с которой был получен хеш ($2b$<rounds>$...).
+    
+    Returns:
+        int | None: Стоимость или None, если формат хеша не распознан
+    """
+    parts = hashed_password.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed_password: str, rounds: int = None) -> bool:
+    """
+    Проверяет, нужно ли пересчитать хеш под текущую стоимость.
+    
+    Returns:
+        bool: True, если стоимость хеша отличается от rounds (BCRYPT_ROUNDS)
+    """
+    return hash_rounds(hashed_password) != (rounds or BCRYPT_ROUNDS)
+
+
+class HasherBusy(Exception):
+    """Очередь на хеширование переполнена"""
+
+
+class PasswordHasher:
+    """
+    Хеширование паролей в ограниченном пуле потоков.
+
+    bcrypt отпускает GIL, поэтому пул из workers потоков занимает не больше
+    workers ядер, а остальные запросы продолжают обслуживаться. Вызывающий
+    поток ждёт результат; если в очереди уже max_pending задач, сразу
+    выбрасывается HasherBusy, чтобы всплеск входов не копился бесконечно.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, rounds: int = None):
+        self.workers = workers or int(os.getenv('BCRYPT_WORKERS', 0)) or max(1, (os.cpu_count() or 2) // 2)
+        self.max_pending = max_pending or int(os.getenv('BCRYPT_MAX_PENDING', 0)) or self.workers * 16
+        self.rounds = rounds or BCRYPT_ROUNDS
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Слишком много одновременных операций с паролями')
+        try:
+            if self._pool is None:
+                with self._lock:
+                    if self._pool is None:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        """Хеширует пароль в пуле с текущей стоимостью"""
+        return self._submit(hash_password, password, self.rounds)
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Проверяет пароль в пуле"""
+        return self._submit(verify_password, plain_password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return needs_rehash(hashed_password, self.rounds)
+
+
+hasher = PasswordHasher()
\ No newline at end of file
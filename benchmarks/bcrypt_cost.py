@@ -0,0 +1,54 @@
+"""
+Производительность bcrypt по стоимости: хешей в секунду на ядро.
+
+Запуск (из корня проекта):
+
+    python -m benchmarks.bcrypt_cost
+    python -m benchmarks.bcrypt_cost --rounds 10 11 12 13 --qps 20 --workers 4
+
+Для каждой стоимости меряется один поток и пул из --workers потоков
+(bcrypt отпускает GIL). По --qps (пиковые входы в секунду) подсказывает
+максимальную стоимость, при которой пул ещё успевает с запасом 2x.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auth import hash_password
+
+
+def measure(rounds: int, workers: int, seconds: float) -> float:
+    """Хешей в секунду для пула из workers потоков."""
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while time.perf_counter() - started < seconds:
+            list(pool.map(lambda _: hash_password('benchmark-password', rounds), range(workers)))
+            done += workers
+    return done / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Хешей bcrypt в секунду на ядро')
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seconds', type=float, default=2.0, help='Длительность замера на стоимость')
+    parser.add_argument('--qps', type=float, default=None, help='Пиковые входы в секунду')
+    args = parser.parse_args(argv)
+
+    print(f'{"rounds":>6} {"ms/hash":>8} {"hash/s/core":>12} {"hash/s pool":>12}')
+    recommended = None
+    for rounds in args.rounds:
+        single = measure(rounds, 1, args.seconds)
+        pool = measure(rounds, args.workers, args.seconds)
+        print(f'{rounds:>6} {1000 / single:>8.1f} {single:>12.1f} {pool:>12.1f}')
+        if args.qps and pool >= args.qps * 2:
+            recommended = rounds
+
+    if args.qps:
+        print(f'Рекомендуемая стоимость для {args.qps:g} входов/с на {args.workers} потоках: {recommended or "ниже проверенных"}')
+
+
+if __name__ == '__main__':
+    main()
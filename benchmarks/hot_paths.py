@@ -0,0 +1,345 @@
+"""
+Горячие пути приложения: расписание привычек, методы Database, сборка
+главной страницы и вход.
+
+Запуск (из корня проекта):
+
+    python -m benchmarks.hot_paths                    # сравнить с baselines/hot_paths.json
+    python -m benchmarks.hot_paths --update           # перезаписать базовую линию
+    python -m benchmarks.hot_paths --only get_dashboard index
+    python -m benchmarks.hot_paths --db postgresql://localhost/habits_bench
+
+По умолчанию используется файл SQLite во временном каталоге; --db
+принимает URL пустой локальной БД (в непустую бенчмарк писать
+откажется). Таблицы создаются и заполняются синтетическими
+пользователями, задачами и привычками через database/seed.py (--users, --seed).
+
+Для каждого замера берётся медиана времени на операцию по --repeat
+прогонам (число операций в прогоне умножается на --scale). Код возврата 1, если какой-то замер медленнее базовой линии
+больше чем на --threshold (по умолчанию 25%). Базовая линия записывается
+для одной СУБД: сравнение с замером другой СУБД пропускается.
+
+Вход меряется с BCRYPT_ROUNDS=4 (--bcrypt-rounds), чтобы хеширование не
+заслоняло остальной путь; стоимость bcrypt отдельно — benchmarks/bcrypt_cost.py.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'hot_paths.json')
+
+BENCH_PASSWORD = 'benchmark-password'
+HABITS_GRID = (2000, 365)  # привычек x дней для is_habit_active
+RARE_HABITS = (100, 30)  # ежемесячных и ежегодных привычек x серия для пересчёта серий
+
+
+# ==================== ДАННЫЕ ====================
+
+def synthetic_habits(rng: random.Random, count: int, today: date):
+    """Словари привычек с правдоподобным разбросом правил повторения."""
+    habits = []
+    for i in range(count):
+        repeat_type = rng.choices(('daily', 'weekly', 'monthly', 'yearly'), weights=(40, 45, 10, 5))[0]
+        days = sorted(rng.sample(range(7), rng.randint(1, 7)))
+        habits.append({
+            'id': i + 1,
+            'title': f'Привычка {i + 1}',
+            'start_date': None if rng.random() < 0.05 else (today - timedelta(days=rng.randint(0, 730))).isoformat(),
+            'repeat_type': repeat_type,
+            'repeat_every': rng.choices((1, 2, 3), weights=(80, 15, 5))[0],
+            'repeat_days': ','.join(map(str, days)),
+        })
+    return habits
+
+
+def rare_habits(count: int, streak: int, today: date):
+    """
+    Ежемесячные и ежегодные привычки с длинной серией: история выполнений
+    для неё уходит на годы назад (у ежегодной — на все 3660 дней).
+    """
+    return [{
+        'title': f'Редкая {i + 1}',
+        'start_date': (today - timedelta(days=40 * 365 + i)).isoformat(),
+        'repeat_type': ('monthly', 'yearly')[i % 2],
+        'repeat_every': 1,
+        'repeat_days': None,
+        'streak': streak,
+    } for i in range(count)]
+
+
+# ==================== ЗАМЕРЫ ====================
+# Каждый замер: функция (ctx, number) -> секунды на number операций.
+# Подготовка (создание удаляемых строк и т.п.) в замер не входит.
+
+def timed(fn, args_list) -> float:
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return time.perf_counter() - started
+
+
+def bench_is_habit_active(ctx, number):
+    from functions import is_habit_active
+    days = [ctx['today'] - timedelta(days=d) for d in range(HABITS_GRID[1])]
+    habits = ctx['habits']
+    started = time.perf_counter()
+    for habit in habits:
+        for day in days:
+            is_habit_active(habit, day)
+    # Одна операция — одна проверка привычки на дату
+    return (time.perf_counter() - started) * number / (len(habits) * len(days))
+
+
+def bench_habit_activity_matrix(ctx, number):
+    from functions import date_range, habit_activity_matrix
+    dates = date_range(ctx['today'] - timedelta(days=HABITS_GRID[1] - 1), ctx['today'])
+    return timed(habit_activity_matrix, [(ctx['habits'], dates)] * number)
+
+
+def bench_import_rare_habits(ctx, number):
+    """Импорт привычек (одна операция — одна привычка) с восстановлением истории серии."""
+    user_id = ctx['db'].add_user(f'import{ctx["run"]}', f'import{ctx["run"]}',
+                                 f'import{ctx["run"]}@example.com', BENCH_PASSWORD).id
+    rows = rare_habits(number, RARE_HABITS[1], ctx['today'])
+    started = time.perf_counter()
+    ctx['db'].import_user_rows(user_id, 'habits', rows, today=ctx['today'])
+    return time.perf_counter() - started
+
+
+def bench_recompute_rare_streaks(ctx, number):
+    """Пересчёт серий пользователя с RARE_HABITS редкими привычками."""
+    if 'rare_user' not in ctx:
+        ctx['rare_user'] = ctx['db'].add_user('rare', 'rare', 'rare@example.com', BENCH_PASSWORD).id
+        ctx['db'].import_user_rows(ctx['rare_user'], 'habits', rare_habits(*RARE_HABITS, ctx['today']),
+                                   today=ctx['today'])
+    return timed(ctx['db'].recompute_streaks, [([ctx['rare_user']], ctx['today'])] * number)
+
+
+def _user(ctx, i):
+    return ctx['user_ids'][i % len(ctx['user_ids'])]
+
+
+def _username(ctx, i):
+    return f'user{_user(ctx, i)}'
+
+
+def _make_tasks(ctx, number):
+    return [ctx['db'].add_user_task(_user(ctx, i), f'Временная {i}').id for i in range(number)]
+
+
+def _make_habits(ctx, number):
+    return [ctx['db'].add_user_habit(_user(ctx, i), f'Временная {i}', repeat_type='daily').id for i in range(number)]
+
+
+def crud_cases():
+    """Замеры методов Database: name -> функция."""
+
+    def calls(method, make_args):
+        return lambda ctx, number: timed(getattr(ctx['db'], method), [make_args(ctx, i) for i in range(number)])
+
+    def writes(method, make_rows, make_args):
+        def run(ctx, number):
+            ids = make_rows(ctx, number)
+            return timed(getattr(ctx['db'], method), [make_args(ctx, i, row_id) for i, row_id in enumerate(ids)])
+        return run
+
+    return {
+        'add_user': lambda ctx, number: timed(ctx['db'].add_user, [
+            (f'new{ctx["run"]}_{i}', f'new{ctx["run"]}_{i}', f'new{ctx["run"]}_{i}@example.com', BENCH_PASSWORD)
+            for i in range(number)
+        ]),
+        'get_user_by_id': calls('get_user_by_id', lambda ctx, i: (_user(ctx, i),)),
+        'get_user_by_username': calls('get_user_by_username', lambda ctx, i: (_username(ctx, i),)),
+        'get_user_stats': calls('get_user_stats', lambda ctx, i: (_user(ctx, i),)),
+        'get_user_generation': calls('get_user_generation', lambda ctx, i: (_user(ctx, i),)),
+        'update_user_profile': calls('update_user_profile', lambda ctx, i: (_user(ctx, i), _username(ctx, i))),
+        'add_user_rating': calls('add_user_rating', lambda ctx, i: (_user(ctx, i), 1)),
+        'get_leaderboard': calls('get_leaderboard', lambda ctx, i: ()),
+        'get_dashboard': calls('get_dashboard', lambda ctx, i: (_user(ctx, i),)),
+        'add_user_task': lambda ctx, number: timed(ctx['db'].add_user_task, [
+            (_user(ctx, i), f'Новая {i}', None, 'medium') for i in range(number)
+        ]),
+        'get_user_tasks': calls('get_user_tasks', lambda ctx, i: (_user(ctx, i),)),
+        'get_user_task': writes('get_user_task', _make_tasks, lambda ctx, i, task_id: (_user(ctx, i), task_id)),
+        'update_task_status': writes('update_task_status', _make_tasks,
+                                     lambda ctx, i, task_id: (task_id, 'completed', _user(ctx, i))),
+        'update_task_details': writes('update_task_details', _make_tasks,
+                                      lambda ctx, i, task_id: (task_id, 'Изменённая', 'заметка', 'hard', None, _user(ctx, i))),
+        'delete_task': writes('delete_task', _make_tasks, lambda ctx, i, task_id: (task_id, _user(ctx, i))),
+        'add_user_habit': lambda ctx, number: timed(ctx['db'].add_user_habit, [
+            (_user(ctx, i), f'Новая {i}') for i in range(number)
+        ]),
+        'get_user_habits': calls('get_user_habits', lambda ctx, i: (_user(ctx, i),)),
+        'get_user_habit': writes('get_user_habit', _make_habits, lambda ctx, i, habit_id: (_user(ctx, i), habit_id)),
+        'update_habit_details': writes('update_habit_details', _make_habits,
+                                       lambda ctx, i, habit_id: (habit_id, 'Изменённая')),
+        'update_habit_streak': writes('update_habit_streak', _make_habits,
+                                      lambda ctx, i, habit_id: (habit_id, 5, _user(ctx, i))),
+        'set_habit_completion': writes('set_habit_completion', _make_habits,
+                                       lambda ctx, i, habit_id: (habit_id, ctx['today'], True, _user(ctx, i))),
+        'recompute_streaks': calls('recompute_streaks', lambda ctx, i: ([_user(ctx, i)], ctx['today'])),
+        'update_habit_last_checked': writes('update_habit_last_checked', _make_habits,
+                                            lambda ctx, i, habit_id: (habit_id, ctx['today'].isoformat(), _user(ctx, i))),
+        'delete_habit': writes('delete_habit', _make_habits, lambda ctx, i, habit_id: (habit_id, _user(ctx, i))),
+        'add_user_achievement': lambda ctx, number: timed(ctx['db'].add_user_achievement, [
+            (_user(ctx, i), f'Достижение {ctx["run"]}_{i}') for i in range(number)
+        ]),
+        'get_user_achievements': calls('get_user_achievements', lambda ctx, i: (_user(ctx, i),)),
+    }
+
+
+def _client(ctx, i):
+    client = ctx['app'].test_client()
+    response = client.post('/login', data={'username': _username(ctx, i), 'password': BENCH_PASSWORD})
+    assert response.status_code == 302, response.status_code
+    return client
+
+
+def bench_index(ctx, number):
+    """Полная сборка главной страницы (без If-None-Match, т.е. без 304)."""
+    clients = [_client(ctx, i) for i in range(min(number, len(ctx['user_ids'])))]
+    started = time.perf_counter()
+    for i in range(number):
+        response = clients[i % len(clients)].get('/')
+        assert response.status_code == 200, response.status_code
+    return time.perf_counter() - started
+
+
+def bench_login(ctx, number):
+    started = time.perf_counter()
+    for i in range(number):
+        _client(ctx, i)
+    return time.perf_counter() - started
+
+
+CASES = {
+    'is_habit_active': (bench_is_habit_active, 100000),
+    'habit_activity_matrix': (bench_habit_activity_matrix, 5),
+    **{name: (fn, 50) for name, fn in crud_cases().items()},
+    'import_rare_habits': (bench_import_rare_habits, 100),
+    'recompute_rare_streaks': (bench_recompute_rare_streaks, 10),
+    'index': (bench_index, 50),
+    'login': (bench_login, 20),
+}
+
+
+# ==================== ЗАПУСК ====================
+
+def prepare(db_url: str, bcrypt_rounds: int):
+    """Окружение выставляется до импорта приложения: DB_URL читается при импорте."""
+    os.environ['DB_URL'] = db_url
+    os.environ['BCRYPT_ROUNDS'] = str(bcrypt_rounds)
+    sys.path.insert(0, ROOT)
+
+    from app import application
+    from database.database import db
+
+    db.create_tables()
+    if db.get_user_ids(limit=1):
+        sys.exit(f'БД {db.engine.url!r} не пуста: бенчмарку нужна пустая БД')
+    return application, db
+
+
+def run(names, args) -> dict:
+    if args.db:
+        db_url, tmpdir = args.db, None
+    else:
+        tmpdir = tempfile.TemporaryDirectory(prefix='bench-')
+        db_url = f'sqlite:///{os.path.join(tmpdir.name, "bench.db")}'
+
+    application, db = prepare(db_url, args.bcrypt_rounds)
+    application.config['TESTING'] = True
+    from database import seed
+
+    today = date.today()
+    seeded = seed.run(args.users, seed=args.seed, tasks=args.tasks, habits=args.habits,
+                      password=BENCH_PASSWORD, today=today)
+    user_ids = list(range(seeded['first_user_id'], seeded['last_user_id'] + 1))
+    print(f"{db.engine.dialect.name}: {seeded['rows']} seeded in {seeded['seconds']:.1f} s")
+    rng = random.Random(args.seed)
+    ctx = {
+        'db': db, 'app': application, 'user_ids': user_ids, 'today': today,
+        'habits': synthetic_habits(rng, HABITS_GRID[0], today),
+    }
+    results = {}
+    try:
+        for name in names:
+            fn, number = CASES[name]
+            number = max(1, int(number * args.scale))
+            samples = []
+            for repeat in range(args.repeat):
+                ctx['run'] = repeat
+                samples.append(fn(ctx, number) / number)
+            results[name] = statistics.median(samples) * 1e6
+            print(f'  {name:<30} {results[name]:>12.2f} us/op')
+    finally:
+        db.engine.dispose()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+    return {'dialect': db.engine.dialect.name, 'cases_us': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Время горячих путей приложения')
+    parser.add_argument('--db', help='URL пустой БД (по умолчанию временный файл SQLite)')
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='Только эти замеры')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tasks', type=float, default=30, help='Среднее число задач на пользователя')
+    parser.add_argument('--habits', type=float, default=15, help='Среднее число привычек на пользователя')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help='Множитель числа операций в замере')
+    parser.add_argument('--bcrypt-rounds', type=int, default=4)
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--update', action='store_true', help='Записать результат как базовую линию')
+    args = parser.parse_args(argv)
+
+    result = run(args.only or list(CASES), args)
+
+    failed = False
+    if args.update:
+        baseline = {}
+        if args.only and os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                baseline = json.load(f)
+            if baseline.get('dialect') != result['dialect']:
+                baseline = {}
+        baseline['dialect'] = result['dialect']
+        baseline['cases_us'] = {**baseline.get('cases_us', {}),
+                                **{name: round(us, 2) for name, us in result['cases_us'].items()}}
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'Baseline written to {os.path.relpath(BASELINE, ROOT)}')
+    elif os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        if baseline.get('dialect') != result['dialect']:
+            print(f"baseline is for {baseline.get('dialect')}, not {result['dialect']}: comparison skipped")
+        else:
+            print(f'{"case":<30} {"baseline":>10} {"now":>10} {"change":>8}')
+            for name, us in result['cases_us'].items():
+                before = baseline['cases_us'].get(name)
+                if before is None:
+                    continue
+                change = us / before - 1
+                mark = ''
+                if change > args.threshold:
+                    mark = '  FAIL'
+                    failed = True
+                print(f'{name:<30} {before:>10.2f} {us:>10.2f} {change:>+8.0%}{mark}')
+            if failed:
+                print(f'FAIL: hot paths regressed beyond {args.threshold:.0%}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Время импорта приложения (старт воркера) по python -X importtime.
+
+Запуск (из корня проекта):
+
+    python -m benchmarks.startup             # сравнить с baselines/importtime.json
+    python -m benchmarks.startup --update    # перезаписать базовую линию
+
+Импорт выполняется в отдельном процессе с DB_URL, указывающим на
+несуществующий хост: если при импорте кто-то полезет в БД, замер упадёт.
+Код возврата 1, если медиана превысила базовую линию больше чем на
+--threshold (по умолчанию 25%) или если при импорте был создан engine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'importtime.json')
+
+# Модули, которые не должны импортироваться при старте
+DEFERRED = ('numpy', 'pytz', 'dateutil', 'psycopg2')
+
+PROBE = (
+    'import app, sys, database.database as d; '
+    'print("engine_created=" + str(d.db._engine is not None)); '
+    'print("loaded=" + ",".join(m for m in ' + repr(DEFERRED) + ' if m in sys.modules))'
+)
+
+
+def measure_once() -> dict:
+    env = dict(os.environ, DB_URL='postgresql://startup-probe.invalid/none', PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative_us)
+    out = dict(line.split('=', 1) for line in proc.stdout.split())
+    return {
+        'app_us': modules.get('app', 0),
+        'modules': modules,
+        'engine_created': out.get('engine_created') == 'True',
+        'loaded': [m for m in out.get('loaded', '').split(',') if m],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бюджет времени импорта приложения')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--update', action='store_true', help='Записать результат как базовую линию')
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.runs)]
+    median_us = int(statistics.median(r['app_us'] for r in runs))
+    last = runs[-1]
+    top = sorted(
+        ((name, us) for name, us in last['modules'].items() if '.' not in name and name != 'app'),
+        key=lambda item: -item[1],
+    )[:8]
+
+    print(f'import app: median {median_us / 1000:.1f} ms over {args.runs} runs')
+    for name, us in top:
+        print(f'  {name:<20} {us / 1000:>8.1f} ms')
+
+    failed = False
+    if last['engine_created']:
+        print('FAIL: database engine created at import time')
+        failed = True
+    if last['loaded']:
+        print(f"FAIL: deferred modules imported at startup: {', '.join(last['loaded'])}")
+        failed = True
+
+    if args.update:
+        with open(BASELINE, 'w') as f:
+            json.dump({'app_us': median_us, 'top_level_us': dict(top)}, f, indent=2)
+            f.write('\n')
+        print(f'Baseline written to {os.path.relpath(BASELINE, ROOT)}')
+    elif os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        budget = baseline['app_us'] * (1 + args.threshold)
+        print(f"baseline {baseline['app_us'] / 1000:.1f} ms, budget {budget / 1000:.1f} ms")
+        if median_us > budget:
+            print('FAIL: import time regressed beyond threshold')
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Асинхронный вариант Database на SQLAlchemy asyncio (asyncpg / aiosqlite).
+
+Используется ASGI-входом (asgi.py) для горячих маршрутов чтения: пока
+запрос ждёт БД, цикл событий обслуживает другие соединения, поэтому
+один процесс держит тысячи почти простаивающих клиентов (вкладки,
+перепроверяющие дашборд по ETag), а не по потоку на каждого. Запись
+по-прежнему идёт через синхронный Database (почему — см. asgi.py).
+
+Драйверы ставятся только для этого режима:
+
+    pip install -r requirements-async.txt
+
+Адрес БД тот же (DB_URL): postgresql:// и sqlite:// переводятся на
+асинхронные драйверы автоматически.
+"""
+import asyncio
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from .database import DATABASE_URL, Database
+from .models import Habit, User, UserStats
+from functions import local_today
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_url(url):
+    """Адрес БД с асинхронным драйвером (postgresql:// -> postgresql+asyncpg://)."""
+    url = make_url(url)
+    if url.drivername in ASYNC_DRIVERS.values():
+        return url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'Нет асинхронного драйвера для СУБД {backend}')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class AsyncDatabase:
+    def __init__(self, url: str = None):
+        # Как и в Database, engine создаётся при первом обращении: модуль
+        # импортируется без asyncpg/aiosqlite и без подключения к БД
+        self._url = url
+        self._engine = None
+        self._session_factory = None
+
+    @property
+    def engine(self):
+        # Один цикл событий на процесс — блокировка, как в Database, не нужна
+        if self._engine is None:
+            self._engine = create_async_engine(
+                async_url(self._url or DATABASE_URL),
+                pool_size=10,
+                max_overflow=20,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+            )
+        return self._engine
+
+    @property
+    def SessionLocal(self):
+        if self._session_factory is None:
+            self._session_factory = async_sessionmaker(self.engine, expire_on_commit=False, autoflush=False)
+        return self._session_factory
+
+    def get_session(self) -> AsyncSession:
+        return self.SessionLocal()
+
+    async def dispose(self):
+        """Закрыть соединения пула (при остановке ASGI-приложения)."""
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    # ==================== USER METHODS ====================
+
+    async def get_user_generation(self, user_id: int):
+        """
+        Текущее поколение данных пользователя (см. Database.get_user_generation).
+
+        Returns:
+            int | None: Поколение (None, если у пользователя нет статистики)
+        """
+        async with self.SessionLocal() as session:
+            return await session.scalar(select(UserStats.generation).where(UserStats.user_id == user_id))
+
+    # ==================== DASHBOARD ====================
+
+    async def _get_dashboard_stats(self, user_id: int):
+        async with self.SessionLocal() as session:
+            row = (await session.execute(
+                select(
+                    UserStats.rating,
+                    UserStats.rating_change_for_the_day,
+                    UserStats.rating_change_for_the_week,
+                )
+                .select_from(User)
+                .outerjoin(UserStats, UserStats.user_id == User.id)
+                .where(User.id == user_id)
+            )).first()
+            if row is None:
+                return None
+            return {
+                'rating': row.rating or 0,
+                'rating_change_day': row.rating_change_for_the_day or 0,
+                'rating_change_week': row.rating_change_for_the_week or 0,
+            }
+
+    async def _get_dashboard_rows(self, model, columns, user_id: int, computed=None):
+        computed = computed or {}
+        async with self.SessionLocal() as session:
+            result = await session.execute(
+                select(*(getattr(model, name) for name in columns),
+                       *(expression.label(name) for name, expression in computed.items()))
+                .where(model.user_id == user_id)
+                .order_by(model.id)
+            )
+            return [dict(row._mapping) for row in result]
+
+    async def get_dashboard(self, user_id: int, today: date = None):
+        """
+        Получить все данные главной страницы.
+
+        Статистика, задачи, привычки и достижения не зависят друг от друга
+        и читаются параллельно — каждое своим соединением из пула, так что
+        ответ ждёт самый медленный запрос, а не их сумму. Формат тот же,
+        что у Database.get_dashboard.
+
+        Args:
+            user_id: ID пользователя
+            today: Дата для completed_today привычек (по умолчанию — сегодня по ЕКБ)
+
+        Returns:
+            dict | None: rating, rating_change_day, rating_change_week и списки
+            словарей tasks, habits, achievements (deadline — строка YYYY-MM-DD)
+        """
+        today = (today or local_today()).isoformat()
+        computed = {Habit: {'completed_today': Database._completed_on(today)}}
+        stats, *rows = await asyncio.gather(
+            self._get_dashboard_stats(user_id),
+            *(self._get_dashboard_rows(model, columns, user_id, computed.get(model))
+              for model, columns in Database.DASHBOARD_COLUMNS.values()),
+        )
+        if stats is None:
+            return None
+
+        data = {**stats, **dict(zip(Database.DASHBOARD_COLUMNS, rows))}
+        for task in data['tasks']:
+            task['deadline'] = task['deadline'].strftime('%Y-%m-%d') if task['deadline'] else None
+        for habit in data['habits']:
+            habit['completed_today'] = bool(habit['completed_today'])
+        return data
+
+
+# Глобальный экземпляр для ASGI-приложения
+async_db = AsyncDatabase()
@@ -0,0 +1,71 @@
+"""
+Общая часть ночных задач по всем пользователям (rollover, streaks).
+
+Пользователи обходятся группами по ID (keyset, без OFFSET): каждую
+группу задача обрабатывает своей транзакцией, а прогресс печатается в
+stderr. --start-after позволяет продолжить с места сбоя.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from database.database import db
+from functions import local_today
+
+
+class UserChunks:
+    """
+    Итератор по группам ID пользователей с итогами прогона.
+
+        chunks = UserChunks(chunk_size=500)
+        for user_ids in chunks:
+            db.rollover_habits(user_ids, yesterday, today)
+        chunks.summary()  # users, seconds, last_user_id
+    """
+
+    def __init__(self, chunk_size: int = 500, start_after: int = 0):
+        self.chunk_size = chunk_size
+        self.last_id = start_after
+        self.users = 0
+        self.started = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        while True:
+            user_ids = db.get_user_ids(after_id=self.last_id, limit=self.chunk_size)
+            if not user_ids:
+                break
+
+            yield user_ids
+
+            # Группа считается пройденной, только когда обработчик вернул управление
+            self.last_id = user_ids[-1]
+            self.users += len(user_ids)
+
+            elapsed = time.perf_counter() - self.started
+            print(f'users={self.users} last_user_id={self.last_id} '
+                  f'rate={self.users / elapsed if elapsed else 0:.0f} users/s', file=sys.stderr)
+
+    def summary(self) -> dict:
+        return {
+            'users': self.users,
+            'seconds': round(time.perf_counter() - self.started, 3) if self.started else 0,
+            'last_user_id': self.last_id,
+        }
+
+
+def argument_parser(description: str) -> argparse.ArgumentParser:
+    """Парсер с общими для задач аргументами --date, --chunk-size и --start-after."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--date', help='Сегодняшняя дата YYYY-MM-DD (по умолчанию — сегодня по ЕКБ)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Пользователей в одной транзакции')
+    parser.add_argument('--start-after', type=int, default=0, help='Начать с пользователей с ID больше этого')
+    return parser
+
+
+def today_from(args):
+    """Дата прогона из --date или сегодня по ЕКБ."""
+    if args.date:
+        return datetime.strptime(args.date, '%Y-%m-%d').date()
+    return local_today()
@@ -1,32 +1,140 @@
-from sqlalchemy import create_engine, func, select, update, delete
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, func, select, insert, update, delete, case, bindparam, literal_column
+from sqlalchemy.orm import sessionmaker, Session, joinedload, selectinload
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from flask import g, has_app_context
 from .models import *
-from auth import hash_password, verify_password
+from auth import hasher
+from functions import compile_schedule, habit_streaks, local_today, streak_days, POINTS_TABLE
 
 from dotenv import load_dotenv
+from datetime import date, timezone
+import itertools
+import json
 import os
+import threading
+import time
 
 load_dotenv()
 DATABASE_URL = os.getenv("DB_URL")
 
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool, сообщающий, сколько ждали соединение из пула (для метрик, см. app/utils/metrics.py).
+
+    Время меряется вокруг публичного Pool.connect(): ожидание свободного
+    соединения плюс, если нужно, открытие нового и pre-ping. Слушатели —
+    множество, поэтому повторная регистрация не удваивает учёт.
+    """
+
+    wait_listeners = set()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            waited = time.perf_counter() - started
+            for listener in self.wait_listeners:
+                listener(waited)
+
+
 class Database:
     def __init__(self):
-        self.engine = create_engine(
-            DATABASE_URL,
-            pool_size=10,
-            max_overflow=20,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-        )
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.create_tables()
+        # Engine и пул создаются при первом обращении, а не при импорте:
+        # воркеры стартуют без подключения к БД
+        self._engine = None
+        self._session_factory = None
+        self._engine_lock = threading.Lock()
+        self.request_scoped = False
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = create_engine(
+                        DATABASE_URL,
+                        poolclass=TimedQueuePool,
+                        pool_size=10,
+                        max_overflow=20,
+                        pool_pre_ping=True,
+                        pool_recycle=3600,
+                    )
+        return self._engine
+
+    @property
+    def SessionLocal(self):
+        if self._session_factory is None:
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        return self._session_factory
 
     def create_tables(self):
+        """Создать недостающие таблицы (для локальных БД и тестов; в проде — python -m database.migrate)"""
         Base.metadata.create_all(bind=self.engine)
 
     def get_session(self) -> Session:
         return self.SessionLocal()
 
+    # ==================== REQUEST SESSION ====================
+
+    def init_app(self, app):
+        """
+        Включить сессию на запрос для Flask-приложения.
+
+        Пока активен контекст приложения, все методы Database используют
+        одну сессию (создаётся при первом обращении и хранится в flask.g)
+        вместо собственной на каждый вызов. Коммит выполняется один раз
+        в конце запроса; если любой метод упал с ошибкой, все изменения
+        запроса откатываются. Вне контекста приложения (CLI, скрипты)
+        поведение прежнее: своя сессия и коммит на каждый метод.
+        """
+        self.request_scoped = True
+        app.after_request(self._commit_request_session)
+        app.teardown_appcontext(self._close_request_session)
+
+    def _request_session(self, create: bool = False):
+        if not self.request_scoped or not has_app_context():
+            return None
+        session = g.get('db_session')
+        if session is None and create:
+            session = g.db_session = self.SessionLocal()
+        return session
+
+    def _acquire(self) -> Session:
+        return self._request_session(create=True) or self.SessionLocal()
+
+    def _commit(self, session: Session):
+        if session is self._request_session():
+            session.flush()
+        else:
+            session.commit()
+
+    def _rollback(self, session: Session):
+        session.rollback()
+        if session is self._request_session():
+            g.db_session_failed = True
+
+    def _release(self, session: Session):
+        if session is not self._request_session():
+            session.close()
+
+    def _commit_request_session(self, response):
+        session = self._request_session()
+        if session is not None and not g.pop('db_session_failed', False):
+            session.commit()
+        return response
+
+    def _close_request_session(self, exc=None):
+        session = g.pop('db_session', None) if has_app_context() else None
+        if session is not None:
+            try:
+                if exc is not None or session.in_transaction():
+                    session.rollback()
+            finally:
+                session.close()
+
     # ==================== USER METHODS ====================
     
     def add_user(self, nickname: str, username: str, email: str, password: str) -> User:
@@ -42,9 +150,9 @@ class Database:
         Returns:
             User: Созданный объект пользователя
         """
-        session = self.get_session()
+        session = self._acquire()
         try:
-            hashed_password = hash_password(password)
+            hashed_password = hasher.hash(password)
             new_user = User(
                 nickname=nickname,
                 username=username,
@@ -52,7 +160,7 @@ class Database:
                 hashed_password=hashed_password
             )
             session.add(new_user)
-            session.commit()
+            self._commit(session)
             session.refresh(new_user)
             
             # Сохраняем ID перед закрытием сессии
@@ -61,53 +169,108 @@ class Database:
             # Создаём статистику для пользователя
             user_stats = UserStats(user_id=user_id)
             session.add(user_stats)
-            session.commit()
+            self._commit(session)
             
             # Получаем пользователя заново из базы, чтобы вернуть свежий объект
             session.expunge_all()
             return session.query(User).filter(User.id == user_id).first()
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
     def get_user_by_id(self, user_id: int) -> User:
         """Получить пользователя по ID"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             user = session.query(User).filter(User.id == user_id).first()
             if user:
                 session.expunge(user)  # Отвязываем объект от сессии
             return user
         finally:
-            session.close()
+            self._release(session)
+
+    def get_user_record(self, user_id: int):
+        """
+        Получить лёгкую запись пользователя (без хеша пароля) по ID.
+
+        Returns:
+            dict | None: id, nickname, username, email, path_to_avatar
+        """
+        session = self._acquire()
+        try:
+            row = session.execute(
+                select(User.id, User.nickname, User.username, User.email, User.path_to_avatar)
+                .where(User.id == user_id)
+            ).first()
+            return dict(row._mapping) if row else None
+        finally:
+            self._release(session)
+
+    def update_user_profile(self, user_id: int, nickname: str = None, path_to_avatar: str = None):
+        """Обновить профиль пользователя (никнейм и/или аватар)"""
+        values = {}
+        if nickname is not None:
+            values['nickname'] = nickname
+        if path_to_avatar is not None:
+            values['path_to_avatar'] = path_to_avatar
+        if not values:
+            return
+        session = self._acquire()
+        try:
+            session.execute(update(User).where(User.id == user_id).values(**values))
+            self._touch(session, user_id)
+            self._commit(session)
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
 
     def get_user_by_username(self, username: str) -> User:
         """Получить пользователя по username"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             user = session.query(User).filter(User.username == username).first()
             if user:
                 session.expunge(user)  # Отвязываем объект от сессии
             return user
         finally:
-            session.close()
+            self._release(session)
 
     def get_user_by_email(self, email: str) -> User:
         """Получить пользователя по email"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             user = session.query(User).filter(User.email == email).first()
             if user:
                 session.expunge(user)  # Отвязываем объект от сессии
             return user
         finally:
-            session.close()
+            self._release(session)
+
+    def get_user_ids(self, after_id: int = 0, limit: int = 500):
+        """
+        Получить ID пользователей по возрастанию, начиная после after_id.
+
+        Используется для постраничного обхода всех пользователей
+        (keyset-пагинация по первичному ключу).
+        """
+        session = self._acquire()
+        try:
+            return list(session.scalars(
+                select(User.id).where(User.id > after_id).order_by(User.id).limit(limit)
+            ))
+        finally:
+            self._release(session)
 
     def verify_user_password(self, user: User, password: str) -> bool:
         """
         Проверить пароль пользователя.
+
+        Если пароль верный, а хеш получен с другой стоимостью bcrypt,
+        хеш прозрачно пересчитывается и сохраняется.
         
         Args:
             user: Объект пользователя
@@ -116,51 +279,431 @@ class Database:
         Returns:
             bool: True если пароль верный
         """
-        return verify_password(password, user.hashed_password)
+        if not hasher.verify(password, user.hashed_password):
+            return False
+        if hasher.needs_rehash(user.hashed_password):
+            self.update_user_password_hash(user.id, hasher.hash(password))
+        return True
+
+    def update_user_password_hash(self, user_id: int, hashed_password: str):
+        """Сохранить новый хеш пароля пользователя"""
+        session = self._acquire()
+        try:
+            session.execute(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+            self._commit(session)
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
 
     # ==================== STATS METHODS ====================
     
     def get_user_stats(self, user_id: int) -> UserStats:
         """Получить статистику пользователя"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             stats = session.query(UserStats).filter(UserStats.user_id == user_id).first()
             if stats:
                 session.expunge(stats)
             return stats
         finally:
-            session.close()
+            self._release(session)
+
+    def get_user_generation(self, user_id: int):
+        """
+        Текущее поколение данных пользователя (user_stats.generation).
+
+        Увеличивается каждым методом Database, меняющим данные пользователя,
+        поэтому по нему строятся ETag и условные ответы без загрузки самих данных.
+
+        Returns:
+            int | None: Поколение (None, если у пользователя нет статистики)
+        """
+        session = self._acquire()
+        try:
+            return session.scalar(select(UserStats.generation).where(UserStats.user_id == user_id))
+        finally:
+            self._release(session)
+
+    def _touch(self, session: Session, users):
+        """
+        Увеличить поколение данных пользователей в текущей транзакции.
+
+        users — ID пользователя, список ID или select(...) с user_id
+        (например, владельца задачи по её ID).
+        """
+        if isinstance(users, int):
+            users = [users]
+        session.execute(
+            update(UserStats).where(UserStats.user_id.in_(users))
+            .values(generation=UserStats.generation + 1)
+        )
 
     def update_user_rating(self, user_id: int, value: int):
-        """Обновить рейтинг пользователя"""
-        session = self.get_session()
+        """Обновить рейтинг пользователя (разница пишется в журнал rating_events)"""
+        session = self._acquire()
         try:
-            stats = session.query(UserStats).filter(UserStats.user_id == user_id).first()
-            if stats:
-                stats.rating = value
-                session.commit()
+            old = session.scalar(
+                select(UserStats.rating).where(UserStats.user_id == user_id).with_for_update()
+            )
+            session.execute(
+                update(UserStats).where(UserStats.user_id == user_id)
+                .values(rating=value, generation=UserStats.generation + 1)
+            )
+            if old is not None and value != old:
+                session.execute(insert(RatingEvent), [{'user_id': user_id, 'delta': value - old, 'source': 'manual'}])
+            self._commit(session)
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
+
+    def add_user_rating(self, user_id: int, value: int, source: str = 'manual'):
+        """
+        Атомарно добавить к рейтингу пользователя.
 
-    def add_user_rating(self, user_id: int, value: int):
-        """Добавить к рейтингу пользователя"""
-        session = self.get_session()
+        Args:
+            user_id: ID пользователя
+            value: Изменение рейтинга
+            source: Источник изменения для журнала (task, habit, rollover, manual)
+
+        Returns:
+            int | None: Новый рейтинг (None, если у пользователя нет статистики)
+        """
+        return self.add_users_rating([(user_id, value)], source).get(user_id)
+
+    def add_users_rating(self, deltas, source: str = 'manual') -> dict:
+        """
+        Атомарно изменить рейтинг нескольких пользователей одним запросом
+        UPDATE user_stats SET rating = rating + ... RETURNING rating.
+
+        Каждое изменение в той же транзакции записывается в журнал rating_events.
+
+        Args:
+            deltas: Пары (user_id, delta) или словарь {user_id: delta};
+                    изменения одного пользователя суммируются
+            source: Источник изменения для журнала
+
+        Returns:
+            dict: {user_id: новый рейтинг}
+        """
+        session = self._acquire()
         try:
-            stats = session.query(UserStats).filter(UserStats.user_id == user_id).first()
-            if stats:
-                stats.rating += value
-                session.commit()
+            ratings = self._apply_rating_deltas(session, deltas, source)
+            self._commit(session)
+            return ratings
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
+
+    def _apply_rating_deltas(self, session: Session, deltas, source: str) -> dict:
+        pairs = deltas.items() if isinstance(deltas, dict) else deltas
+        summed = {}
+        for user_id, delta in pairs:
+            summed[user_id] = summed.get(user_id, 0) + delta
+        if not summed:
+            return {}
+
+        if len(summed) == 1:
+            delta_expr = next(iter(summed.values()))
+        else:
+            delta_expr = case(summed, value=UserStats.user_id, else_=0)
+        rows = session.execute(
+            update(UserStats)
+            .where(UserStats.user_id.in_(summed))
+            .values(rating=UserStats.rating + delta_expr, generation=UserStats.generation + 1)
+            .returning(UserStats.user_id, UserStats.rating)
+        ).all()
+        ratings = {user_id: rating for user_id, rating in rows}
+
+        events = [
+            {'user_id': user_id, 'delta': summed[user_id], 'source': source}
+            for user_id in ratings if summed[user_id]
+        ]
+        if events:
+            session.execute(insert(RatingEvent), events)
+        return ratings
+
+    def get_leaderboard(self, after=None, limit: int = 50):
+        """
+        Страница таблицы лидеров (рейтинг по убыванию, при равенстве — по user_id).
+
+        Keyset-пагинация по индексу ix_user_stats_rating_user_id: следующая
+        страница запрашивается с after=(rating, user_id) последней строки
+        предыдущей, без OFFSET.
+
+        Args:
+            after: Кортеж (rating, user_id), после которого начинать
+            limit: Размер страницы
+
+        Returns:
+            List[dict]: user_id, nickname, username, path_to_avatar, rating
+        """
+        session = self._acquire()
+        try:
+            query = (
+                select(UserStats.user_id, User.nickname, User.username, User.path_to_avatar, UserStats.rating)
+                .join(User, User.id == UserStats.user_id)
+                .order_by(UserStats.rating.desc(), UserStats.user_id)
+                .limit(limit)
+            )
+            if after is not None:
+                after_rating, after_id = after
+                query = query.where(
+                    (UserStats.rating < after_rating)
+                    | ((UserStats.rating == after_rating) & (UserStats.user_id > after_id))
+                )
+            return [dict(row._mapping) for row in session.execute(query)]
+        finally:
+            self._release(session)
+
+    def get_rating_histogram(self):
+        """
+        Распределение рейтингов: [(rating, число пользователей), ...] по убыванию рейтинга.
+
+        Нужно для вычисления места пользователя без COUNT(*) на каждый запрос.
+        """
+        session = self._acquire()
+        try:
+            return session.execute(
+                select(UserStats.rating, func.count())
+                .where(UserStats.rating.is_not(None))
+                .group_by(UserStats.rating)
+                .order_by(UserStats.rating.desc())
+            ).all()
+        finally:
+            self._release(session)
+
+    def rollup_rating_events(self, day_start, week_start, limit: int = 10000,
+                             name: str = 'rating_changes') -> int:
+        """
+        Инкрементально перенести журнал rating_events в
+        user_stats.rating_change_for_the_day / rating_change_for_the_week.
+
+        Обрабатываются только ещё не учтённые события (applied = false), не
+        более limit за вызов: они помечаются учтёнными тем же UPDATE ...
+        RETURNING, который их читает. Водяного знака по id нет, поэтому
+        событие из долгой транзакции, закоммиченное позже событий с большими
+        id, не теряется — его подхватит следующий вызов. Смена дня или
+        недели обнуляет соответствующий столбец. Всё выполняется одной
+        транзакцией, поэтому повторный запуск после сбоя не учитывает
+        события дважды.
+
+        Args:
+            day_start: Начало текущего дня (datetime в локальном часовом поясе)
+            week_start: Начало текущей недели (datetime в локальном часовом поясе)
+            limit: Максимум событий за вызов
+            name: Имя записи в rollup_state
+
+        Returns:
+            int: Сколько событий обработано
+        """
+        day_key = day_start.date().isoformat()
+        week_key = week_start.date().isoformat()
+        day_start = day_start.astimezone(timezone.utc)
+        week_start = week_start.astimezone(timezone.utc)
+        session = self._acquire()
+        try:
+            state = session.get(RollupState, name, with_for_update=True)
+            if state is None:
+                state = RollupState(name=name)
+                session.add(state)
+
+            if state.day != day_key:
+                session.execute(
+                    update(UserStats).where(UserStats.rating_change_for_the_day != 0)
+                    .values(rating_change_for_the_day=0, generation=UserStats.generation + 1)
+                )
+                state.day = day_key
+            if state.week != week_key:
+                session.execute(
+                    update(UserStats).where(UserStats.rating_change_for_the_week != 0)
+                    .values(rating_change_for_the_week=0, generation=UserStats.generation + 1)
+                )
+                state.week = week_key
+
+            pending = (
+                select(RatingEvent.id)
+                .where(~RatingEvent.applied)
+                .order_by(RatingEvent.id)
+                .limit(limit)
+                .scalar_subquery()
+            )
+            events = session.execute(
+                update(RatingEvent)
+                .where(RatingEvent.id.in_(pending))
+                .values(applied=True)
+                .returning(RatingEvent.user_id, RatingEvent.delta, RatingEvent.created_at)
+            ).all()
+
+            if events:
+                sums = {}
+                for user_id, delta, created_at in events:
+                    if created_at.tzinfo is None:
+                        # SQLite возвращает время без зоны (CURRENT_TIMESTAMP — UTC)
+                        created_at = created_at.replace(tzinfo=timezone.utc)
+                    day, week = sums.get(user_id, (0, 0))
+                    sums[user_id] = (day + (delta if created_at >= day_start else 0),
+                                     week + (delta if created_at >= week_start else 0))
+                changes = [
+                    {'b_user_id': user_id, 'b_day': day, 'b_week': week}
+                    for user_id, (day, week) in sums.items() if day or week
+                ]
+                if changes:
+                    stats = UserStats.__table__
+                    session.execute(
+                        update(stats)
+                        .where(stats.c.user_id == bindparam('b_user_id'))
+                        .values(
+                            rating_change_for_the_day=func.coalesce(stats.c.rating_change_for_the_day, 0) + bindparam('b_day'),
+                            rating_change_for_the_week=func.coalesce(stats.c.rating_change_for_the_week, 0) + bindparam('b_week'),
+                            generation=stats.c.generation + 1,
+                        ),
+                        changes
+                    )
+
+            self._commit(session)
+            return len(events)
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
+
+    # ==================== DASHBOARD ====================
+
+    DASHBOARD_COLUMNS = {
+        'tasks': (Task, ('id', 'title', 'status', 'notes', 'difficulty', 'deadline')),
+        'habits': (Habit, ('id', 'title', 'notes', 'difficulty', 'streak', 'start_date', 'repeat_type',
+                           'repeat_every', 'repeat_days')),
+        'achievements': (Achievement, ('id', 'title', 'description')),
+    }
+
+    def _json_rows(self, model, columns, user_id, computed=None):
+        """
+        Подзапрос, собирающий строки пользователя из таблицы в JSON-массив.
+
+        computed — дополнительные вычисляемые поля {имя: выражение}.
+        """
+        computed = computed or {}
+        rows = (
+            select(*(getattr(model, name) for name in columns),
+                   *(expression.label(name) for name, expression in computed.items()))
+            .where(model.user_id == user_id)
+            .order_by(model.id)
+            .subquery()
+        )
+        pairs = []
+        for name in (*columns, *computed):
+            pairs += [literal_column(f"'{name}'"), rows.c[name]]
+        if self.engine.dialect.name == 'postgresql':
+            agg = func.coalesce(func.json_agg(func.json_build_object(*pairs)), literal_column("'[]'::json"))
+        else:
+            agg = func.json_group_array(func.json_object(*pairs))
+        return select(agg).select_from(rows).scalar_subquery()
+
+    def get_dashboard(self, user_id: int, today: date = None):
+        """
+        Получить все данные главной страницы за один запрос к БД.
+
+        Статистика берётся JOIN-ом, а задачи, привычки и достижения —
+        подзапросами, агрегирующими строки в JSON (json_agg в PostgreSQL,
+        json_group_array в SQLite). Для других СУБД — жадная загрузка
+        связей в одной сессии.
+
+        Args:
+            user_id: ID пользователя
+            today: Дата для completed_today привычек (по умолчанию — сегодня по ЕКБ)
+
+        Returns:
+            dict | None: rating, rating_change_day, rating_change_week и списки
+            словарей tasks, habits, achievements (deadline — строка YYYY-MM-DD)
+        """
+        today = (today or local_today()).isoformat()
+        if self.engine.dialect.name not in ('postgresql', 'sqlite'):
+            return self._get_dashboard_eager(user_id, today)
+
+        # «Выполнена сегодня» — наличие строки в habit_completions (по первичному ключу)
+        computed = {Habit: {'completed_today': self._completed_on(today)}}
+        session = self._acquire()
+        try:
+            query = (
+                select(
+                    UserStats.rating,
+                    UserStats.rating_change_for_the_day,
+                    UserStats.rating_change_for_the_week,
+                    *(self._json_rows(model, columns, user_id, computed.get(model)).label(key)
+                      for key, (model, columns) in self.DASHBOARD_COLUMNS.items()),
+                )
+                .select_from(User)
+                .outerjoin(UserStats, UserStats.user_id == User.id)
+                .where(User.id == user_id)
+            )
+            row = session.execute(query).first()
+            if row is None:
+                return None
+
+            data = {
+                'rating': row.rating or 0,
+                'rating_change_day': row.rating_change_for_the_day or 0,
+                'rating_change_week': row.rating_change_for_the_week or 0,
+            }
+            for key in self.DASHBOARD_COLUMNS:
+                value = getattr(row, key)
+                data[key] = json.loads(value) if isinstance(value, str) else (value or [])
+            for task in data['tasks']:
+                task['deadline'] = task['deadline'][:10] if task['deadline'] else None
+            for habit in data['habits']:
+                habit['completed_today'] = bool(habit['completed_today'])
+            return data
+        finally:
+            self._release(session)
+
+    def _get_dashboard_eager(self, user_id: int, today: str):
+        session = self._acquire()
+        try:
+            user = session.scalar(
+                select(User).where(User.id == user_id).options(
+                    joinedload(User.stats), selectinload(User.tasks),
+                    selectinload(User.habits), selectinload(User.achievements),
+                )
+            )
+            if user is None:
+                return None
+            stats = user.stats
+            data = {
+                'rating': (stats.rating if stats else 0) or 0,
+                'rating_change_day': (stats.rating_change_for_the_day if stats else 0) or 0,
+                'rating_change_week': (stats.rating_change_for_the_week if stats else 0) or 0,
+            }
+            for key, (model, columns) in self.DASHBOARD_COLUMNS.items():
+                items = sorted(getattr(user, key), key=lambda item: item.id)
+                data[key] = [{name: getattr(item, name) for name in columns} for item in items]
+            for task in data['tasks']:
+                task['deadline'] = task['deadline'].strftime('%Y-%m-%d') if task['deadline'] else None
+            done = set(session.scalars(
+                select(HabitCompletion.habit_id).join(Habit)
+                .where(Habit.user_id == user_id, HabitCompletion.date == today)
+            ))
+            for habit in data['habits']:
+                habit['completed_today'] = habit['id'] in done
+            return data
+        finally:
+            self._release(session)
 
     # ==================== TASK METHODS ====================
     
+    def _owned(self, session: Session, model, entity_id: int, user_id: int = None):
+        """Запрос записи по первичному ключу; с user_id — только если она принадлежит пользователю"""
+        query = session.query(model).filter(model.id == entity_id)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        return query
+
     def add_user_task(self, user_id: int, title: str, notes: str = None, difficulty: str = 'easy', deadline=None) -> Task:
         """
         Добавить задачу пользователю.
@@ -175,7 +718,7 @@ class Database:
         Returns:
             Task: Созданная задача
         """
-        session = self.get_session()
+        session = self._acquire()
         try:
             new_task = Task(
                 user_id=user_id,
@@ -185,16 +728,17 @@ class Database:
                 deadline=deadline
             )
             session.add(new_task)
-            session.commit()
+            self._touch(session, user_id)
+            self._commit(session)
             session.refresh(new_task)
             task_id = new_task.id
             session.expunge(new_task)
             return new_task
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
     def get_user_tasks(self, user_id: int, status: str = None):
         """
@@ -207,7 +751,7 @@ class Database:
         Returns:
             List[Task]: Список задач
         """
-        session = self.get_session()
+        session = self._acquire()
         try:
             query = session.query(Task).filter(Task.user_id == user_id)
             if status:
@@ -217,29 +761,44 @@ class Database:
                 session.expunge(task)
             return tasks
         finally:
-            session.close()
+            self._release(session)
+
+    def get_user_task(self, user_id: int, task_id: int) -> Task:
+        """Получить задачу по ID, только если она принадлежит пользователю (иначе None)"""
+        session = self._acquire()
+        try:
+            task = self._owned(session, Task, task_id, user_id).first()
+            if task:
+                session.expunge(task)
+            return task
+        finally:
+            self._release(session)
 
-    def update_task_status(self, task_id: int, status: str):
-        """Обновить статус задачи"""
-        session = self.get_session()
+    def update_task_status(self, task_id: int, status: str, user_id: int = None) -> bool:
+        """Обновить статус задачи (с user_id — только задачи этого пользователя). Возвращает True, если задача найдена"""
+        session = self._acquire()
         try:
-            task = session.query(Task).filter(Task.id == task_id).first()
+            task = self._owned(session, Task, task_id, user_id).first()
             if task:
                 task.status = status
                 if status == 'completed':
                     task.completed_at = func.now()
-                session.commit()
+                self._touch(session, task.user_id)
+                self._commit(session)
+            return task is not None
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
-    def update_task_details(self, task_id: int, title: str, notes: str = None, difficulty: str = 'easy', deadline=None):
-        """Обновить полную информацию о задаче"""
-        session = self.get_session()
+    def update_task_details(self, task_id: int, title: str, notes: str = None, difficulty: str = 'easy', deadline=None,
+                            user_id: int = None) -> Task:
+        """Обновить полную информацию о задаче (с user_id — только задачи этого пользователя).
+        Возвращает обновлённую задачу (или None)"""
+        session = self._acquire()
         try:
-            task = session.query(Task).filter(Task.id == task_id).first()
+            task = self._owned(session, Task, task_id, user_id).first()
             if task:
                 task.title = title
                 task.notes = notes
@@ -249,24 +808,33 @@ class Database:
                     task.deadline = datetime.fromisoformat(deadline)
                 else:
                     task.deadline = None
-                session.commit()
+                self._touch(session, task.user_id)
+                self._commit(session)
+                session.refresh(task)
+                session.expunge(task)
+            return task
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
-    def delete_task(self, task_id: int):
-        """Удалить задачу"""
-        session = self.get_session()
+    def delete_task(self, task_id: int, user_id: int = None) -> bool:
+        """Удалить задачу (с user_id — только задачу этого пользователя). Возвращает True, если задача была удалена"""
+        session = self._acquire()
         try:
-            session.query(Task).filter(Task.id == task_id).delete()
-            session.commit()
+            if user_id is None:
+                user_id = session.scalar(select(Task.user_id).where(Task.id == task_id))
+            deleted = self._owned(session, Task, task_id, user_id).delete()
+            if deleted:
+                self._touch(session, user_id)
+            self._commit(session)
+            return deleted > 0
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
     # ==================== HABIT METHODS ====================
     
@@ -289,7 +857,7 @@ class Database:
         Returns:
             Habit: Созданная привычка
         """
-        session = self.get_session()
+        session = self._acquire()
         try:
             new_habit = Habit(
                 user_id=user_id,
@@ -303,48 +871,63 @@ class Database:
                 repeat_days=repeat_days
             )
             session.add(new_habit)
-            session.commit()
+            self._touch(session, user_id)
+            self._commit(session)
             session.refresh(new_habit)
             habit_id = new_habit.id
             session.expunge(new_habit)
             return new_habit
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
     def get_user_habits(self, user_id: int):
         """Получить привычки пользователя"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             habits = session.query(Habit).filter(Habit.user_id == user_id).all()
             for habit in habits:
                 session.expunge(habit)
             return habits
         finally:
-            session.close()
+            self._release(session)
 
-    def update_habit_last_checked(self, habit_id: int, last_checked_date: str):
+    def get_user_habit(self, user_id: int, habit_id: int) -> Habit:
+        """Получить привычку по ID, только если она принадлежит пользователю (иначе None)"""
+        session = self._acquire()
+        try:
+            habit = self._owned(session, Habit, habit_id, user_id).first()
+            if habit:
+                session.expunge(habit)
+            return habit
+        finally:
+            self._release(session)
+
+    def update_habit_last_checked(self, habit_id: int, last_checked_date: str, user_id: int = None):
         """Обновить дату последней проверки привычки"""
-        session = self.get_session()
+        session = self._acquire()
         try:
-            habit = session.query(Habit).filter(Habit.id == habit_id).first()
+            habit = self._owned(session, Habit, habit_id, user_id).first()
             if habit:
                 habit.last_checked_date = last_checked_date
-                session.commit()
+                self._touch(session, habit.user_id)
+                self._commit(session)
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
     def update_habit_details(self, habit_id: int, title: str = None, notes: str = None, difficulty: str = None, start_date: str = None,
-                            repeat_type: str = None, repeat_every: int = None, repeat_days: str = None, streak: int = None):
-        """Обновить все поля привычки (title, notes, difficulty, start_date, repeat_type, repeat_every, repeat_days, streak)"""
-        session = self.get_session()
+                            repeat_type: str = None, repeat_every: int = None, repeat_days: str = None, streak: int = None,
+                            user_id: int = None) -> Habit:
+        """Обновить все поля привычки (title, notes, difficulty, start_date, repeat_type, repeat_every, repeat_days, streak);
+        с user_id — только привычки этого пользователя. Возвращает обновлённую привычку (или None)"""
+        session = self._acquire()
         try:
-            habit = session.query(Habit).filter(Habit.id == habit_id).first()
+            habit = self._owned(session, Habit, habit_id, user_id).first()
             if habit:
                 if title is not None:
                     habit.title = title
@@ -362,66 +945,555 @@ class Database:
                     habit.repeat_days = repeat_days
                 if streak is not None:
                     habit.streak = streak
-                session.commit()
+                self._touch(session, habit.user_id)
+                self._commit(session)
+                session.refresh(habit)
+                session.expunge(habit)
+            return habit
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
-    def update_habit_streak(self, habit_id: int, streak: int):
+    def update_habit_streak(self, habit_id: int, streak: int, user_id: int = None):
         """Обновить серию привычки"""
-        session = self.get_session()
+        session = self._acquire()
         try:
-            habit = session.query(Habit).filter(Habit.id == habit_id).first()
+            habit = self._owned(session, Habit, habit_id, user_id).first()
             if habit:
                 habit.streak = streak
-                session.commit()
+                self._touch(session, habit.user_id)
+                self._commit(session)
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
+
+    @staticmethod
+    def _completed_on(day: str):
+        """EXISTS: выполнена ли привычка (Habit.id внешнего запроса) в день day (YYYY-MM-DD)"""
+        return (
+            select(HabitCompletion.habit_id)
+            .where(HabitCompletion.habit_id == Habit.id, HabitCompletion.date == day)
+            .exists()
+        )
+
+    def _set_completion(self, session: Session, habit_id: int, day: str, completed: bool) -> bool:
+        """Добавить или удалить отметку о выполнении; True, если состояние изменилось"""
+        if not completed:
+            return session.execute(
+                delete(HabitCompletion).where(HabitCompletion.habit_id == habit_id, HabitCompletion.date == day)
+            ).rowcount > 0
+        dialect = self.engine.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # Повторная отметка (двойной клик, второй вкладкой) не ошибка, а no-op
+            dialect_insert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+            return session.execute(
+                dialect_insert(HabitCompletion).values(habit_id=habit_id, date=day).on_conflict_do_nothing()
+            ).rowcount > 0
+        if session.get(HabitCompletion, (habit_id, day)) is not None:
+            return False
+        session.add(HabitCompletion(habit_id=habit_id, date=day))
+        session.flush()
+        return True
 
-    def update_habit_completed_today(self, habit_id: int, completed: bool):
-        """Обновить статус выполнения привычки за сегодня"""
-        session = self.get_session()
+    def _compute_streaks(self, session: Session, habits, today: date) -> dict:
+        """
+        Серии привычек по истории выполнений (без записи в БД).
+
+        Выполнения читаются одним запросом, а разрывы серии по расписанию
+        привычек ищет functions.habit_streaks — сразу для всех привычек.
+
+        Args:
+            habits: Строки или объекты Habit с id и полями правила повторения
+
+        Returns:
+            dict: {habit_id: серия}
+        """
+        habits = {habit.id: habit for habit in habits}
+        if not habits:
+            return {}
+        completions = {habit_id: [] for habit_id in habits}
+        rows = session.execute(
+            select(HabitCompletion.habit_id, HabitCompletion.date)
+            .where(HabitCompletion.habit_id.in_(list(habits)), HabitCompletion.date <= today.isoformat())
+        )
+        for habit_id, day in rows:
+            completions[habit_id].append(day)
+        return dict(zip(habits, habit_streaks(list(habits.values()), completions.values(), today)))
+
+    def set_habit_completion(self, habit_id: int, day: date, completed: bool, user_id: int = None):
+        """
+        Отметить привычку выполненной (или снять отметку) за день day.
+
+        Серия пересчитывается по истории выполнений, поэтому повторная
+        отметка того же дня ничего не меняет.
+
+        Returns:
+            tuple | None: (изменилось ли состояние, новая серия);
+            None, если привычки нет (или она чужая при заданном user_id)
+        """
+        session = self._acquire()
         try:
-            habit = session.query(Habit).filter(Habit.id == habit_id).first()
-            if habit:
-                habit.completed_today = completed
-                session.commit()
+            habit = self._owned(session, Habit, habit_id, user_id).first()
+            if habit is None:
+                return None
+            changed = self._set_completion(session, habit.id, day.isoformat(), completed)
+            if changed:
+                habit.streak = self._compute_streaks(session, [habit], day)[habit.id]
+                self._touch(session, habit.user_id)
+            streak = habit.streak
+            self._commit(session)
+            return changed, streak
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
+
+    def get_completed_habit_ids(self, user_id: int, day: date) -> set:
+        """ID привычек пользователя, выполненных в день day"""
+        session = self._acquire()
+        try:
+            return set(session.scalars(
+                select(HabitCompletion.habit_id).join(Habit)
+                .where(Habit.user_id == user_id, HabitCompletion.date == day.isoformat())
+            ))
+        finally:
+            self._release(session)
+
+    def recompute_streaks(self, user_ids, today: date) -> int:
+        """
+        Пересчитать серии всех привычек группы пользователей по истории выполнений.
+
+        Returns:
+            int: Число привычек, у которых серия изменилась
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        session = self._acquire()
+        try:
+            habits = session.execute(
+                select(
+                    Habit.id, Habit.user_id, Habit.streak, Habit.start_date, Habit.repeat_type,
+                    Habit.repeat_every, Habit.repeat_days
+                ).where(Habit.user_id.in_(user_ids))
+            ).all()
+            streaks = self._compute_streaks(session, habits, today)
+            changed = [habit for habit in habits if (habit.streak or 0) != streaks[habit.id]]
+            if changed:
+                table = Habit.__table__
+                session.execute(
+                    update(table).where(table.c.id == bindparam('b_id')).values(streak=bindparam('b_streak')),
+                    [{'b_id': habit.id, 'b_streak': streaks[habit.id]} for habit in changed]
+                )
+                self._touch(session, {habit.user_id for habit in changed})
+            self._commit(session)
+            return len(changed)
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
+
+    def rollover_user_habits(self, user_id: int, yesterday, today) -> int:
+        """
+        Перевести привычки пользователя на новый день одной транзакцией.
+
+        Штрафует за привычки, пропущенные вчера (и сбрасывает их серию),
+        и сдвигает last_checked_date на вчера. Сбрасывать отметку
+        «выполнено» не нужно: она хранится в habit_completions по датам.
+        Привычки, уже проверенные за вчера, не трогаются, поэтому повторные
+        вызовы за день ничего не меняют.
+
+        Args:
+            user_id: ID пользователя
+            yesterday: Вчерашняя дата (date)
+            today: Сегодняшняя дата (date)
+
+        Returns:
+            int: Изменение рейтинга (сумма штрафов)
+        """
+        return self.rollover_habits([user_id], yesterday, today).get(user_id, 0)
+
+    def rollover_habits(self, user_ids, yesterday, today) -> dict:
+        """
+        То же, что rollover_user_habits, но для группы пользователей сразу.
+
+        Все изменения группы применяются одной транзакцией, поэтому
+        пакетная обработка (database/rollover.py) коммитит по группе.
+
+        Returns:
+            dict: {user_id: изменение рейтинга} для пользователей со штрафами
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        yesterday_str = yesterday.strftime('%Y-%m-%d')
+        session = self._acquire()
+        try:
+            habits = session.execute(
+                select(
+                    Habit.id, Habit.user_id, Habit.difficulty, Habit.start_date, Habit.repeat_type,
+                    Habit.repeat_every, Habit.repeat_days
+                ).where(
+                    Habit.user_id.in_(user_ids),
+                    (Habit.last_checked_date.is_(None)) | (Habit.last_checked_date < yesterday_str)
+                )
+            ).all()
+
+            completed = set(session.scalars(
+                select(HabitCompletion.habit_id).join(Habit)
+                .where(Habit.user_id.in_(user_ids), HabitCompletion.date == yesterday_str)
+            )) if habits else set()
+
+            checked_ids, missed_ids = [], []
+            touched = set()
+            deltas = {}
+            for habit in habits:
+                schedule = compile_schedule(habit)
+                start_date = schedule.start or today
+
+                # Привычка ещё не началась
+                if today < start_date:
+                    continue
+
+                checked_ids.append(habit.id)
+                touched.add(habit.user_id)
+
+                # Не штрафуем за пропуск, если привычка только что создана
+                if start_date > yesterday:
+                    continue
+
+                if schedule.is_active(yesterday) and habit.id not in completed:
+                    missed_ids.append(habit.id)
+                    penalty = POINTS_TABLE.get(habit.difficulty, (25, -25))[1]
+                    deltas[habit.user_id] = deltas.get(habit.user_id, 0) + penalty
+
+            if missed_ids:
+                session.execute(update(Habit).where(Habit.id.in_(missed_ids)).values(streak=0))
+            if checked_ids:
+                session.execute(
+                    update(Habit).where(Habit.id.in_(checked_ids)).values(last_checked_date=yesterday_str)
+                )
+            # Поколение пользователей со штрафом увеличит _apply_rating_deltas
+            touched.difference_update(deltas)
+            if touched:
+                self._touch(session, touched)
+            self._apply_rating_deltas(session, deltas, 'rollover')
+            self._commit(session)
+            return deltas
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
 
     def get_habit_by_id(self, habit_id: int) -> Habit:
         """Получить привычку по ID"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             habit = session.query(Habit).filter(Habit.id == habit_id).first()
             if habit:
                 session.expunge(habit)
             return habit
         finally:
-            session.close()
+            self._release(session)
 
-    def delete_habit(self, habit_id: int):
-        """Удалить привычку"""
-        session = self.get_session()
+    def delete_habit(self, habit_id: int, user_id: int = None) -> bool:
+        """Удалить привычку (с user_id — только привычку этого пользователя). Возвращает True, если привычка была удалена"""
+        session = self._acquire()
         try:
-            session.query(Habit).filter(Habit.id == habit_id).delete()
-            session.commit()
+            if user_id is None:
+                user_id = session.scalar(select(Habit.user_id).where(Habit.id == habit_id))
+            deleted = self._owned(session, Habit, habit_id, user_id).delete()
+            if deleted:
+                # В PostgreSQL их удалит ON DELETE CASCADE, в SQLite внешние ключи не проверяются
+                session.execute(delete(HabitCompletion).where(HabitCompletion.habit_id == habit_id))
+                self._touch(session, user_id)
+            self._commit(session)
+            return deleted > 0
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
+
+    # ==================== BATCH METHODS ====================
+
+    # Операция пакета -> (модель, обязательное поле)
+    BATCH_OPERATIONS = {
+        'task_status': (Task, 'status'),
+        'task_edit': (Task, 'title'),
+        'task_delete': (Task, None),
+        'habit_toggle': (Habit, 'completed'),
+        'habit_edit': (Habit, None),
+        'habit_delete': (Habit, None),
+    }
+
+    HABIT_EDIT_FIELDS = ('title', 'notes', 'difficulty', 'start_date', 'repeat_type',
+                         'repeat_every', 'repeat_days', 'streak')
+
+    # Типы полей операций: значения из JSON не приводятся (1.5 -> 1, "false" -> True), а отклоняются
+    BATCH_INT_FIELDS = ('task_id', 'habit_id', 'repeat_every', 'streak')
+    BATCH_BOOL_FIELDS = ('completed',)
+
+    @staticmethod
+    def _is_int(value) -> bool:
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    def _batch_type_error(self, op):
+        for field in self.BATCH_INT_FIELDS:
+            if op.get(field) is not None and not self._is_int(op[field]):
+                return f'{field} must be an integer'
+        for field in self.BATCH_BOOL_FIELDS:
+            if op.get(field) is not None and not isinstance(op[field], bool):
+                return f'{field} must be true or false'
+        return None
+
+    def apply_batch(self, user_id: int, operations, today: date = None):
+        """
+        Применить пакет операций пользователя одной транзакцией.
+
+        Операции выполняются по порядку. Принадлежность задач и привычек
+        проверяется заранее (по одному запросу на таблицу): если хоть одна
+        операция ссылается на чужую, несуществующую или уже удалённую в этом
+        же пакете запись, ничего не применяется. Изменения рейтинга
+        суммируются и записываются одним UPDATE в конце.
+
+        Args:
+            user_id: ID пользователя
+            operations: Список словарей {'op': ..., 'task_id' / 'habit_id': ..., ...}:
+                task_status (status), task_edit (title, notes, difficulty, deadline),
+                task_delete, habit_toggle (completed), habit_edit (поля привычки,
+                None — не менять), habit_delete
+            today: День для habit_toggle (по умолчанию — сегодня по ЕКБ)
+
+        Returns:
+            tuple: (результаты по операциям, новый рейтинг).
+            Результат — {'task': Task} / {'habit': Habit, 'completed_today': bool} для изменений,
+            {'task_id': ...} / {'habit_id': ...} для удалений. Если пакет
+            отклонён, у ошибочных операций {'error': ...}, у остальных None
+        """
+        session = self._acquire()
+        try:
+            wanted = {Task: set(), Habit: set()}
+            for op in operations:
+                model, _ = self.BATCH_OPERATIONS.get(op.get('op'), (None, None))
+                key = 'task_id' if model is Task else 'habit_id'
+                if model is not None and self._is_int(op.get(key)):
+                    wanted[model].add(op[key])
+
+            owned = {}
+            for model, ids in wanted.items():
+                if ids:
+                    rows = session.query(model).filter(
+                        model.user_id == user_id, model.id.in_(ids)
+                    ).with_for_update().all()
+                    owned.update({(model, row.id): row for row in rows})
+
+            # Проверка до любых изменений: пакет применяется целиком или никак
+            results = []
+            deleted = set()
+            for op in operations:
+                model, required = self.BATCH_OPERATIONS.get(op.get('op'), (None, None))
+                if model is None:
+                    results.append({'error': 'Unknown operation'})
+                    continue
+                type_error = self._batch_type_error(op)
+                if type_error:
+                    results.append({'error': type_error})
+                    continue
+                if required and op.get(required) is None:
+                    results.append({'error': f'Missing {required}'})
+                    continue
+                key = (model, op.get('task_id' if model is Task else 'habit_id'))
+                if key not in owned or key in deleted:
+                    results.append({'error': 'Task not found' if model is Task else 'Habit not found'})
+                    continue
+                if op['op'].endswith('_delete'):
+                    deleted.add(key)
+                results.append(None)
+            if any(results):
+                return results, None
+
+            today = today or local_today()
+            delta = 0
+            toggled = {}
+            for i, op in enumerate(operations):
+                kind = op['op']
+                if kind.startswith('task_'):
+                    task = owned[(Task, op['task_id'])]
+                    if kind == 'task_delete':
+                        session.delete(task)
+                        results[i] = {'task_id': task.id}
+                        continue
+                    if kind == 'task_status':
+                        task.status = op['status']
+                        if op['status'] == 'completed':
+                            task.completed_at = func.now()
+                        pts = POINTS_TABLE.get(task.difficulty, POINTS_TABLE['trivial'])
+                        delta += pts[0] if op['status'] == 'completed' else pts[1]
+                    else:
+                        task.title = op['title']
+                        task.notes = op.get('notes')
+                        task.difficulty = op.get('difficulty') or 'easy'
+                        deadline = op.get('deadline')
+                        if deadline:
+                            from datetime import datetime
+                            task.deadline = datetime.fromisoformat(deadline)
+                        else:
+                            task.deadline = None
+                    results[i] = {'task': task}
+                else:
+                    habit = owned[(Habit, op['habit_id'])]
+                    if kind == 'habit_delete':
+                        session.execute(delete(HabitCompletion).where(HabitCompletion.habit_id == habit.id))
+                        session.delete(habit)
+                        toggled.pop(habit.id, None)
+                        results[i] = {'habit_id': habit.id}
+                        continue
+                    if kind == 'habit_toggle':
+                        pts = POINTS_TABLE.get(habit.difficulty, POINTS_TABLE['easy'])
+                        # Баллы только за реальную смену состояния: повторная отметка — no-op
+                        if self._set_completion(session, habit.id, today.isoformat(), op['completed']):
+                            delta += pts[0] if op['completed'] else -pts[0]
+                            toggled[habit.id] = habit
+                    else:
+                        for field in self.HABIT_EDIT_FIELDS:
+                            if op.get(field) is not None:
+                                setattr(habit, field, op[field])
+                    results[i] = {'habit': habit}
+
+            for habit_id, streak in self._compute_streaks(session, toggled.values(), today).items():
+                toggled[habit_id].streak = streak
+
+            session.flush()
+            if delta:
+                rating = self._apply_rating_deltas(session, {user_id: delta}, 'batch').get(user_id)
+            else:
+                self._touch(session, user_id)
+                rating = session.query(UserStats.rating).filter(UserStats.user_id == user_id).scalar()
+
+            habit_ids = [result['habit'].id for result in results if 'habit' in result]
+            if habit_ids:
+                done = set(session.scalars(select(HabitCompletion.habit_id).where(
+                    HabitCompletion.habit_id.in_(habit_ids), HabitCompletion.date == today.isoformat()
+                )))
+                for result in results:
+                    if 'habit' in result:
+                        result['completed_today'] = result['habit'].id in done
+
+            # Отдаём объекты наружу без повторного чтения после коммита
+            for result in results:
+                obj = result.get('task') or result.get('habit')
+                if obj is not None and obj in session:
+                    session.expunge(obj)
+            self._commit(session)
+            return results, rating
+        except Exception as e:
+            self._rollback(session)
+            raise e
+        finally:
+            self._release(session)
+
+    # ==================== IMPORT / EXPORT METHODS ====================
+
+    TRANSFER_MODELS = {'tasks': Task, 'habits': Habit}
+
+    def import_user_rows(self, user_id: int, kind: str, rows, batch_size: int = 500, today: date = None) -> int:
+        """
+        Добавить пользователю задачи или привычки из итератора одной транзакцией.
+
+        Строки читаются из rows пачками по batch_size и вставляются
+        executemany без создания ORM-объектов, так что в памяти держится
+        только текущая пачка. Исключение из итератора (например, ошибка
+        разбора файла) откатывает весь импорт.
+
+        Серия привычки (streak) подкрепляется историей: в habit_completions
+        добавляются выполнения за последние активные дни до вчера, иначе
+        первая же отметка пересчитала бы серию с нуля.
+
+        Args:
+            user_id: ID пользователя
+            kind: 'tasks' или 'habits'
+            rows: Итератор словарей с колонками Task / Habit (без user_id)
+            today: Дата, от которой восстанавливается история серий (по умолчанию — сегодня по ЕКБ)
+
+        Returns:
+            int: Число добавленных строк
+        """
+        model = self.TRANSFER_MODELS[kind]
+        today = today or local_today()
+        rows = iter(rows)
+        session = self._acquire()
+        try:
+            count = 0
+            while True:
+                chunk = [{**row, 'user_id': user_id} for row in itertools.islice(rows, batch_size)]
+                if not chunk:
+                    break
+                if model is Habit:
+                    self._import_habits(session, chunk, today)
+                else:
+                    session.execute(insert(model), chunk)
+                count += len(chunk)
+            if count:
+                self._touch(session, user_id)
+            self._commit(session)
+            return count
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
+        finally:
+            self._release(session)
+
+    def _import_habits(self, session: Session, habits, today: date):
+        days = streak_days(habits, [habit.get('streak') or 0 for habit in habits], today)
+        for habit, habit_days in zip(habits, days):
+            # Серия не длиннее восстановленной истории (у редких привычек дней в окне может не хватить)
+            habit['streak'] = len(habit_days)
+        habit_ids = session.scalars(
+            insert(Habit).returning(Habit.id, sort_by_parameter_order=True), habits
+        ).all()
+        completions = [
+            {'habit_id': habit_id, 'date': day.isoformat()}
+            for habit_id, habit_days in zip(habit_ids, days) for day in habit_days
+        ]
+        if completions:
+            session.execute(insert(HabitCompletion), completions)
+
+    def iter_user_rows(self, user_id: int, kind: str, columns, chunk_size: int = 1000):
+        """
+        Задачи или привычки пользователя пачками по chunk_size (по возрастанию ID).
+
+        Генератор для потоковой выгрузки: строки читаются через
+        серверный курсор (yield_per), а не загружаются все сразу. Работает
+        в собственной сессии, а не в сессии запроса: потоковый ответ
+        дочитывается уже после конца обработки запроса.
+
+        Yields:
+            list[dict]: Пачка строк с колонками columns
+        """
+        model = self.TRANSFER_MODELS[kind]
+        session = self.SessionLocal()
+        try:
+            result = session.execute(
+                select(*(getattr(model, column) for column in columns))
+                .where(model.user_id == user_id)
+                .order_by(model.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            for partition in result.partitions():
+                yield [dict(row._mapping) for row in partition]
         finally:
             session.close()
 
     # ==================== ACHIEVEMENT METHODS ====================
-    
+
     def add_user_achievement(self, user_id: int, title: str, description: str = None) -> Achievement:
         """
         Добавить достижение пользователю.
@@ -434,7 +1506,7 @@ class Database:
         Returns:
             Achievement: Созданное достижение
         """
-        session = self.get_session()
+        session = self._acquire()
         try:
             new_achievement = Achievement(
                 user_id=user_id,
@@ -442,29 +1514,36 @@ class Database:
                 description=description
             )
             session.add(new_achievement)
-            session.commit()
+            self._touch(session, user_id)
+            self._commit(session)
             session.refresh(new_achievement)
             achievement_id = new_achievement.id
             session.expunge(new_achievement)
             return new_achievement
         except Exception as e:
-            session.rollback()
+            self._rollback(session)
             raise e
         finally:
-            session.close()
+            self._release(session)
 
     def get_user_achievements(self, user_id: int):
         """Получить достижения пользователя"""
-        session = self.get_session()
+        session = self._acquire()
         try:
             achievements = session.query(Achievement).filter(Achievement.user_id == user_id).all()
             for ach in achievements:
                 session.expunge(ach)
             return achievements
         finally:
-            session.close()
+            self._release(session)
 
 
 # Глобальный экземпляр для использования в приложении
 db = Database()
-SessionLocal = db.SessionLocal
\ No newline at end of file
+
+
+def __getattr__(name):
+    # SessionLocal оставлен для совместимости; engine создаётся только при обращении
+    if name == 'SessionLocal':
+        return db.SessionLocal
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Версионированные миграции схемы.
+
+Запуск (из корня проекта, при деплое до старта воркеров):
+
+    python -m database.migrate            # применить все новые миграции
+    python -m database.migrate --status   # показать применённые и ожидающие
+    python -m database.migrate --to 3     # применить миграции до версии 3
+
+Применённые версии хранятся в таблице schema_migrations. Каждая
+миграция выполняется в своей транзакции вместе с записью о ней.
+Откат миграций не поддерживается: новая схема — новая миграция.
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, func, insert, inspect,
+    select, text,
+)
+from sqlalchemy.schema import CreateColumn
+
+from database.database import db
+from database.models import Base
+from functions import compile_schedule, local_today
+
+migrations_meta = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migrations_meta,
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime(timezone=True), server_default=func.now()),
+)
+
+
+# Схема версии 1 — таблицы, какими их создавал create_tables до появления
+# миграций. Заморожена здесь, а не берётся из моделей: иначе новая БД
+# получала бы на шаге 1 уже текущую схему, и миграции 2+ применялись бы
+# к ней иначе, чем к существующим БД. Не менять.
+baseline_meta = MetaData()
+
+Table(
+    'users', baseline_meta,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('nickname', String, unique=True, index=True, nullable=False),
+    Column('username', String, unique=True, index=True, nullable=False),
+    Column('path_to_avatar', String),
+    Column('email', String, unique=True, index=True, nullable=False),
+    Column('hashed_password', String, nullable=False),
+    Column('created_at', DateTime(timezone=True), server_default=func.now()),
+)
+Table(
+    'user_stats', baseline_meta,
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('rating', Integer),
+    Column('total_tasks_completed', Integer),
+    Column('rating_change_for_the_week', Integer),
+    Column('rating_change_for_the_day', Integer),
+)
+Table(
+    'rating_events', baseline_meta,
+    Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('delta', Integer, nullable=False),
+    Column('source', String, nullable=False),
+    Column('created_at', DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+Table(
+    'rollup_state', baseline_meta,
+    Column('name', String, primary_key=True),
+    Column('last_event_id', BigInteger, nullable=False),
+    Column('day', String),
+    Column('week', String),
+    Column('updated_at', DateTime(timezone=True), server_default=func.now()),
+)
+Table(
+    'habits', baseline_meta,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id')),
+    Column('title', String, nullable=False),
+    Column('notes', Text),
+    Column('difficulty', String),
+    Column('streak', Integer),
+    Column('start_date', String),
+    Column('repeat_type', String),
+    Column('repeat_every', Integer),
+    Column('repeat_days', String),
+    Column('last_checked_date', String),
+    Column('completed_today', Boolean),
+)
+Table(
+    'achievements', baseline_meta,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id')),
+    Column('title', String, nullable=False),
+    Column('description', Text),
+    Column('achieved_at', DateTime(timezone=True), server_default=func.now()),
+)
+Table(
+    'tasks', baseline_meta,
+    Column('id', Integer, primary_key=True, index=True),
+    Column('user_id', Integer, ForeignKey('users.id')),
+    Column('title', String, nullable=False),
+    Column('notes', Text),
+    Column('status', String),
+    Column('difficulty', String),
+    Column('deadline', DateTime(timezone=True)),
+    Column('created_at', DateTime(timezone=True), server_default=func.now()),
+    Column('completed_at', DateTime(timezone=True)),
+)
+
+
+def create_index(table_name: str, index_name: str):
+    """Миграция, создающая индекс, описанный в моделях (если его ещё нет)."""
+    def apply(conn):
+        table = Base.metadata.tables[table_name]
+        index = next(i for i in table.indexes if i.name == index_name)
+        index.create(conn, checkfirst=True)
+    return apply
+
+
+def add_column(table_name: str, column_name: str):
+    """Миграция, добавляющая столбец, описанный в моделях (если его ещё нет)."""
+    def apply(conn):
+        if column_name in {c['name'] for c in inspect(conn).get_columns(table_name)}:
+            return
+        column = Base.metadata.tables[table_name].c[column_name]
+        conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}'))
+    return apply
+
+
+def drop_column(table_name: str, column_name: str):
+    """Миграция, удаляющая столбец, которого больше нет в моделях (если он ещё есть)."""
+    def apply(conn):
+        if column_name not in {c['name'] for c in inspect(conn).get_columns(table_name)}:
+            return
+        conn.execute(text(f'ALTER TABLE {table_name} DROP COLUMN {column_name}'))
+    return apply
+
+
+def create_missing_tables(conn):
+    baseline_meta.create_all(conn)
+
+
+def _restored_completions(habit, today):
+    """Даты выполнений привычки, восстановленные из completed_today и streak."""
+    schedule = compile_schedule(habit)
+    try:
+        last_checked = min(date.fromisoformat(habit.last_checked_date), today - timedelta(days=1))
+    except (TypeError, ValueError):
+        last_checked = today - timedelta(days=1)
+    days = []
+    remaining = habit.streak or 0
+    if habit.completed_today:
+        # Флаг относится к дню после последней проверки
+        days.append(last_checked + timedelta(days=1))
+        remaining -= 1
+    # Серия — выполнения подряд в активные по расписанию дни
+    day = last_checked
+    earliest = max(schedule.start or date.min, today - timedelta(days=3660))
+    while remaining > 0 and day >= earliest:
+        if schedule.is_active(day):
+            days.append(day)
+            remaining -= 1
+        day -= timedelta(days=1)
+    return days
+
+
+def create_habit_completions(conn):
+    """
+    Таблица habit_completions с историей, восстановленной из habits.
+
+    completed_today становится выполнением за день после last_checked_date,
+    а текущая серия — выполнениями в streak последних активных дней, так что
+    пересчёт серий по истории даёт прежние значения. Столбец
+    completed_today не удаляется: во время деплоя его ещё читают воркеры
+    предыдущей версии.
+    """
+    table = Base.metadata.tables['habit_completions']
+    table.create(conn, checkfirst=True)
+    if 'completed_today' not in {c['name'] for c in inspect(conn).get_columns('habits')}:
+        return
+    if conn.scalar(select(func.count()).select_from(table)):
+        return
+
+    today = local_today()
+    last_id = 0
+    while True:
+        habits = conn.execute(text(
+            'SELECT id, streak, completed_today, last_checked_date, start_date, repeat_type, repeat_every, repeat_days '
+            'FROM habits WHERE id > :last_id AND (completed_today OR streak > 0) ORDER BY id LIMIT 5000'
+        ), {'last_id': last_id}).all()
+        if not habits:
+            break
+        rows = [
+            {'habit_id': habit.id, 'date': day.isoformat()}
+            for habit in habits for day in _restored_completions(habit, today)
+        ]
+        if rows:
+            conn.execute(insert(table), rows)
+        last_id = habits[-1].id
+
+
+def add_rating_events_applied(conn):
+    """
+    Флаг rating_events.applied вместо водяного знака rollup_state.last_event_id.
+
+    События до водяного знака уже учтены в user_stats — помечаются
+    учтёнными, остальные подхватит следующий прогон rating_rollup.
+    """
+    add_column('rating_events', 'applied')(conn)
+    if 'last_event_id' not in {c['name'] for c in inspect(conn).get_columns('rollup_state')}:
+        # БД создана create_tables по текущим моделям: переносить нечего
+        return
+    conn.execute(text(
+        'UPDATE rating_events SET applied = :applied WHERE id <= '
+        "(SELECT coalesce(max(last_event_id), 0) FROM rollup_state WHERE name = 'rating_changes')"
+    ), {'applied': True})
+
+
+# (версия, название, функция(conn)); добавлять только в конец
+MIGRATIONS = [
+    (1, 'create missing tables', create_missing_tables),
+    (2, 'index tasks(user_id, status)', create_index('tasks', 'ix_tasks_user_id_status')),
+    (3, 'index habits(user_id)', create_index('habits', 'ix_habits_user_id')),
+    (4, 'index achievements(user_id)', create_index('achievements', 'ix_achievements_user_id')),
+    (5, 'index tasks(status, deadline)', create_index('tasks', 'ix_tasks_status_deadline')),
+    (6, 'index user_stats(rating desc, user_id)', create_index('user_stats', 'ix_user_stats_rating_user_id')),
+    (7, 'index rating_events(user_id, created_at)',
+     create_index('rating_events', 'ix_rating_events_user_id_created_at')),
+    (8, 'user_stats.generation', add_column('user_stats', 'generation')),
+    (9, 'habit_completions from habits.completed_today', create_habit_completions),
+    (10, 'rating_events.applied from rollup_state.last_event_id', add_rating_events_applied),
+    (11, 'index rating_events(id) where not applied', create_index('rating_events', 'ix_rating_events_pending')),
+    (12, 'drop rollup_state.last_event_id', drop_column('rollup_state', 'last_event_id')),
+]
+
+
+def applied_versions(engine) -> set:
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def upgrade(engine, target: int = None) -> list:
+    """
+    Применить ещё не применённые миграции по порядку.
+
+    Returns:
+        list: Версии, применённые за этот запуск
+    """
+    done = applied_versions(engine)
+    applied = []
+    for version, name, apply in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        with engine.begin() as conn:
+            if engine.dialect.name == 'postgresql':
+                # Не даём двум процессам деплоя применять миграции одновременно
+                conn.execute(text('SELECT pg_advisory_xact_lock(7340531)'))
+                if conn.scalar(select(schema_migrations.c.version).where(schema_migrations.c.version == version)):
+                    continue
+            apply(conn)
+            conn.execute(insert(schema_migrations).values(version=version, name=name))
+        print(f'Applied {version}: {name}', file=sys.stderr)
+        applied.append(version)
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Миграции схемы БД')
+    parser.add_argument('--status', action='store_true', help='Показать состояние миграций')
+    parser.add_argument('--to', type=int, default=None, help='Применить миграции до этой версии')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        done = applied_versions(db.engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{'+' if version in done else ' '} {version:>3} {name}")
+        return
+
+    applied = upgrade(db.engine, args.to)
+    print(f'Migrations applied: {len(applied)}')
+
+
+if __name__ == '__main__':
+    main()
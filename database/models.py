@@ -9,6 +9,7 @@ from sqlalchemy import (
     Text,
     Index,
     BigInteger,
+    false,
 )
 from sqlalchemy.orm import declarative_base, relationship
 from flask_login import UserMixin
@@ -38,8 +39,43 @@ class UserStats(Base):
     total_tasks_completed = Column(Integer, default=0)
     rating_change_for_the_week = Column(Integer, default=0)
     rating_change_for_the_day = Column(Integer, default=0)
+    # Поколение данных пользователя: растёт при каждом изменении через Database (ETag страниц)
+    generation = Column(Integer, nullable=False, default=0, server_default='0')
     user = relationship("User", back_populates="stats")
 
+    __table_args__ = (
+        # Таблица лидеров: ORDER BY rating DESC, user_id с keyset-пагинацией
+        Index('ix_user_stats_rating_user_id', rating.desc(), user_id),
+    )
+
+class RatingEvent(Base):
+    """Журнал изменений рейтинга (только добавление записей)"""
+    __tablename__ = 'rating_events'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    delta = Column(Integer, nullable=False)
+    source = Column(String, nullable=False)  # task, habit, rollover, manual
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    applied = Column(Boolean, nullable=False, default=False, server_default=false())  # учтено в user_stats (rollup)
+
+    __table_args__ = (
+        Index('ix_rating_events_user_id_created_at', user_id, created_at),
+        # Частичный индекс: ещё не учтённые события, их всегда немного
+        Index('ix_rating_events_pending', id, postgresql_where=~applied, sqlite_where=~applied),
+    )
+
+
+class RollupState(Base):
+    """Текущие периоды инкрементальной агрегации журнала"""
+    __tablename__ = 'rollup_state'
+
+    name = Column(String, primary_key=True)
+    day = Column(String, nullable=True)  # YYYY-MM-DD, за который считан rating_change_for_the_day
+    week = Column(String, nullable=True)  # YYYY-MM-DD понедельника, для rating_change_for_the_week
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Habit(Base):
     __tablename__ = 'habits'
 
@@ -55,9 +91,26 @@ class Habit(Base):
     repeat_days = Column(String, default='1,2,3,4,5')  # Дни недели (строка вида '0,1,2,3,4,5,6')
 
     last_checked_date = Column(String, nullable=True)  # Последняя дата, за которую проверяли (YYYY-MM-DD)
-    completed_today = Column(Boolean, default=False)
+    # «Выполнена сегодня» — есть ли строка в habit_completions за сегодня;
+    # старый столбец completed_today в БД больше не используется
 
     user = relationship("User", back_populates="habits")
+    completions = relationship("HabitCompletion", back_populates="habit", cascade="all, delete-orphan",
+                               passive_deletes=True)
+
+    __table_args__ = (
+        Index('ix_habits_user_id', user_id),
+    )
+
+
+# Выполнение привычки за день: не больше одной строки на (привычку, дату)
+class HabitCompletion(Base):
+    __tablename__ = 'habit_completions'
+
+    habit_id = Column(Integer, ForeignKey('habits.id', ondelete='CASCADE'), primary_key=True)
+    date = Column(String, primary_key=True)  # YYYY-MM-DD по ЕКБ
+    completed_at = Column(DateTime(timezone=True), server_default=func.now())
+    habit = relationship("Habit", back_populates="completions")
 
 
 class Achievement(Base):
@@ -70,6 +123,10 @@ class Achievement(Base):
     achieved_at = Column(DateTime(timezone=True), server_default=func.now())
     user = relationship("User", back_populates="achievements")
 
+    __table_args__ = (
+        Index('ix_achievements_user_id', user_id),
+    )
+
 class Task(Base):
     __tablename__ = 'tasks'
 
@@ -84,3 +141,8 @@ class Task(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     user = relationship("User", back_populates="tasks")
 
+    __table_args__ = (
+        Index('ix_tasks_user_id_status', user_id, status),  # задачи пользователя, фильтр по статусу
+        Index('ix_tasks_status_deadline', status, deadline),  # просроченные/ближайшие по дедлайну
+    )
+
@@ -0,0 +1,54 @@
+"""
+Инкрементальная агрегация журнала рейтинга (rating_events) в
+user_stats.rating_change_for_the_day и rating_change_for_the_week.
+
+Запуск (из корня проекта, например по cron раз в минуту):
+
+    python -m database.rating_rollup
+    python -m database.rating_rollup --loop 60   # крутиться самому, раз в 60 с
+
+Обрабатываются только ещё не учтённые события (rating_events.applied),
+поэтому каждый прогон стоит пропорционально числу новых событий,
+а не всей истории.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from database.database import db
+from functions import local_timezone
+
+
+def run(batch_size: int = 10000) -> int:
+    """Обработать все накопившиеся события. Returns: число событий."""
+    tz = local_timezone()
+    now = datetime.now(tz)
+    day_start = tz.localize(datetime(now.year, now.month, now.day))
+    week_start = tz.localize(datetime.combine(day_start.date() - timedelta(days=now.weekday()), datetime.min.time()))
+
+    total = 0
+    while True:
+        processed = db.rollup_rating_events(day_start, week_start, limit=batch_size)
+        total += processed
+        if processed < batch_size:
+            return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Агрегация журнала рейтинга за день и неделю')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Событий в одной транзакции')
+    parser.add_argument('--loop', type=float, default=None, help='Повторять каждые N секунд')
+    args = parser.parse_args(argv)
+
+    while True:
+        started = time.perf_counter()
+        processed = run(batch_size=args.batch_size)
+        print(f'Rating rollup: {processed} events, {time.perf_counter() - started:.3f}s', file=sys.stderr)
+        if args.loop is None:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Ночной перевод привычек на новый день.
+
+Запуск (из корня проекта, например по cron после полуночи по ЕКБ):
+
+    python -m database.rollover
+    python -m database.rollover --date 2025-01-31 --chunk-size 1000
+    python -m database.rollover --start-after 120000   # продолжить после сбоя
+
+Пользователи обрабатываются группами по --chunk-size, каждая группа
+коммитится отдельной транзакцией. Уже обработанные за день привычки
+пропускаются (по last_checked_date), поэтому повторный запуск безопасен:
+после падения достаточно запустить скрипт ещё раз, а --start-after
+лишь позволяет не перечитывать уже пройденных пользователей.
+"""
+from datetime import timedelta
+
+from database.batch import UserChunks, argument_parser, today_from
+from database.database import db
+
+
+def run(today, chunk_size: int = 500, start_after: int = 0) -> dict:
+    """
+    Выполнить перевод привычек всех пользователей на дату today.
+
+    Returns:
+        dict: Итоги прогона (users, penalized, rating_delta, seconds, last_user_id)
+    """
+    yesterday = today - timedelta(days=1)
+    penalized = rating_delta = 0
+
+    chunks = UserChunks(chunk_size, start_after)
+    for user_ids in chunks:
+        deltas = db.rollover_habits(user_ids, yesterday, today)
+        penalized += len(deltas)
+        rating_delta += sum(deltas.values())
+
+    return {**chunks.summary(), 'penalized': penalized, 'rating_delta': rating_delta}
+
+
+def main(argv=None):
+    args = argument_parser('Перевод привычек всех пользователей на новый день').parse_args(argv)
+    today = today_from(args)
+
+    result = run(today, chunk_size=args.chunk_size, start_after=args.start_after)
+    print(f"Rollover {today}: {result['users']} users, {result['penalized']} penalized, "
+          f"rating delta {result['rating_delta']}, {result['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
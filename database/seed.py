@@ -0,0 +1,270 @@
+"""
+Синтетические данные для нагрузочных прогонов.
+
+Запуск (из корня проекта):
+
+    python -m database.seed --users 1000000 --tasks 20 --habits 10
+    python -m database.seed --users 5000 --seed 7 --batch 2000
+
+Данные детерминированы: содержимое строк пользователя зависит только от
+--seed и его ID, поэтому прогоны с одинаковыми параметрами на пустой БД
+дают одинаковую базу. Пользователи и привычки получают ID подряд после
+текущего максимума, логины user<ID> и один общий пароль (--password): хеш
+считается один раз, а не bcrypt на каждого пользователя, как в
+Database.add_user. История выполнений привычек (habit_completions)
+согласована с их сериями.
+
+Строки пишутся пачками по --batch пользователей (со статистикой,
+задачами, привычками и их выполнениями), каждая пачка — отдельная
+транзакция: в PostgreSQL через COPY, в остальных СУБД — многострочными
+INSERT ... VALUES. В конце печатается число строк по таблицам и скорость
+загрузки в строках в секунду.
+"""
+import argparse
+import csv
+import io
+import random
+import sys
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from auth import hash_password
+from database.database import db
+from database.models import Habit, HabitCompletion, Task, User, UserStats
+from functions import compile_schedule, local_today, streak_days
+
+DEFAULT_PASSWORD = 'password'
+
+# Распределения полей привычек (веса — доли в процентах)
+REPEAT_TYPE_WEIGHTS = {'daily': 40, 'weekly': 45, 'monthly': 10, 'yearly': 5}
+REPEAT_EVERY_WEIGHTS = {1: 80, 2: 12, 3: 5, 7: 3}
+REPEAT_DAYS_WEIGHTS = {
+    '0,1,2,3,4': 40,       # будни
+    '0,1,2,3,4,5,6': 25,   # каждый день
+    '5,6': 10,             # выходные
+    '0,2,4': 15,           # через день
+    None: 10,              # произвольный набор дней
+}
+DIFFICULTY_WEIGHTS = {'trivial': 15, 'easy': 40, 'medium': 30, 'hard': 15}
+
+TABLES = (User, UserStats, Task, Habit, HabitCompletion)
+STREAK_LOOKBACK_DAYS = 400
+
+
+def _choice(rng: random.Random, weights: dict):
+    return rng.choices(tuple(weights), weights=tuple(weights.values()))[0]
+
+
+def _count(rng: random.Random, mean: float) -> int:
+    """Число записей у пользователя: экспоненциальный разброс вокруг mean."""
+    return int(rng.expovariate(1 / mean) + 0.5) if mean > 0 else 0
+
+
+def user_rows(seed: int, user_id: int, today, password_hash: str, tasks: float, habits: float,
+              first_habit_id: int) -> dict:
+    """
+    Строки одного пользователя по всем таблицам.
+
+    Привычки получают ID подряд начиная с first_habit_id: на них ссылаются
+    строки habit_completions той же пачки.
+
+    Returns:
+        dict: {имя таблицы: [словарь колонок, ...]}
+    """
+    rng = random.Random(seed * 1_000_003 + user_id)
+    now = datetime.combine(today, dt_time(12), tzinfo=timezone.utc)
+    rows = {
+        User.__tablename__: [{
+            'id': user_id,
+            'nickname': f'user{user_id}',
+            'username': f'user{user_id}',
+            'email': f'user{user_id}@example.com',
+            'hashed_password': password_hash,
+            'path_to_avatar': 'default_avatar.png',
+        }],
+        UserStats.__tablename__: [{
+            'user_id': user_id,
+            'rating': max(0, int(rng.gauss(1000, 400))),
+            'total_tasks_completed': 0,
+            'rating_change_for_the_week': 0,
+            'rating_change_for_the_day': 0,
+        }],
+        Task.__tablename__: [],
+        Habit.__tablename__: [],
+        HabitCompletion.__tablename__: [],
+    }
+
+    completed = 0
+    for i in range(_count(rng, tasks)):
+        created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))
+        done = rng.random() < 0.45
+        completed += done
+        rows[Task.__tablename__].append({
+            'user_id': user_id,
+            'title': f'Задача {i + 1}',
+            'notes': None,
+            'status': 'completed' if done else 'in_progress',
+            'difficulty': _choice(rng, DIFFICULTY_WEIGHTS),
+            'deadline': created + timedelta(days=rng.randint(1, 30)) if rng.random() < 0.3 else None,
+            'created_at': created,
+            'completed_at': created + timedelta(hours=rng.randint(1, 240)) if done else None,
+        })
+    rows[UserStats.__tablename__][0]['total_tasks_completed'] = completed
+
+    yesterday = (today - timedelta(days=1)).isoformat()
+    habit_rows, streaks, done_today = rows[Habit.__tablename__], [], []
+    for i in range(_count(rng, habits)):
+        repeat_days = _choice(rng, REPEAT_DAYS_WEIGHTS)
+        if repeat_days is None:
+            repeat_days = ','.join(map(str, sorted(rng.sample(range(7), rng.randint(1, 6)))))
+        habit = {
+            'id': first_habit_id + i,
+            'user_id': user_id,
+            'title': f'Привычка {i + 1}',
+            'notes': None,
+            'difficulty': _choice(rng, DIFFICULTY_WEIGHTS),
+            'start_date': (today - timedelta(days=rng.randint(0, 730))).isoformat(),
+            'repeat_type': _choice(rng, REPEAT_TYPE_WEIGHTS),
+            'repeat_every': _choice(rng, REPEAT_EVERY_WEIGHTS),
+            'repeat_days': repeat_days,
+            'last_checked_date': yesterday,
+        }
+        streaks.append(int(rng.expovariate(1 / 8)))
+        done_today.append(rng.random() < 0.5 and compile_schedule(habit).is_active(today))
+        habit_rows.append(habit)
+
+    # История выполнений согласована с серией: пересчёт по ней даёт тот же streak
+    for habit, days, done in zip(habit_rows, streak_days(habit_rows, streaks, today, lookback=STREAK_LOOKBACK_DAYS),
+                                 done_today):
+        if done:
+            days.insert(0, today)
+        habit['streak'] = len(days)
+        rows[HabitCompletion.__tablename__].extend(
+            {'habit_id': habit['id'], 'date': day.isoformat()} for day in days
+        )
+    return rows
+
+
+def _copy(conn, table, rows):
+    """COPY ... FROM STDIN в формате CSV (только PostgreSQL + psycopg2)."""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def _insert(conn, table, rows):
+    """
+    INSERT пачкой: executemany по одному скомпилированному insert().
+
+    SQLAlchemy сам склеивает строки в многострочные INSERT ... VALUES
+    (insertmanyvalues), а компиляция выполняется один раз — явный
+    insert().values(rows) компилируется заново на каждую пачку и
+    оказывается в разы медленнее.
+    """
+    conn.execute(table.insert(), rows)
+
+
+def load(conn, batch: dict, use_copy: bool):
+    for model in TABLES:
+        rows = batch[model.__tablename__]
+        if rows:
+            (_copy if use_copy else _insert)(conn, model.__table__, rows)
+
+
+def _reset_sequences(conn):
+    # ID пользователей и привычек заданы явно: сдвигаем последовательности,
+    # иначе следующая регистрация или привычка получит занятый ID
+    for table in ('users', 'habits'):
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+        ))
+
+
+def run(users: int, seed: int = 1, tasks: float = 20, habits: float = 10, batch_size: int = 1000,
+        password: str = DEFAULT_PASSWORD, today=None, copy: bool = None) -> dict:
+    """
+    Добавить users синтетических пользователей с задачами и привычками.
+
+    Args:
+        tasks, habits: Среднее число задач и привычек на пользователя
+        copy: Грузить через COPY (по умолчанию — если БД PostgreSQL)
+
+    Returns:
+        dict: first_user_id, last_user_id, rows (по таблицам), seconds
+    """
+    today = today or local_today()
+    engine = db.engine
+    use_copy = engine.dialect.name == 'postgresql' if copy is None else copy
+    password_hash = hash_password(password)
+
+    with engine.connect() as conn:
+        first_id = (conn.scalar(select(func.max(User.id))) or 0) + 1
+        next_habit_id = (conn.scalar(select(func.max(Habit.id))) or 0) + 1
+
+    counts = {model.__tablename__: 0 for model in TABLES}
+    started = time.perf_counter()
+    for batch_start in range(first_id, first_id + users, batch_size):
+        batch = {name: [] for name in counts}
+        for user_id in range(batch_start, min(batch_start + batch_size, first_id + users)):
+            user = user_rows(seed, user_id, today, password_hash, tasks, habits, next_habit_id)
+            for name, rows in user.items():
+                batch[name].extend(rows)
+            next_habit_id += len(user[Habit.__tablename__])
+
+        with engine.begin() as conn:
+            load(conn, batch, use_copy)
+
+        for name, rows in batch.items():
+            counts[name] += len(rows)
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        print(f'users={counts[User.__tablename__]} rows={total} rate={total / elapsed:.0f} rows/s', file=sys.stderr)
+
+    if engine.dialect.name == 'postgresql' and users:
+        with engine.begin() as conn:
+            _reset_sequences(conn)
+
+    return {
+        'first_user_id': first_id,
+        'last_user_id': first_id + users - 1,
+        'rows': counts,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Загрузка синтетических пользователей, задач и привычек')
+    parser.add_argument('--users', type=int, required=True)
+    parser.add_argument('--tasks', type=float, default=20, help='Среднее число задач на пользователя')
+    parser.add_argument('--habits', type=float, default=10, help='Среднее число привычек на пользователя')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch', type=int, default=1000, help='Пользователей в одной транзакции')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Общий пароль всех пользователей')
+    parser.add_argument('--date', help='«Сегодня» для дат в данных, YYYY-MM-DD (по умолчанию — сегодня по ЕКБ)')
+    parser.add_argument('--no-copy', action='store_true', help='INSERT вместо COPY в PostgreSQL')
+    args = parser.parse_args(argv)
+
+    today = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+    result = run(args.users, seed=args.seed, tasks=args.tasks, habits=args.habits, batch_size=args.batch,
+                 password=args.password, today=today, copy=False if args.no_copy else None)
+
+    seconds = result['seconds'] or 1e-9
+    print(f"Seeded users {result['first_user_id']}..{result['last_user_id']} in {result['seconds']}s")
+    for name, count in result['rows'].items():
+        print(f'  {name:<18} {count:>10} rows')
+    total = sum(result['rows'].values())
+    print(f'  {"total":<18} {total:>10} rows, {total / seconds:.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Пересчёт серий привычек по истории выполнений (habit_completions).
+
+Запуск (из корня проекта):
+
+    python -m database.streaks
+    python -m database.streaks --date 2025-01-31 --chunk-size 1000
+
+Нужен после исправления данных (импорт истории, ручные правки) или
+ошибок в подсчёте серий: обычно серия пересчитывается сама при каждой
+отметке выполнения. Пользователи обрабатываются группами по
+--chunk-size, каждая группа — одной транзакцией; повторный запуск
+безопасен.
+"""
+from database.batch import UserChunks, argument_parser, today_from
+from database.database import db
+
+
+def run(today, chunk_size: int = 500, start_after: int = 0) -> dict:
+    """
+    Пересчитать серии привычек всех пользователей на дату today.
+
+    Returns:
+        dict: Итоги прогона (users, changed, seconds, last_user_id)
+    """
+    changed = 0
+
+    chunks = UserChunks(chunk_size, start_after)
+    for user_ids in chunks:
+        changed += db.recompute_streaks(user_ids, today)
+
+    return {**chunks.summary(), 'changed': changed}
+
+
+def main(argv=None):
+    args = argument_parser('Пересчёт серий привычек по истории выполнений').parse_args(argv)
+    today = today_from(args)
+
+    result = run(today, chunk_size=args.chunk_size, start_after=args.start_after)
+    print(f"Streaks {today}: {result['users']} users, {result['changed']} habits changed, {result['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,204 @@
 # functions.py
-import pytz
-from datetime import datetime, date
-from dateutil.relativedelta import relativedelta
+# numpy и pytz импортируются внутри функций: их импорт заметно
+# замедляет старт воркера, а нужны они не на каждом запросе
+import calendar
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+
+# Таблица баллов: сложность -> (награда за выполнение, штраф за пропуск)
+POINTS_TABLE = {
+    'trivial': (10, -30),
+    'easy': (25, -25),
+    'medium': (40, -20),
+    'hard': (60, -15),
+}
+
+REPEAT_TYPES = ('daily', 'weekly', 'monthly', 'yearly')
+
+TIMEZONE_NAME = 'Asia/Yekaterinburg'
+
+
+@lru_cache(maxsize=1)
+def local_timezone():
+    """Часовой пояс приложения (pytz импортируется при первом вызове)."""
+    import pytz
+    return pytz.timezone(TIMEZONE_NAME)
+
+
+def local_today() -> date:
+    """Текущая дата по ЕКБ."""
+    return datetime.now(local_timezone()).date()
+
+
+class HabitSchedule:
+    """
+    Скомпилированное правило повторения привычки.
+
+    Хранит уже разобранные start_date, тип и период повторения и битовую
+    маску дней недели (бит i — weekday() == i), чтобы не парсить строки
+    из БД при каждой проверке. start = None означает, что дата начала не
+    задана или некорректна: тогда началом считается проверяемая дата.
+    """
+    __slots__ = ('start', 'repeat_type', 'repeat_every', 'weekday_mask')
+
+    def __init__(self, start, repeat_type, repeat_every, weekday_mask):
+        self.start = start
+        self.repeat_type = repeat_type
+        self.repeat_every = repeat_every
+        self.weekday_mask = weekday_mask
+
+    def is_active(self, today: date) -> bool:
+        start_date = self.start or today
+        if today < start_date:
+            return False
+
+        days_passed = (today - start_date).days
+
+        if self.repeat_type == 'daily':
+            return days_passed % self.repeat_every == 0
+
+        elif self.repeat_type == 'weekly':
+            if not self.weekday_mask >> today.weekday() & 1:
+                return False
+            return (days_passed // 7) % self.repeat_every == 0
+
+        elif self.repeat_type == 'monthly':
+            last_day = calendar.monthrange(today.year, today.month)[1]
+            if today.day != min(start_date.day, last_day):
+                return False
+            months_passed = (today.year - start_date.year) * 12 + (today.month - start_date.month)
+            return months_passed % self.repeat_every == 0
+
+        elif self.repeat_type == 'yearly':
+            if start_date.month == 2 and start_date.day == 29:
+                # В невисокосный год 29.02 считаем как 28.02
+                if (today.month, today.day) != (2, 29) and not (
+                        today.month == 2 and today.day == 28 and not calendar.isleap(today.year)):
+                    return False
+            elif today.month != start_date.month or today.day != start_date.day:
+                return False
+            return (today.year - start_date.year) % self.repeat_every == 0
+
+        return False
+
+
+@lru_cache(maxsize=4096)
+def _compile_schedule(start_date, repeat_type, repeat_every, repeat_days) -> HabitSchedule:
+    start = None
+    if start_date:
+        try:
+            start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            start = None
+
+    every = int(repeat_every) if repeat_every and str(repeat_every).isdigit() else 1
+
+    mask = 0
+    if repeat_days:
+        for d in str(repeat_days).split(','):
+            d = d.strip()
+            if d.isdigit() and 0 <= int(d) <= 6:
+                mask |= 1 << int(d)
+    if not mask:
+        mask = 0b1111111
+
+    return HabitSchedule(start, repeat_type or 'daily', max(every, 1), mask)
+
+
+def compile_schedule(habit) -> HabitSchedule:
+    """
+    Получить скомпилированное расписание привычки.
+
+    habit — объект Habit или словарь с теми же полями (например, из
+    Database.get_dashboard). Результат кешируется по полям правила
+    повторения, поэтому изменение правила в БД автоматически даёт новое
+    расписание.
+    """
+    if isinstance(habit, dict):
+        return _compile_schedule(habit['start_date'], habit['repeat_type'], habit['repeat_every'], habit['repeat_days'])
+    return _compile_schedule(habit.start_date, habit.repeat_type, habit.repeat_every, habit.repeat_days)
+
+
+def date_range(start: date, end: date):
+    """Массив дат numpy.datetime64[D] от start до end включительно."""
+    import numpy as np
+    return np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1, dtype='datetime64[D]')
+
+
+def _date_parts(days):
+    """Год, месяц, день и число дней в месяце для массива datetime64[D]."""
+    import numpy as np
+    months = days.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (days - months).astype(np.int64) + 1
+    month_len = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+    return years, month, day, month_len
+
+
+def habit_activity_matrix(habits, dates):
+    """
+    Векторная версия is_habit_active для многих привычек и дат сразу.
+
+    Args:
+        habits: Привычки (объекты с полями правила повторения)
+        dates: Массив дат numpy.datetime64[D] (например, из date_range)
+
+    Returns:
+        numpy.ndarray: Булева матрица len(habits) x len(dates),
+        [i, j] — активна ли привычка i в дату dates[j]
+    """
+    import numpy as np
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    schedules = [compile_schedule(h) for h in habits]
+    n = len(schedules)
+    if not n or not len(dates):
+        return np.zeros((n, len(dates)), dtype=bool)
+
+    has_start = np.array([s.start is not None for s in schedules])
+    start = np.array([s.start or date(1970, 1, 1) for s in schedules], dtype='datetime64[D]')[:, None]
+    every = np.array([s.repeat_every for s in schedules], dtype=np.int64)[:, None]
+    mask = np.array([s.weekday_mask for s in schedules], dtype=np.int64)[:, None]
+    kind = np.array([
+        REPEAT_TYPES.index(s.repeat_type) if s.repeat_type in REPEAT_TYPES else -1 for s in schedules
+    ])[:, None]
+
+    row = dates[None, :]
+    days_passed = (row - start).astype(np.int64)
+    weekday = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 — четверг
+    on_weekday = (mask >> weekday[None, :]) & 1 == 1
+
+    year, month, day, month_len = _date_parts(dates)
+    s_year, s_month, s_day, _ = _date_parts(start[:, 0])
+    s_year, s_month, s_day = s_year[:, None], s_month[:, None], s_day[:, None]
+    year, month, day, month_len = year[None, :], month[None, :], day[None, :], month_len[None, :]
+
+    daily = days_passed % every == 0
+    weekly = on_weekday & ((days_passed // 7) % every == 0)
+    monthly = (day == np.minimum(s_day, month_len)) & (((year - s_year) * 12 + (month - s_month)) % every == 0)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    feb29 = (s_month == 2) & (s_day == 29)
+    same_day = np.where(
+        feb29,
+        (month == 2) & ((day == 29) | ((day == 28) & ~leap)),
+        (month == s_month) & (day == s_day),
+    )
+    yearly = same_day & ((year - s_year) % every == 0)
+
+    active = np.select([kind == 0, kind == 1, kind == 2, kind == 3], [daily, weekly, monthly, yearly], False)
+    active &= days_passed >= 0
+
+    # Без даты начала привычка «начинается» в проверяемый день
+    no_start = ~has_start
+    if no_start.any():
+        undated = np.select(
+            [kind == 1, kind >= 0], [np.broadcast_to(on_weekday, active.shape), True], False
+        )
+        active[no_start] = undated[no_start]
+
+    return active
+
 
 def is_habit_active(habit, today: date = None):
     """
@@ -9,76 +206,126 @@ def is_habit_active(habit, today: date = None):
     Если today не задан — использует текущую дату по ЕКБ.
     """
     if today is None:
-        tz = pytz.timezone('Asia/Yekaterinburg')
-        today = datetime.now(tz).date()
+        today = local_today()
 
-    # Парсим start_date
-    if habit.start_date:
-        try:
-            start_date = datetime.strptime(habit.start_date, '%Y-%m-%d').date()
-        except (ValueError, TypeError):
-            start_date = today
-    else:
-        start_date = today
+    return compile_schedule(habit).is_active(today)
 
-    if today < start_date:
-        return False
 
-    repeat_type = habit.repeat_type or 'daily'
-    repeat_every = int(habit.repeat_every) if habit.repeat_every and str(habit.repeat_every).isdigit() else 1
+def _windows_back(today: date, earliest: date, first_span: int = 32):
+    """
+    Окна дат назад от вчера до earliest включительно, каждое вдвое длиннее
+    предыдущего: (first, last), first <= last.
+
+    Серии и история обычно короткие, поэтому почти все привычки решаются
+    в первом окне, а длинные (или редкие — раз в месяц, раз в год) за
+    несколько окон без прохода по всем lookback дням.
+    """
+    last = today - timedelta(days=1)
+    span = first_span
+    while last >= earliest:
+        first = max(last - timedelta(days=span - 1), earliest)
+        yield first, last
+        last = first - timedelta(days=1)
+        span *= 2
 
-    if repeat_type == 'daily':
-        days_passed = (today - start_date).days
-        return days_passed >= 0 and days_passed % repeat_every == 0
-
-    elif repeat_type == 'weekly':
-        repeat_days = []
-        if habit.repeat_days:
-            for d in str(habit.repeat_days).split(','):
-                d = d.strip()
-                if d.isdigit():
-                    day_int = int(d)
-                    if 0 <= day_int <= 6:
-                        repeat_days.append(day_int)
-        if not repeat_days:
-            repeat_days = list(range(7))
-
-        if today.weekday() not in repeat_days:
-            return False
 
-        weeks_since_start = (today - start_date).days // 7
-        return weeks_since_start % repeat_every == 0
+def _activity_rows(habits, indices, dates, block: int = 512):
+    """
+    Строки матрицы активности для habits[i], i из indices: пары (i, строка).
 
-    elif repeat_type == 'monthly':
-        def get_effective_day(year, month, target_day):
-            try:
-                return date(year, month, target_day)
-            except ValueError:
-                return date(year, month, 1) + relativedelta(months=1) - relativedelta(days=1)
+    Матрица считается блоками по block привычек, чтобы длинное окно на
+    тысячах привычек не занимало сотни мегабайт.
+    """
+    for offset in range(0, len(indices), block):
+        chunk = indices[offset:offset + block]
+        yield from zip(chunk, habit_activity_matrix([habits[i] for i in chunk], dates))
 
-        effective_today = get_effective_day(today.year, today.month, start_date.day)
-        if today != effective_today:
-            return False
 
-        months_passed = (today.year - start_date.year) * 12 + (today.month - start_date.month)
-        return months_passed >= 0 and months_passed % repeat_every == 0
+def habit_streaks(habits, completions, today: date):
+    """
+    Серии привычек по истории выполнений.
 
-    elif repeat_type == 'yearly':
-        if start_date.month == 2 and start_date.day == 29:
-            if today.month == 2 and today.day == 28:
-                if not (today.year % 4 == 0 and (today.year % 100 != 0 or today.year % 400 == 0)):
-                    pass  # считаем 28.02 как 29.02
-                else:
-                    return False
-            elif today.month == 2 and today.day == 29:
-                pass
-            else:
-                return False
-        else:
-            if today.month != start_date.month or today.day != start_date.day:
-                return False
+    Серия — число выполнений подряд, начиная с последнего, между которыми
+    нет пропущенного активного дня. Сегодняшний день пропуском не
+    считается: его ещё можно выполнить. Последний пропуск ищется по
+    матрице активности (habit_activity_matrix) окнами назад от вчера —
+    для всех привычек сразу.
+
+    Args:
+        habits: Привычки (объекты или словари с полями правила повторения)
+        completions: Для каждой привычки — даты выполнений (не позже today)
+        today: Сегодняшняя дата
+
+    Returns:
+        list[int]: Длины серий в порядке habits
+    """
+    import numpy as np
+
+    done = [np.array(sorted(days), dtype='datetime64[D]') for days in completions]
+    streaks = [len(days) for days in done]
+    pending = [i for i, days in enumerate(done) if len(days)]
+    earliest = min((done[i][0].item() for i in pending), default=today)
+    for first, last in _windows_back(today, earliest):
+        if not pending:
+            break
+        dates = date_range(first, last)[::-1]
+        unresolved = []
+        for i, active in _activity_rows(habits, pending, dates):
+            missed = np.flatnonzero(active & ~np.isin(dates, done[i]))
+            if len(missed):
+                # Серия — выполнения после последнего пропущенного активного дня
+                streaks[i] = len(done[i]) - np.searchsorted(done[i], dates[missed[0]], side='right')
+            elif done[i][0] < dates[-1]:
+                unresolved.append(i)
+        pending = unresolved
+    return [int(streak) for streak in streaks]
 
-        years_passed = today.year - start_date.year
-        return years_passed >= 0 and years_passed % repeat_every == 0
 
-    return False
\ No newline at end of file
+def streak_days(habits, streaks, today: date, lookback: int = 3660):
+    """
+    Даты выполнений, дающие серии длиной streaks: для каждой привычки
+    последние активные дни до вчера включительно (не раньше даты начала и
+    не дальше lookback дней).
+
+    Нужна там, где серия известна, а истории выполнений нет (импорт,
+    синтетические данные). Дни берутся из матрицы активности окнами назад
+    от вчера, пока не наберётся серия. Дней может оказаться меньше streak,
+    если столько активных дней в окне нет.
+
+    Returns:
+        list[list[date]]: Даты по убыванию в порядке habits
+    """
+    days = [[] for _ in habits]
+    pending = [i for i, streak in enumerate(streaks) if streak > 0]
+    for first, last in _windows_back(today, today - timedelta(days=lookback)):
+        if not pending:
+            break
+        dates = date_range(first, last)[::-1]
+        unresolved = []
+        for i, active in _activity_rows(habits, pending, dates):
+            days[i].extend(dates[active][:streaks[i] - len(days[i])].tolist())
+            start = compile_schedule(habits[i]).start
+            if len(days[i]) < streaks[i] and (start is None or start < first):
+                unresolved.append(i)
+        pending = unresolved
+    return days
+
+
+def habits_calendar(habits, start: date, end: date):
+    """
+    Даты, в которые привычки должны выполняться, в окне [start, end].
+
+    Считается одним векторным проходом по всем привычкам сразу.
+
+    Returns:
+        list[dict]: [{'id', 'title', 'dates': ['YYYY-MM-DD', ...]}, ...]
+    """
+    import numpy as np
+
+    dates = date_range(start, end)
+    active = habit_activity_matrix(habits, dates)
+    day_strings = np.datetime_as_string(dates, unit='D')
+    return [
+        {'id': habit.id, 'title': habit.title, 'dates': day_strings[row].tolist()}
+        for habit, row in zip(habits, active)
+    ]
@@ -0,0 +1,77 @@
+"""
+Векторная матрица активности (habit_activity_matrix) против скалярного
+is_habit_active: для любых правил повторения они должны совпадать день в день.
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from functions import REPEAT_TYPES, date_range, habit_activity_matrix, is_habit_active
+
+WINDOW_START = date(2023, 1, 1)
+WINDOW_END = date(2025, 12, 31)  # 2024 — високосный
+
+EDGE_STARTS = [
+    '2020-02-29',  # 29.02: в невисокосные годы — 28.02
+    '2024-02-29',
+    '2023-01-31',  # конец месяца: в коротких месяцах — последний день
+    '2023-01-30',
+    '2023-01-29',
+    '2022-08-31',
+    '2024-12-31',
+    '2025-06-15',  # начало внутри окна
+    None,          # без даты начала
+    '',
+    'not-a-date',
+]
+
+
+def _habit(start_date, repeat_type, repeat_every, repeat_days):
+    return {'start_date': start_date, 'repeat_type': repeat_type,
+            'repeat_every': repeat_every, 'repeat_days': repeat_days}
+
+
+def _random_habits(rng, count):
+    habits = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            start = rng.choice(EDGE_STARTS)
+        else:
+            start = (date(2019, 1, 1) + timedelta(days=rng.randint(0, 7 * 365))).isoformat()
+        repeat_days = rng.choice([
+            None, '', ','.join(map(str, sorted(rng.sample(range(7), rng.randint(1, 7))))), '7,x',
+        ])
+        habits.append(_habit(start, rng.choice(REPEAT_TYPES), rng.choice([1, 1, 2, 3, 4, '2', None]), repeat_days))
+    return habits
+
+
+def _assert_matches_scalar(habits):
+    dates = date_range(WINDOW_START, WINDOW_END)
+    matrix = habit_activity_matrix(habits, dates)
+    assert matrix.shape == (len(habits), len(dates))
+    for i, habit in enumerate(habits):
+        day = WINDOW_START
+        for j in range(len(dates)):
+            assert matrix[i, j] == is_habit_active(habit, day), (habit, day)
+            day += timedelta(days=1)
+
+
+@pytest.mark.parametrize('repeat_type', REPEAT_TYPES)
+@pytest.mark.parametrize('start_date', EDGE_STARTS)
+def test_edge_starts(repeat_type, start_date):
+    _assert_matches_scalar([
+        _habit(start_date, repeat_type, every, days)
+        for every in (1, 2, 3)
+        for days in ('0,1,2,3,4', '5,6', None)
+    ])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_rules(seed):
+    _assert_matches_scalar(_random_habits(random.Random(seed), 60))
+
+
+def test_empty():
+    assert habit_activity_matrix([], date_range(WINDOW_START, WINDOW_END)).shape == (0, 1096)
+    assert habit_activity_matrix([_habit(None, 'daily', 1, None)], date_range(WINDOW_START, WINDOW_START)).all()